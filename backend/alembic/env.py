@@ -0,0 +1,71 @@
+"""
+Alembic迁移环境
+
+- 数据库地址使用 settings.DATABASE_URL
+- init_db() 通过 config.attributes["connection"] 传入应用引擎的连接（沿用SQLite PRAGMA、内存库的StaticPool）
+- SQLite不支持大部分 ALTER TABLE，结构变更使用 op.batch_alter_table（SQLite上复制表，其他数据库直接ALTER）
+"""
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import engine_from_config, pool
+
+from app.config import settings
+from app.models import Base
+
+config = context.config
+
+# 命令行执行时才配置日志（init_db中调用时沿用应用的日志配置）
+if config.config_file_name is not None and config.attributes.get("connection") is None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def _include_object(obj, name, type_, reflected, compare_to) -> bool:
+    # quote_snapshots 上的BRIN索引/TimescaleDB分块索引由 quote_history.setup() 按后端创建，不归迁移管理
+    if type_ == "index" and reflected and compare_to is None and obj.table.name == "quote_snapshots":
+        return False
+    return True
+
+
+def _configure(**kwargs) -> None:
+    context.configure(
+        target_metadata=target_metadata,
+        include_object=_include_object,
+        render_as_batch=True,  # autogenerate生成 batch_alter_table（只在SQLite上复制表）
+        compare_type=True,
+        **kwargs
+    )
+
+
+def run_migrations_offline() -> None:
+    """生成SQL脚本（alembic upgrade head --sql）"""
+    _configure(url=settings.DATABASE_URL, literal_binds=True, dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
+    connectable = engine_from_config(
+        {"sqlalchemy.url": settings.DATABASE_URL},
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+    with connectable.connect() as connection:
+        _configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
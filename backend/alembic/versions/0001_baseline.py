@@ -0,0 +1,162 @@
+"""基线：引入迁移前 create_all 建出的表结构
+
+引入迁移前用 create_all 建出的旧库同样从这里升级：已存在的表跳过（不同时期的旧库表可能不全），
+缺失的表按当时的结构补建。
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 13:38:42.975440
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _missing(table: str) -> bool:
+    if context.is_offline_mode():
+        return True
+    return not sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade() -> None:
+    if _missing('daily_bars'):
+        op.create_table('daily_bars',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('stock_code', sa.String(length=10), nullable=False, comment='股票代码'),
+        sa.Column('trade_date', sa.String(length=10), nullable=False, comment='交易日期(YYYY-MM-DD)'),
+        sa.Column('open', sa.Float(), nullable=True, comment='开盘价'),
+        sa.Column('high', sa.Float(), nullable=True, comment='最高价'),
+        sa.Column('low', sa.Float(), nullable=True, comment='最低价'),
+        sa.Column('close', sa.Float(), nullable=True, comment='收盘价'),
+        sa.Column('volume', sa.Float(), nullable=True, comment='成交量(股)'),
+        sa.Column('amount', sa.Float(), nullable=True, comment='成交额(元)'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True, comment='更新时间'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('stock_code', 'trade_date', name='uq_daily_bars_code_date')
+        )
+        with op.batch_alter_table('daily_bars', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_daily_bars_id'), ['id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_daily_bars_stock_code'), ['stock_code'], unique=False)
+            batch_op.create_index(batch_op.f('ix_daily_bars_trade_date'), ['trade_date'], unique=False)
+
+    if _missing('quote_snapshots'):
+        op.create_table('quote_snapshots',
+        sa.Column('stock_code', sa.String(length=10), nullable=False, comment='股票代码'),
+        sa.Column('ts', sa.DateTime(), nullable=False, comment='快照时间'),
+        sa.Column('price', sa.Float(), nullable=True, comment='价格'),
+        sa.Column('change_percent', sa.Float(), nullable=True, comment='涨跌幅(%)'),
+        sa.Column('volume', sa.Float(), nullable=True, comment='成交量(手)'),
+        sa.Column('turnover', sa.Float(), nullable=True, comment='成交额(元)'),
+        sa.Column('pe', sa.Float(), nullable=True, comment='市盈率'),
+        sa.Column('pb', sa.Float(), nullable=True, comment='市净率'),
+        sa.Column('market_cap', sa.Float(), nullable=True, comment='总市值(元)'),
+        sa.PrimaryKeyConstraint('stock_code', 'ts')
+        )
+
+    if _missing('screening_history'):
+        op.create_table('screening_history',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True, comment='用户ID(预留)'),
+        sa.Column('timestamp', sa.DateTime(), nullable=True, comment='筛选时间'),
+        sa.Column('criteria', sa.JSON(), nullable=True, comment='筛选条件(JSON格式)'),
+        sa.Column('result_count', sa.Integer(), nullable=True, comment='结果数量'),
+        sa.Column('avg_change', sa.Float(), nullable=True, comment='平均涨幅'),
+        sa.Column('top_stocks', sa.JSON(), nullable=True, comment='前3只股票名称'),
+        sa.Column('results', sa.JSON(), nullable=True, comment='筛选结果(只保存前10条)'),
+        sa.Column('created_at', sa.DateTime(), nullable=True, comment='创建时间'),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('screening_history', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_screening_history_id'), ['id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_screening_history_timestamp'), ['timestamp'], unique=False)
+            batch_op.create_index(batch_op.f('ix_screening_history_user_id'), ['user_id'], unique=False)
+
+    if _missing('stock_quotes'):
+        op.create_table('stock_quotes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('stock_code', sa.String(length=10), nullable=False, comment='股票代码'),
+        sa.Column('price', sa.Float(), nullable=True, comment='当前价格'),
+        sa.Column('change_percent', sa.Float(), nullable=True, comment='涨跌幅(%)'),
+        sa.Column('volume', sa.String(length=20), nullable=True, comment='成交量'),
+        sa.Column('turnover', sa.String(length=20), nullable=True, comment='成交额'),
+        sa.Column('pe', sa.Float(), nullable=True, comment='市盈率'),
+        sa.Column('pb', sa.Float(), nullable=True, comment='市净率'),
+        sa.Column('market_cap', sa.String(length=20), nullable=True, comment='总市值'),
+        sa.Column('timestamp', sa.DateTime(), nullable=True, comment='数据时间戳'),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('stock_quotes', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_stock_quotes_id'), ['id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_stock_quotes_stock_code'), ['stock_code'], unique=False)
+            batch_op.create_index(batch_op.f('ix_stock_quotes_timestamp'), ['timestamp'], unique=False)
+
+    if _missing('stocks'):
+        op.create_table('stocks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('code', sa.String(length=10), nullable=False, comment='股票代码'),
+        sa.Column('name', sa.String(length=50), nullable=False, comment='股票名称'),
+        sa.Column('industry', sa.String(length=30), nullable=True, comment='所属行业'),
+        sa.Column('market', sa.String(length=20), nullable=True, comment='市场类型(沪市/深市/创业板等)'),
+        sa.Column('description', sa.Text(), nullable=True, comment='公司简介'),
+        sa.Column('created_at', sa.DateTime(), nullable=True, comment='创建时间'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True, comment='更新时间'),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('stocks', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_stocks_code'), ['code'], unique=True)
+            batch_op.create_index(batch_op.f('ix_stocks_id'), ['id'], unique=False)
+
+    if _missing('watchlist'):
+        op.create_table('watchlist',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True, comment='用户ID'),
+        sa.Column('stock_code', sa.String(length=10), nullable=False, comment='股票代码'),
+        sa.Column('notes', sa.Text(), nullable=True, comment='备注'),
+        sa.Column('created_at', sa.DateTime(), nullable=True, comment='添加时间'),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('watchlist', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_watchlist_id'), ['id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_watchlist_stock_code'), ['stock_code'], unique=False)
+            batch_op.create_index(batch_op.f('ix_watchlist_user_id'), ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('watchlist', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_watchlist_user_id'))
+        batch_op.drop_index(batch_op.f('ix_watchlist_stock_code'))
+        batch_op.drop_index(batch_op.f('ix_watchlist_id'))
+
+    op.drop_table('watchlist')
+    with op.batch_alter_table('stocks', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stocks_id'))
+        batch_op.drop_index(batch_op.f('ix_stocks_code'))
+
+    op.drop_table('stocks')
+    with op.batch_alter_table('stock_quotes', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stock_quotes_timestamp'))
+        batch_op.drop_index(batch_op.f('ix_stock_quotes_stock_code'))
+        batch_op.drop_index(batch_op.f('ix_stock_quotes_id'))
+
+    op.drop_table('stock_quotes')
+    with op.batch_alter_table('screening_history', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_screening_history_user_id'))
+        batch_op.drop_index(batch_op.f('ix_screening_history_timestamp'))
+        batch_op.drop_index(batch_op.f('ix_screening_history_id'))
+
+    op.drop_table('screening_history')
+    op.drop_table('quote_snapshots')
+    with op.batch_alter_table('daily_bars', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_daily_bars_trade_date'))
+        batch_op.drop_index(batch_op.f('ix_daily_bars_stock_code'))
+        batch_op.drop_index(batch_op.f('ix_daily_bars_id'))
+
+    op.drop_table('daily_bars')
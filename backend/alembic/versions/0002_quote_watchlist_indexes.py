@@ -0,0 +1,48 @@
+"""行情与自选股索引
+
+- stock_quotes.stock_code 改为唯一索引：行情入库改用 INSERT ... ON CONFLICT (stock_code) DO UPDATE，
+  不再逐行 SELECT 后再更新；建索引前清理重复行，每只股票只保留时间戳最新的一行
+  （每只股票至多一行，按股票取最新行情的 order_by(timestamp.desc()) 也不再需要排序，
+  因此不另建 (stock_code, timestamp DESC) 组合索引，见 explain_indexes.py）
+- watchlist (user_id, stock_code)：替换只覆盖 user_id 的单列索引
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 14:05:12.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "DELETE FROM stock_quotes WHERE EXISTS ("
+        " SELECT 1 FROM stock_quotes newer"
+        " WHERE newer.stock_code = stock_quotes.stock_code"
+        " AND (newer.timestamp > stock_quotes.timestamp"
+        "      OR (stock_quotes.timestamp IS NULL AND newer.timestamp IS NOT NULL)"
+        "      OR ((newer.timestamp = stock_quotes.timestamp"
+        "           OR (newer.timestamp IS NULL AND stock_quotes.timestamp IS NULL))"
+        "          AND newer.id > stock_quotes.id)))"
+    )
+    op.drop_index('ix_stock_quotes_stock_code', table_name='stock_quotes')
+    op.create_index('ix_stock_quotes_stock_code', 'stock_quotes', ['stock_code'], unique=True)
+
+    op.create_index('ix_watchlist_user_code', 'watchlist', ['user_id', 'stock_code'])
+    op.drop_index('ix_watchlist_user_id', table_name='watchlist')
+
+
+def downgrade() -> None:
+    op.create_index('ix_watchlist_user_id', 'watchlist', ['user_id'])
+    op.drop_index('ix_watchlist_user_code', table_name='watchlist')
+
+    op.drop_index('ix_stock_quotes_stock_code', table_name='stock_quotes')
+    op.create_index('ix_stock_quotes_stock_code', 'stock_quotes', ['stock_code'])
@@ -0,0 +1,107 @@
+"""行情成交量/成交额/市值改为数值列
+
+stock_quotes 的 volume/turnover/market_cap 原为 String(20)，存的是 "232020.0"（全市场接口，单位手）
+或 "1.23万手"、"45.60亿" 这类格式化文本，无法在SQL中过滤和排序。改为基本单位的数值：
+volume BIGINT（股）、turnover DOUBLE（元）、market_cap DOUBLE（元），原有行按文本解析回填。
+
+旧版把 baostock 的成交量（股）也标成了"手"，回填时统一按"手"换算，
+这些行在下一次行情刷新时会被覆盖，不影响后续数据。
+
+quote_snapshots.volume 同步由手改为股。
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 15:12:47.604113
+
+"""
+import re
+from typing import Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+_UNITS = (('万亿', 1e12), ('亿', 1e8), ('万', 1e4))
+
+
+def parse_amount(text: Optional[str]) -> Optional[float]:
+    """'1.23亿' / '45.6万手' / '3650138640.0' -> 数值（单位换算后，不含"手"的换算）"""
+    if text is None:
+        return None
+    match = _NUMBER.search(str(text))
+    if not match:
+        return None
+    value = float(match.group())
+    for unit, factor in _UNITS:
+        if unit in text:
+            return value * factor
+    return value
+
+
+_quotes = sa.table('stock_quotes', sa.column('id'), sa.column('volume'), sa.column('turnover'), sa.column('market_cap'))
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    old = conn.execute(sa.select(_quotes.c.id, _quotes.c.volume, _quotes.c.turnover, _quotes.c.market_cap)).all()
+
+    # Postgres不能把文本直接转为数值，先清空，下面按解析结果回填（SQLite复制表时按CAST复制，同样会被回填覆盖）
+    with op.batch_alter_table('stock_quotes') as batch_op:
+        batch_op.alter_column('volume', type_=sa.BigInteger(), existing_type=sa.String(length=20),
+                              comment='成交量(股)', existing_comment='成交量',
+                              postgresql_using='NULL::bigint')
+        batch_op.alter_column('turnover', type_=sa.Float(), existing_type=sa.String(length=20),
+                              comment='成交额(元)', existing_comment='成交额',
+                              postgresql_using='NULL::double precision')
+        batch_op.alter_column('market_cap', type_=sa.Float(), existing_type=sa.String(length=20),
+                              comment='总市值(元)', existing_comment='总市值',
+                              postgresql_using='NULL::double precision')
+
+    rows = []
+    for id_, volume, turnover, market_cap in old:
+        lots = parse_amount(volume)
+        rows.append({
+            'row_id': id_,
+            'volume': None if lots is None else int(round(lots * 100)),
+            'turnover': parse_amount(turnover),
+            'market_cap': parse_amount(market_cap),
+        })
+    if rows:
+        conn.execute(
+            _quotes.update().where(_quotes.c.id == sa.bindparam('row_id')).values(
+                volume=sa.bindparam('volume'),
+                turnover=sa.bindparam('turnover'),
+                market_cap=sa.bindparam('market_cap'),
+            ),
+            rows,
+        )
+
+    op.execute("UPDATE quote_snapshots SET volume = volume * 100")
+    if conn.dialect.supports_comments:  # SQLite没有列注释，不为改注释复制整张快照表
+        op.alter_column('quote_snapshots', 'volume', existing_type=sa.Float(),
+                        comment='成交量(股)', existing_comment='成交量(手)')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.supports_comments:
+        op.alter_column('quote_snapshots', 'volume', existing_type=sa.Float(),
+                        comment='成交量(手)', existing_comment='成交量(股)')
+    op.execute("UPDATE quote_snapshots SET volume = volume / 100")
+
+    op.execute("UPDATE stock_quotes SET volume = volume / 100")  # 股 -> 手
+    with op.batch_alter_table('stock_quotes') as batch_op:
+        batch_op.alter_column('volume', type_=sa.String(length=20), existing_type=sa.BigInteger(),
+                              comment='成交量', existing_comment='成交量(股)',
+                              postgresql_using='volume::text')
+        batch_op.alter_column('turnover', type_=sa.String(length=20), existing_type=sa.Float(),
+                              comment='成交额', existing_comment='成交额(元)',
+                              postgresql_using='turnover::text')
+        batch_op.alter_column('market_cap', type_=sa.String(length=20), existing_type=sa.Float(),
+                              comment='总市值', existing_comment='总市值(元)',
+                              postgresql_using='market_cap::text')
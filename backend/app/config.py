@@ -10,23 +10,110 @@ class Settings(BaseSettings):
 
     # 数据库配置
     DATABASE_URL: str = "sqlite:///./stock_analysis.db"
+    DB_POOL_SIZE: int = 10  # 常驻连接数（上游线程池 + API线程池的并发读）
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+
+    # SQLite性能配置（每个新连接上执行的PRAGMA）
+    SQLITE_JOURNAL_MODE: str = "WAL"  # WAL下读不阻塞写、写不阻塞读
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # WAL + NORMAL：只在检查点fsync，断电最多丢失最后几个事务
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024  # 每个连接的页缓存
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # 遇到写锁时等待而不是立即报 database is locked
+
+    # 行情快照历史（quote_snapshots，只追加）；未设置时只在Postgres上开启
+    QUOTE_HISTORY_ENABLED: Optional[bool] = None
+    TIMESCALEDB_ENABLED: bool = True  # Postgres上有timescaledb扩展时转为hypertable
+    QUOTE_HISTORY_CHUNK_INTERVAL: str = "1 day"
+    QUOTE_HISTORY_COMPRESS_AFTER_DAYS: int = 7
+    QUOTE_HISTORY_RETENTION_DAYS: int = 365
+
+    # 后台写入队列（单写线程串行执行批量/异步写入）
+    DB_WRITER_QUEUE_SIZE: int = 1000
+
+    # 多进程部署（uvicorn --workers N / gunicorn）：设置共享目录后各worker共享全市场快照、筛选任务和热点缓存，
+    # 由持有文件锁的一个worker负责全市场数据的上游刷新；未设置时为单进程模式
+    SHARED_STATE_DIR: Optional[str] = None  # 建议放在tmpfs上，如 /dev/shm/stock-analysis
+    SHARED_STORE_URL: Optional[str] = None  # redis://host:6379/0 时任务和热点缓存存Redis，否则用共享目录下的SQLite
+    SHARED_SNAPSHOT_POLL_SECONDS: float = 1.0  # 检查其他worker发布的新快照的间隔
+    SHARED_UPSTREAM_CLAIM_SECONDS: float = 5.0  # 非上游worker重新竞选上游的间隔
+
+    # 独立采集进程（python -m app.ingest）：负责全部上游访问和定时采集任务。
+    # API进程设置 INGEST_EXTERNAL=true 后不再访问上游，只读采集进程发布的快照（共享目录或数据库）和本地日线
+    INGEST_EXTERNAL: bool = False
+    INGEST_BARS_AT: str = "15:40"  # 交易日收盘后同步日线并重建价格面板（HH:MM）
+    INGEST_FUNDAMENTALS_AT: str = "16:10"  # 交易日收盘后更新PE/PB（HH:MM）
 
     # API配置
     API_HOST: str = "0.0.0.0"
     API_PORT: int = 8000
     API_PREFIX: str = "/api"
 
-    # 数据更新配置
-    UPDATE_INTERVAL_MINUTES: int = 60  # 小时级更新
+    # 数据更新配置：按A股交易时段调度（见 app/services/trading_calendar.py），盘中频繁刷新、收盘后刷新一次，
+    # 夜间和节假日不访问上游；ENABLE_SCHEDULER=false 时按固定TTL（5分钟）在请求中按需刷新
     ENABLE_SCHEDULER: bool = True
+    UPDATE_INTERVAL_MINUTES: int = 60  # 交易日股票列表刷新间隔
+    SPOT_SESSION_SECONDS: int = 60  # 交易时段内全市场行情刷新间隔
+    SPOT_CLOSE_DELAY_SECONDS: int = 120  # 午休开始/收盘后等待多久刷新一次收盘数据
+    TRADING_CALENDAR_FILE: str = "data/trade_calendar.json"  # 交易日历缓存文件
+
+    # 筛选：行情表中不超过该分钟数的行情直接用SQL筛选，其余股票联网获取
+    SCREENING_SQL_ENABLED: bool = True
+    SCREENING_FRESH_MINUTES: int = 30
+
+    # 本地数据文件配置
+    DATA_DIR: str = "data"
+    PRICE_PANEL_DIR: str = "data/price_panel"  # 内存映射价格面板目录
+    BAR_STORE_DEFAULT_DAYS: int = 365  # 日线存储首次同步的回溯天数
 
     # akshare配置
     AKSHARE_TIMEOUT: int = 30
 
+    # 启动预热（后台导入akshare/pandas并登录baostock，API不等待）
+    WARMUP_ON_STARTUP: bool = True
+    BAOSTOCK_LOGIN_RETRY_SECONDS: float = 30.0  # 登录失败后的重试间隔
+
+    # 上游同步调用（baostock/akshare）专用线程池大小，避免阻塞事件循环
+    UPSTREAM_EXECUTOR_WORKERS: int = 16
+
+    # 直连行情接口（全市场快照）
+    EASTMONEY_BASE_URL: str = "https://82.push2.eastmoney.com"
+    SINA_BASE_URL: str = "https://vip.stock.finance.sina.com.cn"
+    UPSTREAM_HTTP_TIMEOUT: float = 15.0
+    SPOT_PAGE_CONCURRENCY: int = 4  # 分页并发数（实际发送速率仍受按主机限速约束）
+
+    # 数据源熔断配置
+    SOURCE_BREAKER_FAILURE_THRESHOLD: int = 3  # 连续失败次数达到后熔断
+    SOURCE_BREAKER_ERROR_RATE: float = 0.5  # 滑动窗口错误率达到后熔断
+    SOURCE_BREAKER_COOLDOWN: float = 30.0  # 首次熔断冷却秒数，半开探测失败后翻倍
+    SOURCE_BREAKER_MAX_COOLDOWN: float = 600.0
+
+    # 对冲请求配置（单股行情：首选数据源超过p95未返回时请求次选数据源）
+    HEDGE_ENABLED: bool = True
+    HEDGE_BUDGET_RATIO: float = 0.1  # 对冲请求最多约占请求总数的10%
+    HEDGE_BUDGET_BURST: float = 5.0  # 令牌桶容量，允许短时突发
+    HEDGE_MIN_DELAY: float = 0.05  # 对冲等待下限（秒），避免p95很小时几乎每次都对冲
+    HEDGE_EXECUTOR_WORKERS: int = 16
+
     # DeepSeek配置
     DEEPSEEK_API_KEY: Optional[str] = None
     DEEPSEEK_API_URL: str = "https://api.deepseek.com/v1"
 
+    # 响应压缩配置
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024  # 小于该字节数的响应不压缩
+    COMPRESSION_GZIP_LEVEL: int = 4  # 6级对K线JSON耗时约2.5倍，体积只小5%
+    COMPRESSION_BROTLI_QUALITY: int = 1  # 1-11，1级的压缩率已接近gzip 6级且快得多
+
+    # 链路追踪配置（none / console / file）
+    TRACING_EXPORTER: str = "none"
+    TRACING_FILE: str = "logs/traces.jsonl"
+    TRACING_SAMPLE_RATIO: float = 1.0  # 根span采样比例，子span跟随父span
+
+    # 管理诊断接口（/api/admin/*），未设置令牌时不开放
+    ADMIN_TOKEN: Optional[str] = None
+    PROFILE_MAX_SECONDS: float = 60.0
+
     # 日志配置
     LOG_LEVEL: str = "INFO"
     LOG_FILE: str = "logs/app.log"
@@ -1,29 +1,112 @@
 """
 数据库连接配置
 """
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import StaticPool
 from app.config import settings
-from app.models import Base
+from app.services import quote_history
+from app.services.shared_state import shared_state
+from app.services.tracing import instrument_sessions
 import logging
 
 logger = logging.getLogger(__name__)
 
+IS_SQLITE = settings.DATABASE_URL.startswith("sqlite")
+
+# Alembic配置（backend/alembic.ini，迁移脚本在 backend/alembic/versions）
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _engine_options(url: str) -> dict:
+    """连接池配置"""
+    if url.startswith("sqlite"):
+        options = {
+            "connect_args": {
+                "check_same_thread": False,
+                "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000,
+            },
+        }
+        if url in ("sqlite://", "sqlite:///:memory:"):
+            # 内存库只存在于单个连接中，所有会话必须共用它
+            options["poolclass"] = StaticPool
+        else:
+            options.update(
+                pool_size=settings.DB_POOL_SIZE,
+                max_overflow=settings.DB_MAX_OVERFLOW,
+                pool_timeout=settings.DB_POOL_TIMEOUT,
+            )
+        return options
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_pre_ping": True,  # 数据库重启或连接被服务端断开后自动重连
+        "pool_recycle": 1800,
+    }
+
+
+def sqlite_pragmas() -> list:
+    """每个SQLite连接上执行的PRAGMA"""
+    return [
+        f"journal_mode={settings.SQLITE_JOURNAL_MODE}",
+        f"synchronous={settings.SQLITE_SYNCHRONOUS}",
+        f"mmap_size={settings.SQLITE_MMAP_SIZE}",
+        f"cache_size=-{settings.SQLITE_CACHE_SIZE_KB}",  # 负数表示KiB
+        f"busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+        "temp_store=MEMORY",
+    ]
+
+
 # 创建数据库引擎
 engine = create_engine(
     settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {},
-    echo=False  # 设置为True可看到SQL语句
+    echo=False,  # 设置为True可看到SQL语句
+    **_engine_options(settings.DATABASE_URL)
 )
 
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in sqlite_pragmas():
+                cursor.execute(f"PRAGMA {pragma}")
+        finally:
+            cursor.close()
+
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+instrument_sessions(SessionLocal)
+
+
+def alembic_config():
+    """Alembic配置（脚本目录使用绝对路径，不依赖当前工作目录）"""
+    from alembic.config import Config
+
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    return config
+
+
+def run_migrations(revision: str = "head") -> None:
+    """把数据库升级到指定版本（使用应用引擎的连接）"""
+    from alembic import command
+
+    config = alembic_config()
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, revision)
 
 
 def init_db():
-    """初始化数据库"""
+    """初始化数据库：执行迁移（新库建表，旧库补齐表和索引）；多个worker同时启动时串行执行"""
     try:
-        Base.metadata.create_all(bind=engine)
+        with shared_state.exclusive("migrate"):
+            run_migrations()
+            quote_history.setup(engine)
         logger.info("数据库初始化成功")
     except Exception as e:
         logger.error(f"数据库初始化失败: {e}")
@@ -0,0 +1,184 @@
+"""
+独立采集进程（与API进程分离）
+
+    python -m app.ingest                 # 常驻运行，按计划执行全部采集任务
+    python -m app.ingest --once spot     # 立即执行一次指定任务后退出（calendar / universe / spot / bars / fundamentals）
+
+负责全部上游访问（akshare / baostock / 东方财富 / 新浪）和定时任务，按A股交易时段调度（见 trading_calendar）：
+
+- calendar: 交易日历，每周
+- universe: 股票列表，交易日 09:00 至收盘每 UPDATE_INTERVAL_MINUTES 分钟
+- spot: 全市场行情（含PE/PB/总市值），交易时段内每 SPOT_SESSION_SECONDS 秒，午休开始和收盘后各一次
+- bars: 交易日 INGEST_BARS_AT 增量同步日线，并重建价格面板
+- fundamentals: 交易日 INGEST_FUNDAMENTALS_AT 更新PE/PB
+
+夜间、周末和节假日不访问上游（刚启动还没有数据时除外）。
+
+采集结果写入数据库（stocks / stock_quotes / daily_bars）；设置了 SHARED_STATE_DIR 时全市场快照同时发布到共享目录。
+API进程设置 INGEST_EXTERNAL=true 后只读这些数据、不再访问上游，可以任意增加进程数，也不受上游卡顿影响。
+同时启动多个采集进程时（需共享目录），只有持有上游锁的一个在工作，其余等待接替。
+"""
+import argparse
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Tuple
+
+from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+from app.config import settings
+from app.database import init_db
+from app.services import metrics
+from app.services.db_writer import db_writer
+from app.services.shared_state import shared_state
+from app.services.trading_calendar import now, trading_calendar
+
+logger = logging.getLogger("app.ingest")
+
+# 检查交易日历/股票列表/全市场行情是否到期的间隔
+TICK_SECONDS = 5
+
+
+# ==================== 采集任务 ====================
+
+def sync_universe() -> int:
+    """刷新股票列表（写入stocks表并发布到快照）"""
+    from app.services.data_fetcher import data_fetcher
+    return len(data_fetcher.get_stock_list())
+
+
+def refresh_spot() -> bool:
+    """刷新全市场行情（写入stock_quotes并发布到快照）"""
+    from app.services.data_fetcher import data_fetcher
+    return data_fetcher._refresh_spot_cache()
+
+
+def sync_bars() -> dict:
+    """增量同步全市场日线，并重建价格面板"""
+    from app.services.bar_store import bar_store
+    from app.services.price_panel import rebuild_from_store
+
+    result = bar_store.sync_all()
+    info = rebuild_from_store()
+    return {**result, 'panel': f"{len(info['dates'])} × {len(info['codes'])}"}
+
+
+def update_fundamentals() -> dict:
+    """批量更新PE/PB"""
+    from app.services.pe_pb_updater import pe_pb_updater
+    return pe_pb_updater.update_all_pe_pb()
+
+
+def refresh_calendar() -> bool:
+    """更新交易日历"""
+    return trading_calendar.refresh()
+
+
+JOBS = {
+    'calendar': refresh_calendar,
+    'universe': sync_universe,
+    'spot': refresh_spot,
+    'bars': sync_bars,
+    'fundamentals': update_fundamentals,
+}
+
+
+def run_job(name: str):
+    """执行一个采集任务（异常只记录日志，不影响后续调度）"""
+    start = time.perf_counter()
+    try:
+        result = JOBS[name]()
+    except Exception as e:
+        logger.error(f"采集任务 {name} 失败: {e}")
+        return None
+    logger.info(f"采集任务 {name} 完成，耗时 {time.perf_counter() - start:.1f}s: {result}")
+    return result
+
+
+# ==================== 调度 ====================
+
+def tick() -> None:
+    """执行到期的交易日历、股票列表、全市场行情刷新"""
+    from app.services.data_fetcher import data_fetcher
+
+    if settings.ENABLE_SCHEDULER and trading_calendar.needs_refresh():
+        run_job('calendar')
+    if data_fetcher.universe_refresh_due():
+        run_job('universe')
+    if data_fetcher.spot_refresh_due():
+        run_job('spot')
+
+
+def after_close(name: str) -> None:
+    """收盘后任务：只在交易日执行"""
+    if not trading_calendar.is_trading_day(now().date()):
+        logger.info(f"今天不是交易日，跳过采集任务 {name}")
+        return
+    run_job(name)
+
+
+def _at(value: str) -> Tuple[int, int]:
+    """'15:40' -> (15, 40)"""
+    hour, minute = value.split(":")
+    return int(hour), int(minute)
+
+
+def build_scheduler() -> BlockingScheduler:
+    scheduler = BlockingScheduler(
+        timezone="Asia/Shanghai",
+        # 任务耗时超过间隔时不并发执行、错过的多次只补一次
+        job_defaults={'coalesce': True, 'max_instances': 1, 'misfire_grace_time': 60},
+    )
+    scheduler.add_job(tick, IntervalTrigger(seconds=TICK_SECONDS), id='tick', next_run_time=now())
+    for name, at in (('bars', settings.INGEST_BARS_AT), ('fundamentals', settings.INGEST_FUNDAMENTALS_AT)):
+        hour, minute = _at(at)
+        scheduler.add_job(after_close, CronTrigger(hour=hour, minute=minute), args=[name], id=name)
+    return scheduler
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="独立采集进程")
+    parser.add_argument("--once", choices=list(JOBS), help="只执行一次指定任务后退出")
+    args = parser.parse_args(argv)
+
+    os.makedirs(os.path.dirname(settings.LOG_FILE) or ".", exist_ok=True)
+    logging.basicConfig(
+        level=getattr(logging, settings.LOG_LEVEL),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(settings.LOG_FILE),
+            logging.StreamHandler()
+        ]
+    )
+
+    init_db()
+    try:
+        if args.once:
+            if not shared_state.claim_upstream(wait=False):
+                logger.error("另一个采集进程正在运行（持有上游锁），退出")
+                return 1
+            return 0 if run_job(args.once) not in (None, False) else 1
+
+        # 另一个采集进程在运行时在这里等待，它退出后接替
+        shared_state.claim_upstream()
+        scheduler = build_scheduler()
+        signal.signal(signal.SIGTERM, lambda *_: scheduler.shutdown(wait=False))
+        logger.info(f"采集进程启动: {[job.id for job in scheduler.get_jobs()]}")
+        try:
+            scheduler.start()
+        except KeyboardInterrupt:
+            pass
+        logger.info("采集进程退出")
+        return 0
+    finally:
+        # 等待已排队的写入完成
+        db_writer.stop()
+        metrics.mark_process_dead()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,21 @@
 """
 FastAPI应用主入口
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 from app.database import init_db
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.metrics import MetricsMiddleware
+from app.services import metrics
+from app.services.tracing import setup_tracing, shutdown_tracing
+from app.services.warmup import readiness, warmup
+from app.services.db_writer import db_writer
+from app.services.market_refresher import market_refresher
+from app.services.shared_state import shared_state
+from app.services.source_router import source_router
 import logging
 
 # 配置日志
@@ -38,12 +49,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 响应压缩中间件（brotli/gzip，小响应不压缩）
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    )
+
+# 请求延迟指标（最后添加即最外层，计入压缩等中间件的耗时）
+app.add_middleware(MetricsMiddleware)
+
 
 @app.on_event("startup")
 async def startup_event():
     """应用启动时执行"""
     logger.info("应用启动中...")
+    setup_tracing()
+    metrics.setup_multiprocess()
     init_db()
+    if settings.WARMUP_ON_STARTUP:
+        # 后台导入重量级库、登录上游；API不等待，就绪状态见 /health/ready
+        warmup.start()
+    if shared_state.external:
+        # 独立采集进程负责上游：没有共享目录时从数据库加载采集进程发布的数据
+        if not shared_state.enabled:
+            market_refresher.start()
+    elif shared_state.enabled or settings.ENABLE_SCHEDULER:
+        # 按交易时段在后台刷新全市场数据；多进程部署时由持有上游锁的worker刷新，其余worker读取共享快照
+        market_refresher.start()
     logger.info("应用启动完成")
 
 
@@ -51,6 +86,11 @@ async def startup_event():
 async def shutdown_event():
     """应用关闭时执行"""
     logger.info("应用关闭")
+    await run_in_threadpool(market_refresher.stop)
+    # 等待已排队的写入完成
+    await run_in_threadpool(db_writer.stop)
+    shutdown_tracing()
+    metrics.mark_process_dead()
 
 
 @app.get("/")
@@ -66,21 +106,42 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """健康检查"""
+    """存活检查（不检查依赖，就绪状态见 /health/ready）"""
     return {
         "status": "healthy",
         "service": "stock-analysis-api"
     }
 
 
+@app.get("/health/ready")
+async def readiness_check():
+    """就绪检查：数据库可用且启动预热完成，否则返回503"""
+    ready, detail = await run_in_threadpool(readiness)
+    return JSONResponse(detail, status_code=200 if ready else 503)
+
+
+@app.get("/health/sources")
+async def source_health():
+    """上游数据源熔断状态、延迟分位数、错误率及当前路由顺序"""
+    return source_router.snapshot()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus指标（文本格式）"""
+    body, content_type = await run_in_threadpool(metrics.render)  # 任务数从共享存储读取
+    return Response(content=body, headers={"Content-Type": content_type})
+
+
 # 导入路由
-from app.routers import stocks, screening, screening_history, watchlist
+from app.routers import stocks, screening, screening_history, watchlist, admin
 
 # 注册路由
 app.include_router(stocks.router, prefix=settings.API_PREFIX)
 app.include_router(screening.router, prefix=settings.API_PREFIX)
 app.include_router(screening_history.router, prefix=settings.API_PREFIX)
 app.include_router(watchlist.router, prefix=settings.API_PREFIX)
+app.include_router(admin.router, prefix=settings.API_PREFIX)
 
 
 if __name__ == "__main__":
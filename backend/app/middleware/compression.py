@@ -0,0 +1,198 @@
+"""
+响应压缩中间件 - brotli / gzip
+
+- 按 Accept-Encoding 选择编码：优先 br（安装了brotli时），其次 gzip
+- 小于 minimum_size 的响应不压缩（压缩收益小于CPU开销）
+- 已压缩的内容（Parquet、图片等）和已带 Content-Encoding 的响应直接透传
+- 流式响应（如Arrow导出）逐块压缩并flush，不缓冲整个响应体
+- 大于 offload_size 的响应体在线程池中压缩（zlib/brotli会释放GIL），不阻塞事件循环
+"""
+import zlib
+from typing import Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli为可选依赖，缺失时只使用gzip
+    brotli = None
+
+# 本身已压缩、再压缩没有收益的媒体类型前缀
+DEFAULT_EXCLUDED_MEDIA_TYPES = (
+    "application/vnd.apache.parquet",
+    "application/x-parquet",
+    "application/zip",
+    "application/gzip",
+    "image/",
+    "video/",
+    "audio/",
+    "text/event-stream",
+)
+
+
+def _parse_accept_encoding(value: str) -> dict:
+    """解析Accept-Encoding为 {编码: q值}"""
+    result = {}
+    for part in value.split(","):
+        pieces = [p.strip() for p in part.split(";")]
+        if not pieces[0]:
+            continue
+        q = 1.0
+        for param in pieces[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        result[pieces[0].lower()] = q
+    return result
+
+
+class _Compressor:
+    """统一gzip/brotli的流式压缩接口"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits=31: 输出gzip格式（带gzip头和CRC）
+            self._gz = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        if self.encoding == "br":
+            out = self._br.process(data)
+            return out + self._br.flush() if flush else out
+        out = self._gz.compress(data)
+        return out + self._gz.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._br.finish()
+        return self._gz.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """brotli/gzip响应压缩中间件"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 4,
+        brotli_quality: int = 1,
+        offload_size: int = 64 * 1024,
+        excluded_media_types: Tuple[str, ...] = DEFAULT_EXCLUDED_MEDIA_TYPES,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.excluded_media_types = excluded_media_types
+
+    def select_encoding(self, accept_encoding: str) -> Optional[str]:
+        accepted = _parse_accept_encoding(accept_encoding)
+        wildcard = accepted.get("*", 0.0)
+        candidates = []
+        if brotli is not None:
+            candidates.append(("br", accepted.get("br", wildcard)))
+        candidates.append(("gzip", accepted.get("gzip", wildcard)))
+        # q值相同时保持br优先
+        encoding, q = max(candidates, key=lambda item: item[1])
+        return encoding if q > 0 else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self.select_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """包装send：根据首个响应体块决定是否压缩"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.downstream = send
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            media_type = headers.get("content-type", "")
+            if (
+                "content-encoding" in headers
+                or message["status"] in (204, 304)
+                or any(media_type.startswith(t) for t in self.middleware.excluded_media_types)
+            ):
+                self.passthrough = True
+                await self.downstream(message)
+            return
+
+        if message_type != "http.response.body" or self.passthrough:
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+
+            if not more_body and len(body) < self.middleware.minimum_size:
+                # 小响应：原样发送
+                self.passthrough = True
+                await self.downstream(self.start_message)
+                await self.downstream(message)
+                return
+
+            self.compressor = _Compressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+
+            if not more_body:
+                # 完整响应：一次性压缩，给出准确的Content-Length
+                compressed = await self._compress(body, finish=True)
+                headers["Content-Length"] = str(len(compressed))
+                await self.downstream(self.start_message)
+                await self.downstream({"type": "http.response.body", "body": compressed})
+                return
+
+            # 流式响应：长度未知，去掉Content-Length
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            await self.downstream(self.start_message)
+
+        if more_body:
+            chunk = await self._compress(body, flush=True)
+            if chunk:
+                await self.downstream({"type": "http.response.body", "body": chunk, "more_body": True})
+        else:
+            chunk = await self._compress(body, finish=True)
+            await self.downstream({"type": "http.response.body", "body": chunk})
+
+    def _compress_sync(self, body: bytes, flush: bool, finish: bool) -> bytes:
+        if finish:
+            return self.compressor.compress(body) + self.compressor.finish()
+        return self.compressor.compress(body, flush=flush)
+
+    async def _compress(self, body: bytes, flush: bool = False, finish: bool = False) -> bytes:
+        if len(body) >= self.middleware.offload_size:
+            return await run_in_threadpool(self._compress_sync, body, flush, finish)
+        return self._compress_sync(body, flush, finish)
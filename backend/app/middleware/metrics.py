@@ -0,0 +1,60 @@
+"""
+请求延迟指标中间件
+
+路由标签使用路由模板（/api/stocks/{code}），而不是实际路径，避免标签基数随股票代码膨胀；
+未匹配任何路由的请求统一记为 "unmatched"。
+请求结束时顺带刷新本进程的Gauge（按间隔节流），多进程模式下未响应采集的worker也能输出当前值。
+"""
+import time
+from typing import Dict
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.metrics import REQUEST_LATENCY, refresh_local_gauges
+
+EXCLUDED_PATHS = ("/metrics",)
+
+
+class MetricsMiddleware:
+    """记录每个请求的延迟（按方法、路由模板、状态码）"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._templates: Dict[object, str] = {}
+
+    def _route_template(self, scope: Scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        template = self._templates.get(endpoint)
+        if template is None:
+            # Starlette在路由匹配后把endpoint写回scope；首次遇到时从应用路由表反查模板
+            template = "unmatched"
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    template = route.path
+                    break
+            self._templates[endpoint] = template
+        return template
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in EXCLUDED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_LATENCY.labels(
+                scope["method"], self._route_template(scope), str(status_code)
+            ).observe(time.perf_counter() - start)
+            refresh_local_gauges()
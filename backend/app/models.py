@@ -1,7 +1,7 @@
 """
 数据库模型定义
 """
-from sqlalchemy import Column, String, Float, Integer, DateTime, Text, JSON
+from sqlalchemy import Column, String, Float, Integer, BigInteger, DateTime, Text, JSON, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -23,18 +23,18 @@ class Stock(Base):
 
 
 class StockQuote(Base):
-    """股票行情表"""
+    """股票行情表（每只股票一行，行情入库按 stock_code upsert）"""
     __tablename__ = "stock_quotes"
 
     id = Column(Integer, primary_key=True, index=True)
-    stock_code = Column(String(10), index=True, nullable=False, comment="股票代码")
+    stock_code = Column(String(10), unique=True, index=True, nullable=False, comment="股票代码")
     price = Column(Float, comment="当前价格")
     change_percent = Column(Float, comment="涨跌幅(%)")
-    volume = Column(String(20), comment="成交量")
-    turnover = Column(String(20), comment="成交额")
+    volume = Column(BigInteger, comment="成交量(股)")
+    turnover = Column(Float, comment="成交额(元)")
     pe = Column(Float, comment="市盈率")
     pb = Column(Float, comment="市净率")
-    market_cap = Column(String(20), comment="总市值")
+    market_cap = Column(Float, comment="总市值(元)")
     timestamp = Column(DateTime, default=datetime.now, index=True, comment="数据时间戳")
 
 
@@ -56,9 +56,54 @@ class ScreeningHistory(Base):
 class Watchlist(Base):
     """自选股表"""
     __tablename__ = "watchlist"
+    __table_args__ = (
+        # 自选股查重/删除按 (user_id, stock_code) 查找；也覆盖只按 user_id 的列表查询
+        Index("ix_watchlist_user_code", "user_id", "stock_code"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, index=True, comment="用户ID")
+    user_id = Column(Integer, comment="用户ID")
     stock_code = Column(String(10), index=True, nullable=False, comment="股票代码")
     notes = Column(Text, comment="备注")
     created_at = Column(DateTime, default=datetime.now, comment="添加时间")
+
+
+class DailyBar(Base):
+    """日K线表（本地日线存储，前复权）"""
+    __tablename__ = "daily_bars"
+    __table_args__ = (
+        UniqueConstraint("stock_code", "trade_date", name="uq_daily_bars_code_date"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    stock_code = Column(String(10), index=True, nullable=False, comment="股票代码")
+    trade_date = Column(String(10), index=True, nullable=False, comment="交易日期(YYYY-MM-DD)")
+    open = Column(Float, comment="开盘价")
+    high = Column(Float, comment="最高价")
+    low = Column(Float, comment="最低价")
+    close = Column(Float, comment="收盘价")
+    volume = Column(Float, comment="成交量(股)")
+    amount = Column(Float, comment="成交额(元)")
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, comment="更新时间")
+
+
+class QuoteSnapshot(Base):
+    """
+    行情快照表（只追加，保留盘中/每日行情历史）
+
+    stock_quotes 每只股票只有一行（原地更新，作为最新行情表服务热点读取），
+    每次行情入库同时向本表追加一行。Postgres + TimescaleDB 下按 ts 分区为hypertable，
+    带压缩和保留策略（见 app.services.quote_history）。
+    """
+    __tablename__ = "quote_snapshots"
+
+    # 主键包含分区列 ts（TimescaleDB要求唯一约束包含分区列）
+    stock_code = Column(String(10), primary_key=True, comment="股票代码")
+    ts = Column(DateTime, primary_key=True, comment="快照时间")
+    price = Column(Float, comment="价格")
+    change_percent = Column(Float, comment="涨跌幅(%)")
+    volume = Column(Float, comment="成交量(股)")
+    turnover = Column(Float, comment="成交额(元)")
+    pe = Column(Float, comment="市盈率")
+    pb = Column(Float, comment="市净率")
+    market_cap = Column(Float, comment="总市值(元)")
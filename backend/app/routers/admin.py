@@ -0,0 +1,89 @@
+"""
+管理诊断API路由（需要 X-Admin-Token）
+
+未配置 ADMIN_TOKEN 时整组接口返回404，避免在未设防的部署上暴露进程内部信息。
+"""
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.services.profiler import ProfilerBusy, container_stats, memory_tracker, stack_sampler
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """校验管理令牌"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="管理令牌无效")
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["管理"],
+    dependencies=[Depends(require_admin)],
+    include_in_schema=False,
+)
+
+
+# ==================== CPU剖析 ====================
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def cpu_profile(
+    seconds: float = Query(10.0, gt=0, description="采样时长（秒）"),
+    interval_ms: float = Query(5.0, ge=1, le=1000, description="采样间隔（毫秒）"),
+    thread: Optional[str] = Query(None, description="只采样名称以此开头的线程，如 upstream、MainThread"),
+):
+    """
+    采样当前进程所有线程的调用栈，返回折叠栈文本
+
+    用法:
+        curl -H "X-Admin-Token: $TOKEN" "http://host:8000/api/admin/profile?seconds=30" > cpu.folded
+        flamegraph.pl cpu.folded > cpu.svg   # 或拖进 https://www.speedscope.app
+    """
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"采样时长不能超过 {settings.PROFILE_MAX_SECONDS} 秒")
+    try:
+        # 在线程池中采样，事件循环照常处理请求（也会出现在采样结果中）
+        stacks = await run_in_threadpool(stack_sampler.profile, seconds, interval_ms / 1000, thread)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(stack_sampler.folded(stacks))
+
+
+# ==================== 内存快照 ====================
+
+@router.get("/memory")
+async def memory_status():
+    """tracemalloc状态及各缓存容器的条目数、近似大小"""
+    return {**memory_tracker.status(), "containers": await run_in_threadpool(container_stats)}
+
+
+@router.post("/memory/snapshot")
+async def memory_snapshot(frames: int = Query(10, ge=1, le=50, description="记录的调用栈深度")):
+    """开始追踪内存分配（如未开始）并保存基线快照"""
+    return await run_in_threadpool(memory_tracker.snapshot, frames)
+
+
+@router.get("/memory/diff")
+async def memory_diff(
+    limit: int = Query(25, ge=1, le=200),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    rebase: bool = Query(False, description="对比后把当前快照作为新基线"),
+):
+    """与基线快照对比，按增长量列出分配位置"""
+    try:
+        return await run_in_threadpool(memory_tracker.diff, limit, group_by, rebase)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.delete("/memory")
+async def memory_stop():
+    """停止内存追踪（tracemalloc本身约有30%的内存与速度开销）"""
+    memory_tracker.stop()
+    return {"tracing": False}
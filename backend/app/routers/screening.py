@@ -1,16 +1,29 @@
 """
 筛选相关API路由 - 异步并发版本
 """
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Query, Request, Response
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
+import json
 import logging
+import secrets
 from datetime import datetime
 import asyncio
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from app.database import SessionLocal
 
 from app.services.data_fetcher import data_fetcher
+from app.services import quote_screener
+from app.services.screening_funnel import ScreeningFunnel
 from app.services.task_manager import task_manager, TaskStatus
-from app.services.pe_pb_calculator import pe_pb_calculator
+from app.services.columnar_export import negotiate_format, columnar_response, records_table
+from app.services.compact_payload import to_table, compact_response
+from app.services.quote_format import VolumeText, MarketCapText, format_quote_fields
+from app.services.http_cache import make_etag, is_not_modified, not_modified_response, apply_cache_headers
+from app.services.metrics import SCREENING_TASK_DURATION, SCREENING_THROUGHPUT
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +45,7 @@ class ScreeningCriteria(BaseModel):
     pbMax: Optional[float] = Field(None, description="最大市净率")
     marketCapMin: Optional[float] = Field(None, description="最小市值（亿）")
     changeType: Optional[str] = Field("all", description="涨跌幅类型: all/up/down")
+    trend: bool = Field(False, description="趋势筛选（第2层）: MA20>MA100、近20日涨幅>-5%、5日均量>20日均量")
 
 
 class ScreeningResult(BaseModel):
@@ -41,13 +55,23 @@ class ScreeningResult(BaseModel):
     name: str
     price: float
     change: float
-    volume: str
+    volume: VolumeText
     pe: Optional[float] = None
     pb: Optional[float] = None
-    market_cap: str
+    market_cap: MarketCapText
     industry: str
 
 
+class ScreeningStage(BaseModel):
+    """漏斗筛选一层的执行情况"""
+    name: str = Field(description="snapshot/quotes/trend/upstream")
+    cost: int = Field(description="数据成本，按升序执行")
+    input: int
+    output: int
+    seconds: float
+    fetched: int = Field(0, description="逐只联网获取的股票数")
+
+
 class ScreeningResponse(BaseModel):
     """筛选响应"""
     taskId: str
@@ -55,6 +79,17 @@ class ScreeningResponse(BaseModel):
     message: str
 
 
+class ScreeningQueryResponse(BaseModel):
+    """同步筛选（行情表）响应"""
+    results: List[ScreeningResult]
+    total: int
+    page: int
+    pageSize: int
+    totalPages: int
+    staleCount: int = Field(description="行情过期或缺失、未参与筛选的股票数")
+    freshSince: datetime = Field(description="参与筛选的行情时间下限")
+
+
 class TaskStatusResponse(BaseModel):
     """任务状态响应"""
     taskId: str
@@ -64,6 +99,7 @@ class TaskStatusResponse(BaseModel):
     progress: float
     resultCount: int
     error: Optional[str] = None
+    stages: List[ScreeningStage] = Field(default_factory=list, description="漏斗各层的输入/输出数量和耗时（完成后）")
     results: Optional[List[ScreeningResult]] = None
 
 
@@ -103,109 +139,30 @@ STRATEGY_CONFIGS = {
 }
 
 
-# ==================== 异步筛选核心逻辑 ====================
-
-async def fetch_stock_data(stock: dict) -> Optional[dict]:
-    """
-    异步获取单只股票的完整数据（行情 + 指标）
+# 策略配置只随代码发布变化，ETag在导入时计算一次
+STRATEGIES_ETAG = make_etag("strategies", json.dumps(STRATEGY_CONFIGS, sort_keys=True, ensure_ascii=False))
 
-    简化版本：只获取最新一天的数据，使用baostock稳定接口
 
-    Args:
-        stock: 股票基本信息 {code, name, industry, market}
-
-    Returns:
-        完整股票数据或None
-    """
-    code = stock['code']
-    try:
-        # 直接获取最新一天行情（不使用预热缓存）
-        quote_data = await asyncio.to_thread(data_fetcher.get_stock_quote_latest, code)
-
-        if not quote_data:
-            return None  # 静默失败
-
-        price = quote_data.get('price', 0)
-
-        # 计算PE（使用baostock的epsTTM）
-        pe = None
-        if price and price > 0:
-            pe = await asyncio.to_thread(pe_pb_calculator.get_stock_pe, code, price)
-
-        # PB暂时不可用
-        pb = None
-
-        # 合并数据
-        return {
-            **stock,
-            'price': price,
-            'change': quote_data.get('change', 0),
-            'volume': quote_data.get('volume', '0'),
-            'pe': pe,  # 基于epsTTM计算
-            'pb': pb,  # 暂时不可用
-            'market_cap': '未知',  # 历史数据中没有市值
-            'market_cap_value': 0
-        }
-
-    except Exception:
-        return None  # 静默失败，不输出日志
-
-
-def filter_stock(stock: dict, criteria: dict) -> bool:
-    """
-    根据条件筛选股票
-
-    Args:
-        stock: 股票数据
-        criteria: 筛选条件
+def build_final_criteria(criteria: ScreeningCriteria) -> Dict:
+    """应用策略预设值，合并用户自定义条件"""
+    strategy_config = STRATEGY_CONFIGS.get(criteria.strategy, STRATEGY_CONFIGS["平衡型"])
+    return {
+        "peMin": criteria.peMin if criteria.peMin is not None else strategy_config["peMin"],
+        "peMax": criteria.peMax if criteria.peMax is not None else strategy_config["peMax"],
+        "pbMin": criteria.pbMin if criteria.pbMin is not None else strategy_config["pbMin"],
+        "pbMax": criteria.pbMax if criteria.pbMax is not None else strategy_config["pbMax"],
+        "marketCapMin": criteria.marketCapMin if criteria.marketCapMin is not None else strategy_config["marketCapMin"],
+        "changeType": criteria.changeType if criteria.changeType != "all" else strategy_config["changeType"],
+        "industry": criteria.industry if criteria.industry != "全部" else None,
+        "trend": criteria.trend
+    }
 
-    Returns:
-        是否符合条件
-    """
-    # PE筛选（如果PE为None或0，跳过PE筛选）
-    pe_min = criteria.get('peMin')
-    pe_max = criteria.get('peMax')
-    pe = stock.get('pe')
-
-    # 只有 PE 有效值（大于0）时才进行筛选
-    if pe is not None and pe > 0:
-        if pe_min is not None and pe < pe_min:
-            return False
-        if pe_max is not None and pe > pe_max:
-            return False
-
-    # PB筛选（暂时跳过，因为PB数据不可用）
-    # pb_min = criteria.get('pbMin')
-    # pb_max = criteria.get('pbMax')
-    # pb = stock.get('pb')
-
-    # 市值筛选（暂时跳过，因为市值数据不可用）
-    # market_cap_min = criteria.get('marketCapMin')
-    # market_cap_value = stock.get('market_cap_value', 0)
-    # if market_cap_min is not None and market_cap_value < market_cap_min:
-    #     return False
-
-    # 涨跌幅筛选
-    change_type = criteria.get('changeType', 'all')
-    change = stock.get('change', 0)
-
-    if change_type == 'up' and change <= 0:
-        return False
-    if change_type == 'down' and change >= 0:
-        return False
-
-    # 行业筛选
-    industry = criteria.get('industry')
-    if industry and industry != '全部':
-        if stock.get('industry') != industry:
-            return False
-
-    return True
 
+# ==================== 异步筛选核心逻辑 ====================
 
 async def process_screening_task(task_id: str, criteria: ScreeningCriteria, final_criteria: dict):
     """
-    异步处理筛选任务
+    异步处理筛选任务（漏斗筛选，见 screening_funnel）
 
     Args:
         task_id: 任务ID
@@ -216,105 +173,58 @@ async def process_screening_task(task_id: str, criteria: ScreeningCriteria, fina
         logger.info(f"🚀 开始异步筛选任务: {task_id}")
 
         # 更新任务状态为处理中
-        task = task_manager.get_task(task_id)
+        task = await task_manager.aget_task(task_id, with_results=False)
         if not task:
             logger.error(f"任务不存在: {task_id}")
             return
 
-        task_manager.update_task(task_id, status=TaskStatus.PROCESSING)
+        await task_manager.aupdate_task(task_id, status=TaskStatus.PROCESSING)
+        started = time.perf_counter()
 
         # 1. 获取股票列表
-        all_stocks = data_fetcher.get_stock_list()
+        all_stocks = await data_fetcher.aget_stock_list()
         if not all_stocks:
             raise Exception("获取股票列表失败")
 
         total = len(all_stocks)
-        task_manager.update_task(task_id, total=total)
+        await task_manager.aupdate_task(task_id, total=total, processed=0)
 
         logger.info(f"📊 开始筛选 {total} 只股票")
 
-        # 2. 完全串行获取股票数据（避免触发接口限流）
-        # 去掉所有并行，一次只处理一只股票
-        BATCH_SIZE = 50
-        all_results = []
+        # 2. 按数据成本从低到高逐层筛选（快照 → 行情表 → 本地日线 → 逐只联网），
+        # 只有通过前面各层、但仍缺数据的股票才联网获取（进度按间隔节流写入）
+        funnel = ScreeningFunnel(
+            final_criteria,
+            on_progress=lambda processed: task_manager.report_progress(task_id, processed),
+        )
+        filtered_stocks = await funnel.run(all_stocks)
+
+        logger.info(f"✅ 筛选完成: {len(filtered_stocks)}/{total} 只股票符合条件")
 
-        # 串行处理函数
-        async def fetch_serial(stock, index):
-            try:
-                # 每次请求间隔0.3秒，避免触发限流
-                if index > 0:
-                    await asyncio.sleep(0.3)
-                return await asyncio.wait_for(fetch_stock_data(stock), timeout=15.0)
-            except asyncio.TimeoutError:
-                return None  # 超时返回None，继续处理下一个
-
-        # 不再预热全市场缓存，直接按需获取每只股票数据
-
-        # 统计变量
-        success_count = 0
-        fail_count = 0
-
-        for i in range(0, total, BATCH_SIZE):
-            batch = all_stocks[i:i + BATCH_SIZE]
-            batch_num = i // BATCH_SIZE + 1
-            total_batches = (total + BATCH_SIZE - 1) // BATCH_SIZE
-
-            # 每5批次打印一次日志
-            if batch_num % 5 == 0 or batch_num == 1:
-                logger.info(f"处理批次 {batch_num}/{total_batches}")
-
-            # 串行处理批次内的每只股票
-            batch_results = []
-            for idx, stock in enumerate(batch):
-                result = await fetch_serial(stock, i + idx)
-                if result is not None:
-                    batch_results.append(result)
-                    success_count += 1
-                else:
-                    fail_count += 1
-
-            all_results.extend(batch_results)
-
-            # 更新进度
-            processed = min(i + BATCH_SIZE, total)
-            task_manager.update_task(task_id, processed=processed)
-
-            # 每5批次打印一次进度
-            if batch_num % 5 == 0 or batch_num == total_batches:
-                logger.info(f"✅ 已完成 {processed}/{total} ({processed*100//total}%) - 成功: {success_count}, 失败: {fail_count}")
-
-        # 3. 打印数据获取汇总
-        logger.info(f"📊 数据获取完成: 总计 {total} 只股票, 成功获取 {success_count} 只, 失败 {fail_count} 只")
-        logger.info(f"💡 提示: 失败的 {fail_count} 只股票可能是退市、停牌或无近期数据")
-
-        # 4. 应用筛选条件
-        logger.info(f"🔍 开始应用筛选条件")
-        filtered_stocks = [
-            stock for stock in all_results
-            if filter_stock(stock, final_criteria)
-        ]
-
-        logger.info(f"✅ 筛选完成: {len(filtered_stocks)}/{success_count} 只股票符合条件")
-
-        # 5. 排序（按涨跌幅降序）
-        filtered_stocks.sort(key=lambda x: x.get('change', 0), reverse=True)
-
-        # 6. 添加ID
+        # 3. 排序（按涨跌幅降序）
+        filtered_stocks.sort(key=lambda x: x.get('change') or 0, reverse=True)
+
+        # 4. 添加ID
         for idx, stock in enumerate(filtered_stocks):
             stock['id'] = idx + 1
 
-        # 7. 更新任务状态为完成
-        task_manager.update_task(
+        # 5. 更新任务状态为完成
+        await task_manager.aupdate_task(
             task_id,
             status=TaskStatus.COMPLETED,
-            results=filtered_stocks
+            results=filtered_stocks,
+            stages=[report.to_dict() for report in funnel.reports]
         )
 
+        elapsed = time.perf_counter() - started
+        SCREENING_TASK_DURATION.observe(elapsed)
+        SCREENING_THROUGHPUT.set(total / elapsed if elapsed > 0 else 0)
+
         logger.info(f"🎉 筛选任务完成: {task_id}")
 
     except Exception as e:
         logger.error(f"❌ 筛选任务失败: {e}")
-        task_manager.update_task(
+        await task_manager.aupdate_task(
             task_id,
             status=TaskStatus.FAILED,
             error=str(e)
@@ -336,33 +246,24 @@ async def screen_stocks(criteria: ScreeningCriteria):
     - **pbMin/pbMax**: 市净率范围
     - **marketCapMin**: 最小市值（亿）
     - **changeType**: 涨跌幅类型
+    - **trend**: 趋势筛选（由本地日线计算，见 trend_indicators）
 
+    按数据成本从低到高逐层筛选，任务完成后 stages 为各层的输入/输出数量和耗时。
     返回任务ID，通过 GET /screen/task/{task_id} 查询进度和结果
     """
     try:
         logger.info(f"📥 收到筛选请求: 策略={criteria.strategy}")
 
-        # 应用策略预设值
-        strategy_config = STRATEGY_CONFIGS.get(criteria.strategy, STRATEGY_CONFIGS["平衡型"])
-
-        # 合并用户自定义条件
-        final_criteria = {
-            "peMin": criteria.peMin if criteria.peMin is not None else strategy_config["peMin"],
-            "peMax": criteria.peMax if criteria.peMax is not None else strategy_config["peMax"],
-            "pbMin": criteria.pbMin if criteria.pbMin is not None else strategy_config["pbMin"],
-            "pbMax": criteria.pbMax if criteria.pbMax is not None else strategy_config["pbMax"],
-            "marketCapMin": criteria.marketCapMin if criteria.marketCapMin is not None else strategy_config["marketCapMin"],
-            "changeType": criteria.changeType if criteria.changeType != "all" else strategy_config["changeType"],
-            "industry": criteria.industry if criteria.industry != "全部" else None
-        }
+        # 应用策略预设值，合并用户自定义条件
+        final_criteria = build_final_criteria(criteria)
 
         logger.info(f"筛选条件: {final_criteria}")
 
-        # 生成任务ID
-        task_id = f"screen_{int(datetime.now().timestamp())}"
+        # 生成任务ID（加随机后缀：多个worker同一秒内创建的任务不会冲突）
+        task_id = f"screen_{int(datetime.now().timestamp())}_{secrets.token_hex(3)}"
 
         # 创建任务（立即返回，不等待）
-        task_manager.create_task(task_id, final_criteria)
+        await task_manager.acreate_task(task_id, final_criteria)
 
         # 使用asyncio.create_task启动真正的异步任务（不会阻塞响应）
         asyncio.create_task(
@@ -387,23 +288,97 @@ async def screen_stocks(criteria: ScreeningCriteria):
         raise HTTPException(status_code=500, detail=f"创建筛选任务失败: {str(e)}")
 
 
+@router.post("/query", response_model=ScreeningQueryResponse)
+async def query_stocks(
+    criteria: ScreeningCriteria,
+    page: int = Query(1, ge=1, description="页码"),
+    pageSize: int = Query(50, ge=1, le=500, description="每页数量"),
+    orderBy: str = Query("change", description="排序字段: change/price/pe/pb/volume/turnover/market_cap"),
+    order: str = Query("desc", pattern="^(asc|desc)$", description="排序方向: asc/desc"),
+):
+    """
+    同步筛选（行情表）
+
+    条件与 POST /screen 相同（不支持 trend），直接在 stock_quotes 上用SQL过滤、排序、分页，不联网获取，
+    只覆盖 SCREENING_FRESH_MINUTES 分钟内有行情的股票（staleCount 为未覆盖的股票数）。
+    """
+    final_criteria = build_final_criteria(criteria)
+    offset = (page - 1) * pageSize
+
+    def run():
+        db = SessionLocal()
+        try:
+            since = quote_screener.fresh_since()
+            total, rows = quote_screener.screen(
+                db, final_criteria, order_by=orderBy, descending=order == "desc",
+                limit=pageSize, offset=offset, since=since,
+            )
+            return since, total, rows, quote_screener.stale_count(db, since)
+        finally:
+            db.close()
+
+    try:
+        since, total, rows, stale = await run_in_threadpool(run)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return ScreeningQueryResponse(
+        results=[ScreeningResult(id=offset + idx + 1, **row) for idx, row in enumerate(rows)],
+        total=total,
+        page=page,
+        pageSize=pageSize,
+        totalPages=(total + pageSize - 1) // pageSize,
+        staleCount=stale,
+        freshSince=since,
+    )
+
+
 @router.get("/task/{task_id}", response_model=TaskStatusResponse)
-async def get_task_status(task_id: str):
+async def get_task_status(
+    task_id: str,
+    request: Request,
+    format: Optional[str] = Query(None, description="结果导出格式: arrow/parquet（也可通过Accept头协商）"),
+    compact: bool = Query(False, description="紧凑格式（结果为列头 + 元组数组）")
+):
     """
     查询筛选任务状态和结果
 
     - **task_id**: 任务ID
+    - **format**: arrow/parquet 时直接返回结果表（仅任务完成后可用）
+    - **compact**: 紧凑格式，results 返回 {columns, rows}
 
     返回任务进度、状态和结果（如果完成）
     """
     try:
-        task = task_manager.get_task(task_id)
+        task = await task_manager.aget_task(task_id)
 
         if not task:
             raise HTTPException(status_code=404, detail=f"任务不存在: {task_id}")
 
+        # 二进制列式导出（Arrow/Parquet）
+        fmt = negotiate_format(request.headers.get("accept"), format)
+        if fmt:
+            if task.status != TaskStatus.COMPLETED:
+                raise HTTPException(status_code=409, detail=f"任务尚未完成: {task_id}")
+            table = records_table(task.results, columns=list(ScreeningResult.model_fields.keys()))
+            return columnar_response(table, fmt, task_id)
+
         task_dict = task.to_dict()
 
+        if compact:
+            return compact_response({
+                'taskId': task_dict['task_id'],
+                'status': task_dict['status'],
+                'total': task_dict['total'],
+                'processed': task_dict['processed'],
+                'progress': task_dict['progress'],
+                'resultCount': task_dict['result_count'],
+                'error': task_dict.get('error'),
+                'stages': task_dict['stages'],
+                'results': to_table(map(format_quote_fields, task.results), ScreeningResult.model_fields.keys())
+                if task.status == TaskStatus.COMPLETED else None
+            })
+
         # 如果任务完成，返回结果
         results = None
         if task.status == TaskStatus.COMPLETED:
@@ -417,6 +392,7 @@ async def get_task_status(task_id: str):
             progress=task_dict['progress'],
             resultCount=task_dict['result_count'],
             error=task_dict.get('error'),
+            stages=task_dict['stages'],
             results=results
         )
 
@@ -428,14 +404,19 @@ async def get_task_status(task_id: str):
 
 
 @router.get("/tasks")
-async def get_all_tasks():
+async def get_all_tasks(
+    compact: bool = Query(False, description="紧凑格式（列头 + 元组数组，去掉重复的task_id字段）")
+):
     """
     获取所有任务列表
 
     返回所有筛选任务的列表
     """
     try:
-        tasks = task_manager.get_all_tasks()
+        tasks = await task_manager.aget_all_tasks()
+        if compact:
+            columns = [k for k in tasks[0].keys() if k != 'task_id'] if tasks else []
+            return compact_response({"tasks": to_table(tasks, columns)})
         return {"tasks": tasks}
 
     except Exception as e:
@@ -451,7 +432,7 @@ async def get_active_task():
     返回最近一个未完成的任务，用于恢复页面时检查
     """
     try:
-        task = task_manager.get_active_task()
+        task = await task_manager.aget_active_task()
         if not task:
             return {"active": False, "task": None}
 
@@ -475,7 +456,7 @@ async def cancel_task(task_id: str):
     用户离开筛选页面时可以选择取消任务
     """
     try:
-        success = task_manager.cancel_task(task_id)
+        success = await task_manager.acancel_task(task_id)
 
         if not success:
             raise HTTPException(status_code=404, detail=f"任务不存在: {task_id}")
@@ -494,13 +475,17 @@ async def cancel_task(task_id: str):
 
 
 @router.get("/strategies")
-async def get_strategies():
+async def get_strategies(request: Request, response: Response):
     """
     获取所有可用的筛选策略
 
-    返回策略列表及其配置
+    返回策略列表及其配置（支持 If-None-Match 条件请求）
     """
     try:
+        if is_not_modified(request, STRATEGIES_ETAG):
+            return not_modified_response(STRATEGIES_ETAG, "strategies")
+        apply_cache_headers(response, STRATEGIES_ETAG, "strategies")
+
         strategies = []
         for name, config in STRATEGY_CONFIGS.items():
             strategies.append({
@@ -534,6 +519,8 @@ async def update_pe_pb_data(background_tasks: BackgroundTasks):
 
     返回任务ID，实际更新在后台进行
     """
+    if data_fetcher.read_only:
+        raise HTTPException(status_code=409, detail="PE/PB由采集进程定时更新（INGEST_EXTERNAL=true），API进程不访问上游")
     try:
         from app.services.pe_pb_updater import pe_pb_updater
 
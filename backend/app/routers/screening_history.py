@@ -10,6 +10,7 @@ import logging
 
 from app.database import get_db
 from app.models import ScreeningHistory
+from app.services.metrics import db_write
 
 logger = logging.getLogger(__name__)
 
@@ -83,8 +84,9 @@ async def create_screening_history(
             results=history.results[:10]  # 只保存前10条
         )
 
-        db.add(db_history)
-        db.commit()
+        with db_write("save_screening_history"):
+            db.add(db_history)
+            db.commit()
         db.refresh(db_history)
 
         logger.info(f"✅ 筛选历史已保存，ID: {db_history.id}")
@@ -187,8 +189,9 @@ async def delete_screening_history(
         if not history:
             raise HTTPException(status_code=404, detail=f"筛选历史 {history_id} 不存在")
 
-        db.delete(history)
-        db.commit()
+        with db_write("delete_screening_history"):
+            db.delete(history)
+            db.commit()
 
         logger.info(f"✅ 筛选历史已删除: ID={history_id}")
 
@@ -221,8 +224,9 @@ async def clear_all_screening_history(
         count = db.query(ScreeningHistory).count()
 
         # 删除所有记录
-        db.query(ScreeningHistory).delete()
-        db.commit()
+        with db_write("clear_screening_history"):
+            db.query(ScreeningHistory).delete()
+            db.commit()
 
         logger.info(f"✅ 已清空 {count} 条筛选历史")
 
@@ -1,16 +1,29 @@
 """
 股票相关API路由
 """
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Response
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
 from typing import List
+import asyncio
 import logging
+from datetime import datetime
 
 from app.database import get_db
 from app.models import Stock, StockQuote
 from app.services.data_fetcher import data_fetcher
+from app.services import quote_history
+from app.services.columnar_export import (
+    negotiate_format, columnar_response, history_table, panel_table
+)
+from app.services.history_serializer import history_response, JSON_FORMATS
+from app.services.compact_payload import to_table, compact_response
+from app.services.quote_format import VolumeText, TurnoverText, MarketCapText, format_quote_fields
+from app.services.http_cache import (
+    make_etag, is_not_modified, not_modified_response, apply_cache_headers
+)
 
 logger = logging.getLogger(__name__)
 
@@ -31,10 +44,10 @@ class StockListItem(BaseModel):
     market: str
     price: Optional[float] = None
     change: Optional[float] = None
-    volume: Optional[str] = None
+    volume: Optional[VolumeText] = None
     pe: Optional[float] = None
     pb: Optional[float] = None
-    market_cap: Optional[str] = None
+    market_cap: Optional[MarketCapText] = None
     date: Optional[str] = None
 
     class Config:
@@ -62,8 +75,8 @@ class StockDetail(BaseModel):
     open: Optional[float] = None
     high: Optional[float] = None
     low: Optional[float] = None
-    volume: str
-    turnover: str
+    volume: VolumeText
+    turnover: TurnoverText
     date: str
     is_realtime: bool
     delay: str
@@ -80,6 +93,7 @@ async def get_stocks(
     search: Optional[str] = Query(None, description="搜索关键词（股票代码或名称）"),
     market: Optional[str] = Query(None, description="市场筛选"),
     with_quote: bool = Query(False, description="是否包含实时行情（较慢）"),
+    compact: bool = Query(False, description="紧凑格式（列头 + 元组数组）"),
     db: Session = Depends(get_db)
 ):
     """
@@ -90,6 +104,7 @@ async def get_stocks(
     - **search**: 搜索关键词（匹配股票代码或名称）
     - **market**: 市场筛选（沪市主板/深市主板/创业板/科创板）
     - **with_quote**: 是否包含实时行情（默认False，因为较慢）
+    - **compact**: 紧凑格式，stocks 返回 {columns, rows}
 
     返回分页的股票列表
     """
@@ -97,7 +112,7 @@ async def get_stocks(
         logger.info(f"获取股票列表: page={page}, pageSize={pageSize}, search={search}, market={market}")
 
         # 从数据获取服务获取股票列表
-        all_stocks = data_fetcher.get_stock_list()
+        all_stocks = await data_fetcher.aget_stock_list()
 
         if not all_stocks:
             raise HTTPException(status_code=500, detail="获取股票列表失败")
@@ -121,31 +136,43 @@ async def get_stocks(
         total = len(filtered_stocks)
         start = (page - 1) * pageSize
         end = start + pageSize
-        paginated_stocks = filtered_stocks[start:end]
-
-        # 添加ID字段
-        for i, stock in enumerate(paginated_stocks):
-            stock['id'] = start + i + 1
+        # 股票列表属于不可变的全市场快照，添加ID和行情前先复制
+        paginated_stocks = [
+            {**stock, 'id': start + i + 1}
+            for i, stock in enumerate(filtered_stocks[start:end])
+        ]
 
         # 仅在请求时添加实时行情数据（为每只股票获取最新行情）
         if with_quote:
             logger.info(f"获取实时行情数据，共 {len(paginated_stocks)} 只股票")
-            for stock in paginated_stocks:
-                try:
-                    quote = data_fetcher.get_stock_quote(stock['code'])
-                    if quote:
-                        stock.update({
-                            'price': quote.get('price'),
-                            'change': quote.get('change'),
-                            'volume': quote.get('volume'),
-                            'date': quote.get('date')
-                        })
-                except Exception as e:
-                    logger.warning(f"获取股票 {stock['code']} 行情失败: {e}")
-                    # 保持原值不变
+            # 并发获取（在上游线程池中执行，事件循环不阻塞）
+            quotes = await asyncio.gather(
+                *[data_fetcher.aget_stock_quote(stock['code']) for stock in paginated_stocks],
+                return_exceptions=True
+            )
+            for stock, quote in zip(paginated_stocks, quotes):
+                if isinstance(quote, Exception):
+                    logger.warning(f"获取股票 {stock['code']} 行情失败: {quote}")
+                    continue  # 保持原值不变
+                if quote:
+                    stock.update({
+                        'price': quote.get('price'),
+                        'change': quote.get('change'),
+                        'volume': quote.get('volume'),
+                        'date': quote.get('date')
+                    })
 
         logger.info(f"✅ 返回 {len(paginated_stocks)} 只股票，总计 {total} 只")
 
+        if compact:
+            return compact_response({
+                'stocks': to_table(map(format_quote_fields, paginated_stocks), StockListItem.model_fields.keys()),
+                'total': total,
+                'page': page,
+                'pageSize': pageSize,
+                'totalPages': (total + pageSize - 1) // pageSize
+            })
+
         return StockListResponse(
             stocks=paginated_stocks,
             total=total,
@@ -164,6 +191,8 @@ async def get_stocks(
 @router.get("/{code}", response_model=StockDetail)
 async def get_stock_by_code(
     code: str,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     """
@@ -171,19 +200,30 @@ async def get_stock_by_code(
 
     - **code**: 股票代码（如 "600519"）
 
-    返回股票的详细信息，包括实时行情和52周高低点
+    返回股票的详细信息，包括实时行情和52周高低点。
+    支持 If-None-Match 条件请求（行情快照未变化时返回304）
     """
     try:
         logger.info(f"获取股票详情: {code}")
 
         # 获取实时行情
-        quote = data_fetcher.get_stock_quote(code)
+        quote = await data_fetcher.aget_stock_quote(code)
 
         if not quote:
             raise HTTPException(status_code=404, detail=f"股票 {code} 不存在或无法获取数据")
 
+        # ETag：快照版本 + 行情日期/价格，命中时跳过52周历史数据的获取
+        # （行情确实来自该快照时才使用其版本，期间快照被替换则不带版本）
+        snapshot = data_fetcher.snapshot
+        snapshot_version = snapshot.version if snapshot.quote(code) is quote else 0
+        etag = make_etag("quote", code, snapshot_version, quote.get('date'), quote.get('price'), quote.get('change'))
+        last_modified = datetime.fromtimestamp(snapshot_version / 1000) if snapshot_version else None
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, "quote", last_modified)
+        apply_cache_headers(response, etag, "quote", last_modified)
+
         # 获取历史数据（用于计算52周高低点）
-        history_df = data_fetcher.get_stock_history(code, period="weekly", start_date=(datetime.now() - timedelta(days=365)).strftime("%Y%m%d"))
+        history_df = await data_fetcher.aget_stock_history(code, period="weekly", start_date=(datetime.now() - timedelta(days=365)).strftime("%Y%m%d"))
 
         # 计算52周高低点
         high52w = None
@@ -193,7 +233,7 @@ async def get_stock_by_code(
             low52w = float(history_df['最低'].min())
 
         # 获取股票详细信息
-        info = data_fetcher.get_stock_info(code)
+        info = await data_fetcher.aget_stock_info(code)
 
         return StockDetail(
             code=quote['code'],
@@ -207,7 +247,7 @@ async def get_stock_by_code(
             high=quote.get('high'),
             low=quote.get('low'),
             volume=quote['volume'],
-            turnover=quote['turnover'],
+            turnover=quote.get('turnover'),
             date=quote['date'],
             is_realtime=quote['is_realtime'],
             delay=quote['delay'],
@@ -222,12 +262,62 @@ async def get_stock_by_code(
         raise HTTPException(status_code=500, detail=f"获取股票详情失败: {str(e)}")
 
 
+@router.get("/panel/export")
+async def export_price_panel(
+    request: Request,
+    field: str = Query("close", description="面板字段（close/open/high/low/volume/amount）"),
+    codes: Optional[str] = Query(None, description="股票代码，逗号分隔（默认全部）"),
+    start_date: Optional[str] = Query(None, description="开始日期 (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="结束日期 (YYYY-MM-DD)"),
+    format: Optional[str] = Query(None, description="导出格式: arrow/parquet（默认按Accept头协商，缺省为arrow）")
+):
+    """
+    导出多股票价格面板（Arrow IPC / Parquet）
+
+    宽表格式：date列 + 每只股票一列，数据直接来自内存映射价格面板
+    """
+    try:
+        from app.services.price_panel import price_panel, PANEL_FIELDS
+
+        if field not in PANEL_FIELDS:
+            raise HTTPException(status_code=400, detail=f"不支持的面板字段: {field}")
+
+        fmt = negotiate_format(request.headers.get("accept"), format) or "arrow"
+
+        dates = price_panel.dates_between(start_date, end_date)
+        values = price_panel.window(field, start_date, end_date)
+
+        if codes:
+            selected = [c.strip() for c in codes.split(",") if c.strip()]
+            missing = [c for c in selected if not price_panel.has_code(c)]
+            if missing:
+                raise HTTPException(status_code=404, detail=f"价格面板中不存在股票: {','.join(missing[:10])}")
+            values = values[:, [price_panel.code_index(c) for c in selected]]
+        else:
+            selected = price_panel.codes
+
+        table = panel_table(dates, selected, values, field, price_panel.version)
+        logger.info(f"导出价格面板: {field}, {len(dates)} × {len(selected)}, 格式={fmt}")
+        return columnar_response(table, fmt, f"panel_{field}")
+
+    except HTTPException:
+        raise
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"导出价格面板API错误: {e}")
+        raise HTTPException(status_code=500, detail=f"导出价格面板失败: {str(e)}")
+
+
 @router.get("/{code}/history")
 async def get_stock_history(
     code: str,
+    request: Request,
     period: str = Query("daily", regex="^(daily|weekly|monthly)$", description="周期"),
     start_date: Optional[str] = Query(None, description="开始日期 (YYYYMMDD)"),
     end_date: Optional[str] = Query(None, description="结束日期 (YYYYMMDD)"),
+    format: Optional[str] = Query(None, description="返回格式: json（默认）/columns/compact/arrow/parquet"),
+    compact: bool = Query(False, description="紧凑格式（列头 + 元组数组），等同 format=table"),
     db: Session = Depends(get_db)
 ):
     """
@@ -237,6 +327,8 @@ async def get_stock_history(
     - **period**: 周期（daily/weekly/monthly）
     - **start_date**: 开始日期（可选）
     - **end_date**: 结束日期（可选）
+    - **format**: json（默认行格式）/ columns（列格式）/ compact（图表紧凑格式）/ table / arrow / parquet
+    - **compact**: 紧凑格式（列头 + 元组数组）
 
     返回历史K线数据，用于前端图表展示
     """
@@ -244,34 +336,36 @@ async def get_stock_history(
         logger.info(f"获取股票 {code} 历史K线: period={period}")
 
         # 获取历史数据
-        df = data_fetcher.get_stock_history(code, period=period, start_date=start_date, end_date=end_date)
+        df = await data_fetcher.aget_stock_history(code, period=period, start_date=start_date, end_date=end_date)
 
         if df.empty:
             raise HTTPException(status_code=404, detail=f"股票 {code} 暂无历史数据")
 
-        # 转换为JSON友好的格式
-        history = []
-        for _, row in df.iterrows():
-            history.append({
-                'date': str(row['日期']),
-                'open': float(row['开盘']),
-                'close': float(row['收盘']),
-                'high': float(row['最高']),
-                'low': float(row['最低']),
-                'volume': int(row['成交量']),
-                'amount': float(row['成交额']),
-                'change_pct': float(row['涨跌幅']),
-                'change_amt': float(row['涨跌额']),
-                'turnover': float(row['换手率'])
-            })
+        if compact and not format:
+            format = "table"
+        fmt = negotiate_format(request.headers.get("accept"), format)
+        if not fmt and format and format.lower() not in JSON_FORMATS:
+            raise HTTPException(status_code=400, detail=f"不支持的格式: {format}")
+
+        # ETag：查询参数 + 输出格式 + 最后一根K线（日期、收盘、成交量），未变化时跳过序列化
+        last_bar = df.iloc[-1]
+        etag = make_etag(
+            "history", code, period, start_date, end_date, fmt or (format or "json").lower(),
+            len(df), last_bar['日期'], last_bar['收盘'], last_bar['成交量']
+        )
+        policy = "history_daily" if period == "daily" else "history"
+        if is_not_modified(request, etag):
+            return not_modified_response(etag, policy)
 
-        logger.info(f"✅ 返回 {len(history)} 条历史数据")
+        # 二进制列式导出（Arrow/Parquet）
+        if fmt:
+            result = columnar_response(history_table(df, code, period), fmt, f"{code}_{period}")
+        else:
+            # 向量化JSON序列化（orjson直接编码NumPy列）
+            logger.info(f"✅ 返回 {len(df)} 条历史数据")
+            result = history_response(df, code, period, format)
 
-        return {
-            'code': code,
-            'period': period,
-            'data': history
-        }
+        return apply_cache_headers(result, etag, policy)
 
     except HTTPException:
         raise
@@ -280,6 +374,29 @@ async def get_stock_history(
         raise HTTPException(status_code=500, detail=f"获取历史数据失败: {str(e)}")
 
 
+@router.get("/{code}/snapshots")
+async def get_stock_snapshots(
+    code: str,
+    start: Optional[datetime] = Query(None, description="开始时间（ISO格式）"),
+    end: Optional[datetime] = Query(None, description="结束时间（ISO格式）"),
+    limit: int = Query(1000, ge=1, le=10000, description="最多返回条数"),
+    db: Session = Depends(get_db)
+):
+    """
+    获取股票行情快照历史（盘中/每日，按时间倒序）
+
+    快照在每次行情入库时追加，Postgres上默认开启（见 QUOTE_HISTORY_ENABLED）
+    """
+    if not quote_history.backend:
+        raise HTTPException(status_code=404, detail="行情快照历史未启用")
+    try:
+        snapshots = await run_in_threadpool(quote_history.history, db, code, start, end, limit)
+        return {"code": code, "count": len(snapshots), "snapshots": snapshots}
+    except Exception as e:
+        logger.error(f"获取股票 {code} 行情快照API错误: {e}")
+        raise HTTPException(status_code=500, detail=f"获取行情快照失败: {str(e)}")
+
+
 @router.get("/cache/stats")
 async def get_cache_stats():
     """
@@ -1,16 +1,21 @@
 """
 自选股CRUD API路由
 """
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from sqlalchemy.orm import Session
 from datetime import datetime
+import asyncio
 import logging
 
 from app.database import get_db
 from app.models import Watchlist
 from app.services.data_fetcher import data_fetcher
+from app.services.db_writer import db_writer
+from app.services.metrics import db_write
+from app.services.http_cache import make_etag, is_not_modified, not_modified_response, apply_cache_headers
 
 logger = logging.getLogger(__name__)
 
@@ -67,17 +72,17 @@ async def add_to_watchlist(
     try:
         logger.info(f"添加自选股: {item.stock_code}")
 
-        # 检查是否已存在
-        existing = db.query(Watchlist).filter(
+        # 检查是否已存在（数据库操作放到线程池，避免阻塞事件循环）
+        existing = await run_in_threadpool(lambda: db.query(Watchlist).filter(
             Watchlist.stock_code == item.stock_code,
             Watchlist.user_id == 1  # 默认用户ID
-        ).first()
+        ).first())
 
         if existing:
             raise HTTPException(status_code=400, detail=f"股票 {item.stock_code} 已在自选股中")
 
         # 获取股票名称
-        stock_list = data_fetcher.get_stock_list()
+        stock_list = await data_fetcher.aget_stock_list()
         stock_name = None
         for stock in stock_list:
             if stock['code'] == item.stock_code:
@@ -94,9 +99,14 @@ async def add_to_watchlist(
             notes=item.notes
         )
 
-        db.add(db_item)
-        db.commit()
-        db.refresh(db_item)
+        def _insert():
+            with db_write("watchlist_add"):
+                db.add(db_item)
+                db.commit()
+                db.refresh(db_item)
+
+        # 经写入队列提交，与行情入库等后台写入串行（不与其争用SQLite写锁）
+        await run_in_threadpool(db_writer.run, _insert)
 
         # 补充股票名称
         result = WatchlistItem(
@@ -123,6 +133,8 @@ async def add_to_watchlist(
 
 @router.get("", response_model=WatchlistResponse, summary="获取自选股列表")
 async def get_watchlist(
+    request: Request,
+    response: Response,
     page: int = Query(1, ge=1, description="页码"),
     pageSize: int = Query(20, ge=1, le=100, description="每页数量"),
     db: Session = Depends(get_db)
@@ -133,44 +145,50 @@ async def get_watchlist(
     - **page**: 页码（从1开始）
     - **pageSize**: 每页数量（1-100）
 
-    返回包含实时行情的自选股列表
+    返回包含实时行情的自选股列表（支持 If-None-Match 条件请求）
     """
     try:
         logger.info(f"获取自选股列表: page={page}, pageSize={pageSize}")
 
-        # 查询总数
-        total = db.query(Watchlist).filter(Watchlist.user_id == 1).count()
-
-        # 分页查询
+        # 查询总数和分页数据（数据库操作放到线程池）
         offset = (page - 1) * pageSize
-        watchlist_items = db.query(Watchlist)\
-            .filter(Watchlist.user_id == 1)\
-            .order_by(Watchlist.created_at.desc())\
-            .offset(offset)\
-            .limit(pageSize)\
-            .all()
+
+        def _query():
+            total = db.query(Watchlist).filter(Watchlist.user_id == 1).count()
+            rows = db.query(Watchlist)\
+                .filter(Watchlist.user_id == 1)\
+                .order_by(Watchlist.created_at.desc())\
+                .offset(offset)\
+                .limit(pageSize)\
+                .all()
+            return total, rows
+
+        total, watchlist_items = await run_in_threadpool(_query)
 
         total_pages = (total + pageSize - 1) // pageSize
 
         # 获取股票列表（用于查找名称）
-        stock_list = data_fetcher.get_stock_list()
+        stock_list = await data_fetcher.aget_stock_list()
         stock_dict = {stock['code']: stock['name'] for stock in stock_list}
 
-        # 获取实时行情
+        # 并发获取实时行情
+        quotes = await asyncio.gather(
+            *[data_fetcher.aget_stock_quote(item.stock_code) for item in watchlist_items],
+            return_exceptions=True
+        )
+
         items = []
-        for item in watchlist_items:
+        for item, quote in zip(watchlist_items, quotes):
             stock_name = stock_dict.get(item.stock_code, item.stock_code)
 
             # 获取实时行情
             current_price = None
             change_percent = None
-            try:
-                quote = data_fetcher.get_stock_quote(item.stock_code)
-                if quote:
-                    current_price = quote.get('price')
-                    change_percent = quote.get('change')
-            except Exception as e:
-                logger.warning(f"获取股票 {item.stock_code} 行情失败: {e}")
+            if isinstance(quote, Exception):
+                logger.warning(f"获取股票 {item.stock_code} 行情失败: {quote}")
+            elif quote:
+                current_price = quote.get('price')
+                change_percent = quote.get('change')
 
             items.append(WatchlistItem(
                 id=item.id,
@@ -184,6 +202,15 @@ async def get_watchlist(
 
         logger.info(f"✅ 返回 {len(items)} 只自选股，总计 {total} 只")
 
+        # ETag：分页参数 + 自选股记录 + 行情快照版本 + 各股价格
+        etag = make_etag(
+            "watchlist", page, pageSize, total, data_fetcher.spot_version,
+            *[(i.id, i.stock_code, i.notes, i.current_price, i.change_percent) for i in items]
+        )
+        if is_not_modified(request, etag):
+            return not_modified_response(etag, "watchlist")
+        apply_cache_headers(response, etag, "watchlist")
+
         return WatchlistResponse(
             items=items,
             total=total,
@@ -210,17 +237,22 @@ async def delete_from_watchlist(
     try:
         logger.info(f"删除自选股: ID={item_id}")
 
-        item = db.query(Watchlist).filter(
+        item = await run_in_threadpool(lambda: db.query(Watchlist).filter(
             Watchlist.id == item_id,
             Watchlist.user_id == 1
-        ).first()
+        ).first())
 
         if not item:
             raise HTTPException(status_code=404, detail=f"自选股 {item_id} 不存在")
 
         stock_code = item.stock_code
-        db.delete(item)
-        db.commit()
+
+        def _delete():
+            with db_write("watchlist_remove"):
+                db.delete(item)
+                db.commit()
+
+        await run_in_threadpool(db_writer.run, _delete)
 
         logger.info(f"✅ 自选股已删除: ID={item_id}, 股票代码={stock_code}")
 
@@ -251,16 +283,16 @@ async def check_stock_in_watchlist(
     try:
         logger.info(f"检查自选股: {stock_code}")
 
-        item = db.query(Watchlist).filter(
+        item = await run_in_threadpool(lambda: db.query(Watchlist).filter(
             Watchlist.stock_code == stock_code,
             Watchlist.user_id == 1
-        ).first()
+        ).first())
 
         if not item:
             return None
 
         # 获取股票名称和实时行情
-        stock_list = data_fetcher.get_stock_list()
+        stock_list = await data_fetcher.aget_stock_list()
         stock_name = None
         for stock in stock_list:
             if stock['code'] == stock_code:
@@ -270,7 +302,7 @@ async def check_stock_in_watchlist(
         current_price = None
         change_percent = None
         try:
-            quote = data_fetcher.get_stock_quote(stock_code)
+            quote = await data_fetcher.aget_stock_quote(stock_code)
             if quote:
                 current_price = quote.get('price')
                 change_percent = quote.get('change')
@@ -0,0 +1,302 @@
+"""
+本地日线存储服务
+
+将 DataFetcher.get_stock_history 获取的日K线落地到 daily_bars 表，
+供价格面板、指标计算等离线分析使用，避免反复请求上游接口。
+
+- 增量同步：只拉取本地最后一个交易日之后的数据
+- 统一列名：baostock / akshare 两种数据源归一为英文字段
+- 统一单位：成交量统一为"股"（akshare返回的是"手"）
+"""
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+import logging
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import DailyBar
+from app.services.db_writer import db_writer
+from app.services.metrics import db_write
+
+logger = logging.getLogger(__name__)
+
+# 日线字段（与 DailyBar 列一致）
+BAR_FIELDS = ("open", "high", "low", "close", "volume", "amount")
+
+# 单条upsert语句的最大行数
+_UPSERT_CHUNK = 500
+# 按代码批量读取时单条查询的代码数（IN参数个数）
+_QUERY_CHUNK = 500
+
+# 数据源中文列名 -> 本地字段
+_COLUMN_MAP = {
+    '日期': 'trade_date',
+    '开盘': 'open',
+    '最高': 'high',
+    '最低': 'low',
+    '收盘': 'close',
+    '成交量': 'volume',
+    '成交额': 'amount',
+}
+
+# 周线/月线由日线聚合（pandas周期）
+_PERIODS = {'weekly': 'W', 'monthly': 'M'}
+
+
+def normalize_history(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    将 get_stock_history 返回的DataFrame归一为日线存储格式
+
+    Args:
+        df: 中文列名的历史行情（baostock或akshare）
+
+    Returns:
+        列为 trade_date + BAR_FIELDS 的DataFrame
+    """
+    if df is None or df.empty:
+        return pd.DataFrame(columns=['trade_date', *BAR_FIELDS])
+
+    out = df[list(_COLUMN_MAP.keys())].rename(columns=_COLUMN_MAP)
+    out['trade_date'] = pd.to_datetime(out['trade_date']).dt.strftime("%Y-%m-%d")
+    for field in BAR_FIELDS:
+        out[field] = pd.to_numeric(out[field], errors='coerce')
+
+    # baostock带"前收盘"列，成交量单位为股；akshare成交量单位为手
+    if '前收盘' not in df.columns:
+        out['volume'] = out['volume'] * 100
+
+    return out.dropna(subset=['close']).reset_index(drop=True)
+
+
+class BarStore:
+    """本地日线存储"""
+
+    def __init__(self, fetcher=None):
+        # 延迟获取全局data_fetcher，避免导入时产生循环依赖
+        self._fetcher = fetcher
+
+    @property
+    def fetcher(self):
+        if self._fetcher is None:
+            from app.services.data_fetcher import data_fetcher
+            self._fetcher = data_fetcher
+        return self._fetcher
+
+    # ==================== 写入 ====================
+
+    def save_bars(self, code: str, bars: pd.DataFrame) -> int:
+        """
+        写入（upsert）一只股票的日线
+
+        Args:
+            code: 股票代码
+            bars: normalize_history 的输出
+
+        Returns:
+            写入条数
+        """
+        if bars is None or bars.empty:
+            return 0
+
+        now = datetime.now()
+        rows = [
+            {'stock_code': code, 'updated_at': now, **record}
+            for record in bars[['trade_date', *BAR_FIELDS]].to_dict('records')
+        ]
+
+        # 在写入队列中执行，与行情入库等后台写入串行
+        return db_writer.run(self._upsert_bars, code, rows)
+
+    def _upsert_bars(self, code: str, rows: List[Dict]) -> int:
+        db = SessionLocal()
+        try:
+            dialect = db.get_bind().dialect.name
+            insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            # 分块写入，避免超过SQLite单条语句的参数上限
+            with db_write("save_bars"):
+                for i in range(0, len(rows), _UPSERT_CHUNK):
+                    stmt = insert(DailyBar).values(rows[i:i + _UPSERT_CHUNK])
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=['stock_code', 'trade_date'],
+                        set_={field: getattr(stmt.excluded, field) for field in (*BAR_FIELDS, 'updated_at')}
+                    )
+                    db.execute(stmt)
+                db.commit()
+            return len(rows)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"保存股票 {code} 日线失败: {e}")
+            return 0
+        finally:
+            db.close()
+
+    def sync_stock(self, code: str, days: Optional[int] = None) -> int:
+        """
+        增量同步一只股票的日线
+
+        本地已有数据时从最后一个交易日开始拉取（覆盖当天，兼容盘中数据），
+        否则回溯 days 天（默认 BAR_STORE_DEFAULT_DAYS）。
+
+        Returns:
+            写入条数
+        """
+        last = self.last_trade_date(code)
+        if last:
+            start = datetime.strptime(last, "%Y-%m-%d")
+        else:
+            start = datetime.now() - timedelta(days=days or settings.BAR_STORE_DEFAULT_DAYS)
+
+        df = self.fetcher.get_stock_history(
+            code,
+            period="daily",
+            start_date=start.strftime("%Y%m%d"),
+            end_date=datetime.now().strftime("%Y%m%d")
+        )
+        return self.save_bars(code, normalize_history(df))
+
+    def sync_all(self, codes: Optional[Iterable[str]] = None, days: Optional[int] = None) -> Dict:
+        """
+        批量同步日线
+
+        Args:
+            codes: 股票代码列表，默认全市场
+            days: 首次同步回溯天数
+
+        Returns:
+            {success: 成功数量, failed: 失败数量, rows: 写入条数, total: 总数}
+        """
+        if codes is None:
+            codes = [s['code'] for s in self.fetcher.get_stock_list()]
+        codes = list(codes)
+
+        success, failed, rows = 0, 0, 0
+        for idx, code in enumerate(codes):
+            try:
+                written = self.sync_stock(code, days=days)
+                rows += written
+                success += 1
+            except Exception as e:
+                failed += 1
+                logger.warning(f"同步股票 {code} 日线失败: {e}")
+
+            if (idx + 1) % 200 == 0:
+                logger.info(f"日线同步进度 {idx + 1}/{len(codes)}")
+
+        logger.info(f"✅ 日线同步完成: 成功 {success}, 失败 {failed}, 写入 {rows} 条")
+        return {"success": success, "failed": failed, "rows": rows, "total": len(codes)}
+
+    # ==================== 读取 ====================
+
+    def last_trade_date(self, code: str) -> Optional[str]:
+        """本地最后一个交易日（YYYY-MM-DD），无数据返回None"""
+        db = SessionLocal()
+        try:
+            return db.query(func.max(DailyBar.trade_date)).filter(DailyBar.stock_code == code).scalar()
+        finally:
+            db.close()
+
+    def load_bars(self, code: str, start_date: Optional[str] = None,
+                  end_date: Optional[str] = None) -> pd.DataFrame:
+        """
+        读取一只股票的本地日线
+
+        Args:
+            code: 股票代码
+            start_date / end_date: YYYY-MM-DD（含）
+
+        Returns:
+            按日期升序的DataFrame（trade_date + BAR_FIELDS）
+        """
+        db = SessionLocal()
+        try:
+            query = db.query(DailyBar.trade_date, *[getattr(DailyBar, f) for f in BAR_FIELDS])\
+                .filter(DailyBar.stock_code == code)
+            if start_date:
+                query = query.filter(DailyBar.trade_date >= start_date)
+            if end_date:
+                query = query.filter(DailyBar.trade_date <= end_date)
+            rows = query.order_by(DailyBar.trade_date).all()
+        finally:
+            db.close()
+        return pd.DataFrame(rows, columns=['trade_date', *BAR_FIELDS])
+
+    def load_history(self, code: str, period: str = "daily", start_date: Optional[str] = None,
+                     end_date: Optional[str] = None) -> pd.DataFrame:
+        """
+        按 get_stock_history 的格式读取本地日线（API只读模式下代替上游接口）
+
+        Args:
+            code: 股票代码
+            period: daily / weekly / monthly（周线、月线由日线聚合，日期为周期内最后一个交易日）
+            start_date / end_date: YYYYMMDD（含），默认最近3个月
+
+        Returns:
+            中文列名的DataFrame（日期、开盘、最高、最低、收盘、成交量、成交额、涨跌幅、涨跌额），无数据时为空
+        """
+        end = datetime.strptime(end_date, "%Y%m%d") if end_date else datetime.now()
+        start = datetime.strptime(start_date, "%Y%m%d") if start_date else datetime.now() - timedelta(days=90)
+        # 多读两个月，首个周期也能算出涨跌幅
+        bars = self.load_bars(code, start_date=(start - timedelta(days=62)).strftime("%Y-%m-%d"),
+                              end_date=end.strftime("%Y-%m-%d"))
+        if bars.empty:
+            return pd.DataFrame()
+
+        freq = _PERIODS.get(period)
+        if freq:
+            bars = bars.groupby(pd.to_datetime(bars['trade_date']).dt.to_period(freq), sort=True).agg(
+                trade_date=('trade_date', 'last'), open=('open', 'first'), high=('high', 'max'),
+                low=('low', 'min'), close=('close', 'last'), volume=('volume', 'sum'), amount=('amount', 'sum'),
+            )
+
+        previous = bars['close'].shift()
+        bars = bars.assign(
+            volume=bars['volume'].fillna(0).astype('int64'),
+            change_amt=bars['close'] - previous,
+            change_pct=(bars['close'] - previous) / previous * 100,
+        )
+        bars = bars[bars['trade_date'] >= start.strftime("%Y-%m-%d")]
+        columns = {field: name for name, field in _COLUMN_MAP.items()}
+        return bars.rename(columns={**columns, 'change_pct': '涨跌幅', 'change_amt': '涨跌额'}).reset_index(drop=True)
+
+    def load_all(self, start_date: Optional[str] = None, codes: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        读取全部日线（长表：stock_code, trade_date, BAR_FIELDS），用于构建价格面板
+
+        Args:
+            start_date: YYYY-MM-DD（含）
+            codes: 只读取这些股票（如筛选中的候选股票），默认全部
+        """
+        db = SessionLocal()
+        try:
+            query = db.query(DailyBar.stock_code, DailyBar.trade_date,
+                             *[getattr(DailyBar, f) for f in BAR_FIELDS])
+            if start_date:
+                query = query.filter(DailyBar.trade_date >= start_date)
+            if codes is None:
+                return pd.read_sql(query.statement, db.get_bind())
+
+            codes = list(codes)
+            frames = [
+                pd.read_sql(query.filter(DailyBar.stock_code.in_(codes[i:i + _QUERY_CHUNK])).statement, db.get_bind())
+                for i in range(0, len(codes), _QUERY_CHUNK)
+            ]
+            if not frames:
+                return pd.DataFrame(columns=['stock_code', 'trade_date', *BAR_FIELDS])
+            return pd.concat(frames, ignore_index=True)
+        finally:
+            db.close()
+
+    def codes(self) -> List[str]:
+        """本地已有日线的股票代码"""
+        db = SessionLocal()
+        try:
+            return [code for code, in db.query(DailyBar.stock_code).distinct().order_by(DailyBar.stock_code)]
+        finally:
+            db.close()
+
+
+# 创建全局实例
+bar_store = BarStore()
@@ -0,0 +1,212 @@
+"""
+列式数据导出服务 - Apache Arrow IPC / Parquet
+
+为历史K线、多股票价格面板和筛选结果提供二进制列式导出，
+Notebook 和下游服务可直接 pyarrow / pandas / polars 读取，无需解析JSON。
+
+格式选择（内容协商）:
+- Accept: application/vnd.apache.arrow.stream  -> Arrow IPC 流
+- Accept: application/vnd.apache.parquet       -> Parquet
+- 或查询参数 format=arrow / format=parquet（优先于Accept头）
+"""
+import io
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+import logging
+
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+# 媒体类型 -> 导出格式（只输出IPC流格式，application/vnd.apache.arrow.file 不在其中，按JSON返回）
+_MEDIA_TYPES = {
+    ARROW_STREAM_MEDIA_TYPE: "arrow",
+    "application/x-arrow": "arrow",
+    PARQUET_MEDIA_TYPE: "parquet",
+    "application/x-parquet": "parquet",
+    "application/parquet": "parquet",
+}
+
+EXPORT_FORMATS = ("arrow", "parquet")
+
+# 每个record batch / row group 的行数
+BATCH_ROWS = 64 * 1024
+
+# 历史K线：输出字段 -> DataFrame中文列名
+HISTORY_COLUMNS = (
+    ('date', '日期'),
+    ('open', '开盘'),
+    ('close', '收盘'),
+    ('high', '最高'),
+    ('low', '最低'),
+    ('volume', '成交量'),
+    ('amount', '成交额'),
+    ('change_pct', '涨跌幅'),
+    ('change_amt', '涨跌额'),
+    ('turnover', '换手率'),
+)
+
+
+def negotiate_format(accept: Optional[str], format: Optional[str] = None) -> Optional[str]:
+    """
+    根据查询参数或Accept头确定导出格式
+
+    Args:
+        accept: 请求的Accept头
+        format: 查询参数format（优先）
+
+    Returns:
+        'arrow' / 'parquet'，JSON请求返回None
+    """
+    if format:
+        fmt = format.lower()
+        return fmt if fmt in EXPORT_FORMATS else None
+
+    if not accept:
+        return None
+
+    # 按q值从高到低选择第一个支持的二进制格式
+    candidates = []
+    for order, part in enumerate(accept.split(",")):
+        pieces = [p.strip() for p in part.split(";")]
+        media_type = pieces[0].lower()
+        q = 1.0
+        for param in pieces[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        candidates.append((-q, order, media_type))
+
+    for neg_q, _, media_type in sorted(candidates):
+        if neg_q == 0:
+            break
+        if media_type in ("application/json", "*/*", "application/*"):
+            return None
+        if media_type in _MEDIA_TYPES:
+            return _MEDIA_TYPES[media_type]
+    return None
+
+
+# ==================== 构建Arrow表 ====================
+
+def history_table(df, code: str, period: str):
+    """历史K线DataFrame -> Arrow表（列直接取自NumPy数组，不逐行转换）"""
+    import pyarrow as pa
+
+    columns = {}
+    for name, src in HISTORY_COLUMNS:
+        if src not in df.columns:
+            continue
+        if name == 'date':
+            columns[name] = pa.array(df[src].astype(str).to_numpy(), type=pa.string())
+        elif name == 'volume':
+            columns[name] = pa.array(df[src].to_numpy(dtype='int64'))
+        else:
+            columns[name] = pa.array(df[src].to_numpy(dtype='float64'))
+
+    table = pa.table(columns)
+    return table.replace_schema_metadata({"code": code, "period": period})
+
+
+def panel_table(dates: Sequence[str], codes: Sequence[str], values, field: str, version: int):
+    """
+    价格面板 -> 宽表（date + 每只股票一列）
+
+    Args:
+        values: dates × codes 的二维数组（可为内存映射视图）
+    """
+    import numpy as np
+    import pyarrow as pa
+
+    columns = {"date": pa.array(list(dates), type=pa.string())}
+    # 面板为行主序，按列取出是跨步视图；转为连续数组后交给Arrow
+    for j, code in enumerate(codes):
+        columns[code] = pa.array(np.ascontiguousarray(values[:, j]), type=pa.float32())
+
+    table = pa.table(columns)
+    return table.replace_schema_metadata({"field": field, "panel_version": str(version)})
+
+
+def records_table(records: List[Dict], columns: Optional[Sequence[str]] = None):
+    """字典列表（如筛选结果）-> Arrow表"""
+    import pyarrow as pa
+
+    if columns:
+        records = [{c: r.get(c) for c in columns} for r in records]
+        if not records:
+            return pa.table({c: pa.array([], type=pa.null()) for c in columns})
+    return pa.Table.from_pylist(records)
+
+
+# ==================== 流式输出 ====================
+
+class _ChunkSink(io.RawIOBase):
+    """可写入的内存缓冲，每写完一个batch由生成器取走已写入的字节"""
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._buf.extend(b)
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+def _iter_arrow(table) -> Iterator[bytes]:
+    import pyarrow as pa
+
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=BATCH_ROWS):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _iter_parquet(table) -> Iterator[bytes]:
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, table.schema, compression="zstd") as writer:
+        for batch in table.to_batches(max_chunksize=BATCH_ROWS):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def columnar_response(table, fmt: str, filename: str) -> StreamingResponse:
+    """
+    以流的形式返回Arrow IPC或Parquet
+
+    Args:
+        table: pyarrow.Table
+        fmt: 'arrow' 或 'parquet'
+        filename: 下载文件名（不含扩展名）
+    """
+    if fmt == "parquet":
+        body: Iterable[bytes] = _iter_parquet(table)
+        media_type, ext = PARQUET_MEDIA_TYPE, "parquet"
+    else:
+        body = _iter_arrow(table)
+        media_type, ext = ARROW_STREAM_MEDIA_TYPE, "arrows"
+
+    logger.debug(f"列式导出 {filename}.{ext}: {table.num_rows} 行 × {table.num_columns} 列")
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{ext}"',
+            "Vary": "Accept",
+        }
+    )
@@ -0,0 +1,30 @@
+"""
+紧凑响应格式
+
+大列表接口可选的紧凑模式（查询参数 compact=true）：
+对象数组改为"列头 + 元组数组"，每个字段名只出现一次，
+
+    普通: {"stocks": [{"code": "600519", "name": "贵州茅台", ...}, ...]}
+    紧凑: {"stocks": {"columns": ["code", "name", ...], "rows": [["600519", "贵州茅台", ...], ...]}}
+
+前端还原: rows.map(r => Object.fromEntries(columns.map((c, i) => [c, r[i]])))
+"""
+from typing import Any, Dict, Iterable, Sequence
+import orjson
+from fastapi.responses import Response
+
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def to_table(records: Iterable[Dict[str, Any]], columns: Sequence[str]) -> Dict:
+    """字典列表 -> {columns, rows}"""
+    columns = list(columns)
+    return {
+        "columns": columns,
+        "rows": [[record.get(c) for c in columns] for record in records],
+    }
+
+
+def compact_response(payload: Dict, headers: Dict[str, str] = None) -> Response:
+    """用orjson直接编码紧凑载荷（跳过response_model校验和jsonable_encoder）"""
+    return Response(content=orjson.dumps(payload, option=_OPTIONS), media_type="application/json", headers=headers)
@@ -12,101 +12,48 @@
 1. baostock - 稳定免费的数据源（历史K线、实时行情）
 2. akshare - 备用数据源（股票列表、个股信息）
 """
-import akshare as ak
-import baostock as bs
-import pandas as pd
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from urllib.parse import urlparse
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from types import MappingProxyType
+from typing import List, Dict, Optional, Sequence
 import logging
 import time
 import os
+import pickle
 import random
 
+import asyncio
+import contextvars
+import functools
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
+from app.config import settings
+from app.services.lazy_import import lazy_import
 from app.database import SessionLocal
-from app.models import StockQuote
+from app.models import Stock, StockQuote
+from app.services.http_client import upstream_http
+from app.services.spot_sources import fetch_spot_em_sync, fetch_spot_sina_sync
+from app.services.source_router import source_router, SourceUnavailable, UpstreamError
+from app.services.metrics import cache_namespace, db_write, record_cache
+from app.services.db_writer import db_writer
+from app.services.market_snapshot import MarketData, MarketSnapshot, fundamentals_from_spot
+from app.services.shared_state import shared_state
+from app.services.trading_calendar import trading_calendar
+from app.services import quote_history
+from app.services.quote_format import format_market_cap
+from app.services.tracing import traced_lock
+
+# 重量级库按需导入（见 lazy_import），避免拖慢API启动
+ak = lazy_import("akshare")
+bs = lazy_import("baostock")
+pd = lazy_import("pandas")
 
 logger = logging.getLogger(__name__)
 
-# ========== User Agent 池 ==========
-USER_AGENTS = [
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Edge/120.0.0.0 Safari/537.36",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0",
-    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-]
-
-# ========== Monkey Patch requests ==========
-# 自动为所有requests请求添加随机User-Agent，模拟真实浏览器，防止被封禁
-def patch_requests_user_agent():
-    original_request = requests.Session.request
-    original_init = requests.Session.__init__
-    host_lock = threading.Lock()
-    host_last_ts: Dict[str, float] = {}
-    host_intervals: Dict[str, float] = {
-        "eastmoney.com": 1.0,
-        "sina.com.cn": 0.8,
-        "baostock.com": 0.0
-    }
-    def patched_init(self, *args, **kwargs):
-        original_init(self, *args, **kwargs)
-        retry = Retry(total=3, connect=3, read=3, status=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
-        adapter = HTTPAdapter(max_retries=retry, pool_connections=64, pool_maxsize=64)
-        self.mount("http://", adapter)
-        self.mount("https://", adapter)
-        try:
-            self.trust_env = False
-        except Exception:
-            pass
-    
-    def patched_request(self, method, url, *args, **kwargs):
-        headers = kwargs.get('headers', {})
-        if not any(k.lower() == 'user-agent' for k in headers):
-            headers['User-Agent'] = random.choice(USER_AGENTS)
-            if 'eastmoney.com' in url:
-                headers['Referer'] = 'https://quote.eastmoney.com/'
-        if not any(k.lower() == 'accept' for k in headers):
-            headers['Accept'] = 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
-        if not any(k.lower() == 'accept-language' for k in headers):
-            headers['Accept-Language'] = 'zh-CN,zh;q=0.9,en;q=0.8'
-        if not any(k.lower() == 'connection' for k in headers):
-            headers['Connection'] = 'keep-alive'
-        kwargs['headers'] = headers
-        try:
-            host = urlparse(url).netloc
-            key = None
-            for h, interval in host_intervals.items():
-                if h in host:
-                    key = h
-                    min_interval = interval
-                    break
-            if key is None:
-                min_interval = 0.5
-                key = host or "default"
-            with host_lock:
-                last = host_last_ts.get(key, 0.0)
-                now = time.time()
-                diff = now - last
-                if diff < min_interval:
-                    time.sleep(min_interval - diff + random.random() * 0.05)
-                host_last_ts[key] = time.time()
-        except Exception:
-            pass
-        return original_request(self, method, url, *args, **kwargs)
-    
-    requests.Session.__init__ = patched_init
-    requests.Session.request = patched_request
-    logger.info("已启用随机User-Agent伪装")
-
-# 应用Patch
-patch_requests_user_agent()
+# 行情upsert单条语句的最大行数（SQLite参数上限32766）
+_UPSERT_CHUNK = 2000
 
 # ========== 全局禁用代理 ==========
 # akshare和baostock在代理环境下经常连接失败，直接禁用
@@ -147,11 +94,14 @@ def disable_proxy():
 
 
 class SimpleCache:
-    """简单的内存缓存"""
+    """简单的内存缓存（多进程部署时以共享键值存储为二级缓存，一个worker获取的数据其他worker直接复用）"""
+
+    STORE_PREFIX = "cache:"
 
-    def __init__(self, ttl: int = 300):  # 默认5分钟TTL
+    def __init__(self, ttl: int = 300, store=None):  # 默认5分钟TTL
         self.cache = {}
         self.ttl = ttl
+        self.store = store
 
     def get(self, key: str):
         """获取缓存"""
@@ -159,20 +109,49 @@ class SimpleCache:
             data, timestamp = self.cache[key]
             if time.time() - timestamp < self.ttl:
                 logger.debug(f"缓存命中: {key}")
+                record_cache(cache_namespace(key), True)
                 return data
             else:
                 # 过期，删除
                 del self.cache[key]
+        if self.store is not None:
+            entry = self._get_shared(key)
+            if entry is not None:
+                self.cache[key] = entry
+                record_cache(cache_namespace(key), True)
+                return entry[0]
+        record_cache(cache_namespace(key), False)
+        return None
+
+    def _get_shared(self, key: str):
+        try:
+            raw = self.store.get(self.STORE_PREFIX + key)
+            entry = pickle.loads(raw) if raw is not None else None
+        except Exception as e:
+            logger.warning(f"读取共享缓存失败: {key}: {e}")
+            return None
+        # 保留原始写入时间，各worker按同一时间过期
+        if entry is not None and time.time() - entry[1] < self.ttl:
+            return entry
         return None
 
     def set(self, key: str, value):
         """设置缓存"""
-        self.cache[key] = (value, time.time())
+        entry = (value, time.time())
+        self.cache[key] = entry
+        if self.store is not None:
+            try:
+                self.store.set(self.STORE_PREFIX + key, pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL),
+                               ttl=self.ttl)
+            except Exception as e:
+                logger.warning(f"写入共享缓存失败: {key}: {e}")
         logger.debug(f"缓存设置: {key}")
 
     def clear(self):
         """清空缓存"""
         self.cache.clear()
+        if self.store is not None:
+            self.store.delete(*self.store.keys(self.STORE_PREFIX))
         logger.info("缓存已清空")
 
 
@@ -181,31 +160,89 @@ class DataFetcher:
 
     def __init__(self, timeout: int = 30, cache_ttl: int = 300):
         self.timeout = timeout
-        self.cache = SimpleCache(ttl=cache_ttl)
+        self.cache = SimpleCache(ttl=cache_ttl, store=shared_state.store if shared_state.enabled else None)
         self.max_retries = 3
         self.bs_logged_in = False
-        self.em_circuit_until = 0.0
-        self.sina_circuit_until = 0.0
-        self.em_fail = 0
-        self.sina_fail = 0
-        self.ak_circuit_until = 0.0
-        self.ak_fail = 0
+        # 数据源熔断与路由（按健康度选择数据源，熔断的数据源直接跳过）
+        self.router = source_router
         self.ak_sema = threading.Semaphore(10)
         
         # 线程锁：baostock接口不是线程安全的，并发调用会导致数据错乱或socket错误
         self.bs_lock = threading.Lock()
 
-        # 全市场行情缓存（stock_zh_a_spot的缓存）
-        self.stock_spot_cache = {}
-        self.spot_cache_time = None
-        self.spot_cache_ttl = 300  # 全市场缓存5分钟 (因为获取一次需要40s+)
+        # 上游同步调用专用线程池（有界），异步接口通过它执行，不占用事件循环
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.UPSTREAM_EXECUTOR_WORKERS,
+            thread_name_prefix="upstream"
+        )
+
+        # 全市场内存数据（股票列表 + 东方财富/新浪全市场行情 + 基本面），整体作为不可变快照发布
+        # 多进程部署时只有上游worker刷新，快照经共享目录同步到其他worker
+        self.market = MarketData(shared_state, poll_seconds=settings.SHARED_SNAPSHOT_POLL_SECONDS)
+        self.spot_cache_time = None  # 最近一次尝试刷新全市场行情的时间（失败也更新，用于控制重试频率）
+        self.spot_cache_ttl = 300  # 全市场缓存5分钟 (因为获取一次需要40s+)；ENABLE_SCHEDULER 时按交易时段调度
+        # 全市场刷新一次需要40s+，同一时间只进行一次（请求线程、后台刷新线程、采集任务共用）
+        self._spot_refresh_lock = threading.Lock()
+
+        # baostock在首次使用时登录（或由启动预热任务提前登录），导入模块时不联网
+        self._login_attempt_at: Optional[float] = None
+
+        # 只读模式下从数据库加载快照时，最近一次加载对应的 (行情最新时间, 股票列表最新更新时间)
+        self._db_snapshot_marker: Optional[tuple] = None
+
+    @property
+    def snapshot(self) -> MarketSnapshot:
+        """当前全市场快照（一次读取内使用同一个快照，保证数据一致）"""
+        return self.market.current
+
+    @property
+    def stock_spot_cache(self):
+        """当前快照的全市场行情（只读）"""
+        return self.market.current.quotes
+
+    @property
+    def spot_version(self) -> int:
+        """当前快照版本（毫秒时间戳），用作ETag"""
+        return self.market.current.version
+
+    def spot_refresh_due(self) -> bool:
+        """全市场行情是否需要刷新（按交易时段调度，ENABLE_SCHEDULER=false 时按固定TTL）"""
+        snapshot = self.market.current
+        if not settings.ENABLE_SCHEDULER:
+            last = self.spot_cache_time or snapshot.quotes_at
+            return last is None or time.time() - last > self.spot_cache_ttl
+        return trading_calendar.spot_refresh_due(snapshot.quotes_at, self.spot_cache_time)
+
+    def universe_refresh_due(self, snapshot: Optional[MarketSnapshot] = None) -> bool:
+        """股票列表是否需要刷新（按交易日调度，ENABLE_SCHEDULER=false 时与单股缓存相同的TTL）"""
+        snapshot = snapshot or self.market.current
+        if not snapshot.universe:
+            return True
+        if not settings.ENABLE_SCHEDULER:
+            return not snapshot.universe_fresh(self.cache.ttl)
+        return trading_calendar.universe_refresh_due(snapshot.universe_at)
+
+    @property
+    def read_only(self) -> bool:
+        """API进程只读（INGEST_EXTERNAL=true）：上游由独立采集进程访问，这里只读快照、数据库和本地日线"""
+        return shared_state.external and not shared_state.is_upstream()
 
-        # 登录baostock
+    def ensure_baostock_login(self) -> bool:
+        """未登录时登录baostock；登录失败后 BAOSTOCK_LOGIN_RETRY_SECONDS 内不再重试，避免每个请求都卡在登录上"""
+        if self.bs_logged_in:
+            return True
+        if self.read_only:
+            return False
+        if (self._login_attempt_at is not None
+                and time.time() - self._login_attempt_at < settings.BAOSTOCK_LOGIN_RETRY_SECONDS):
+            return False
         self._login_baostock()
+        return self.bs_logged_in
 
     def _login_baostock(self):
         """登录baostock"""
-        with self.bs_lock:
+        with traced_lock(self.bs_lock, "bs_lock"):
+            self._login_attempt_at = time.time()
             try:
                 lg = bs.login()
                 if lg.error_code == '0':
@@ -230,19 +267,22 @@ class DataFetcher:
 
     # ==================== 股票列表 ====================
 
-    def get_stock_list(self) -> List[Dict]:
+    def get_stock_list(self) -> Sequence[Dict]:
         """
         获取A股股票列表（带缓存和重试）
 
         Returns:
-            股票列表，每只股票包含：code, name, industry, market
+            股票列表（只读），每只股票包含：code, name, industry, market
         """
-        cache_key = "stock_list"
-
-        # 尝试从缓存获取
-        cached = self.cache.get(cache_key)
-        if cached:
-            return cached
+        # 尝试从快照获取（交易日内按 UPDATE_INTERVAL_MINUTES 刷新，夜间和节假日沿用已有列表）
+        snapshot = self.market.current
+        if not self.universe_refresh_due(snapshot):
+            record_cache("stock_list", True)
+            return snapshot.universe
+        record_cache("stock_list", False)
+        if not shared_state.is_upstream():
+            # 多进程部署：股票列表由上游worker刷新，这里只读共享快照（可能稍旧）
+            return snapshot.universe
 
         # 从API获取
         for attempt in range(self.max_retries):
@@ -263,9 +303,10 @@ class DataFetcher:
 
                 logger.info(f"✅ 成功获取 {len(stocks)} 只股票")
 
-                # 存入缓存
-                self.cache.set(cache_key, stocks)
-                return stocks
+                # 发布到快照，并写入stocks表（SQL筛选按该表关联股票名称/市场）
+                snapshot = self.market.publish_universe(stocks)
+                db_writer.submit_nowait(self._save_stock_list, stocks)
+                return snapshot.universe
 
             except Exception as e:
                 logger.warning(f"获取股票列表失败（尝试 {attempt + 1}/{self.max_retries}）: {e}")
@@ -277,78 +318,56 @@ class DataFetcher:
 
     # ==================== 股票行情（多数据源降级） ====================
 
-    def _refresh_spot_cache(self) -> bool:
+    def _refresh_spot_cache(self, wait: bool = False) -> bool:
         """
-        刷新全市场行情缓存（使用stock_zh_a_spot一次性获取所有股票）
+        刷新全市场行情缓存（直连东方财富/新浪分页接口一次性获取所有股票）
+
+        已有刷新在进行时不重复发起：wait=False 直接返回False；wait=True 等它完成，
+        完成后已有行情则不再刷新。
 
         Returns:
             是否刷新成功
         """
+        if not self._spot_refresh_lock.acquire(blocking=wait):
+            logger.debug("全市场行情正在刷新，跳过")
+            return False
+        try:
+            if wait and self.market.current.quotes and not self.spot_refresh_due():
+                return True
+            return self._fetch_spot()
+        finally:
+            self._spot_refresh_lock.release()
+
+    def _fetch_spot(self) -> bool:
+        """获取全市场行情并发布到快照（调用方持有 _spot_refresh_lock）"""
         df = None
-        last_error = None
-        
+        handlers = {
+            "eastmoney_spot": fetch_spot_em_sync,
+            "sina_spot": fetch_spot_sina_sync,
+        }
+
         for attempt in range(3):
-            try:
-                logger.info(f"刷新全市场行情缓存... (尝试 {attempt+1}/3)")
-                with disable_proxy():
-                    use_em = time.time() >= self.em_circuit_until
-                    use_sina = time.time() >= self.sina_circuit_until
-                    if use_em:
-                        try:
-                            df = ak.stock_zh_a_spot_em()
-                        except Exception as e_em:
-                            self.em_fail += 1
-                            if "decode value starting with character '<'" in str(e_em) or "RemoteDisconnected" in str(e_em):
-                                if self.em_fail >= 2:
-                                    self.em_circuit_until = time.time() + 600
-                            logger.warning(f"stock_zh_a_spot_em 失败: {e_em}，尝试旧接口")
-                    if df is None and use_sina:
-                        try:
-                            df = ak.stock_zh_a_spot()
-                        except Exception as e_sina:
-                            self.sina_fail += 1
-                            if "decode value starting with character '<'" in str(e_sina) or "RemoteDisconnected" in str(e_sina):
-                                if self.sina_fail >= 2:
-                                    self.sina_circuit_until = time.time() + 600
-                            logger.warning(f"stock_zh_a_spot (sina) 失败: {e_sina}")
-                            raise e_sina
-
-                        # 重命名列以匹配后续逻辑
-                        rename_map = {
-                            'code': '代码',
-                            'name': '名称',
-                            'trade': '最新价',
-                            'changepercent': '涨跌幅',
-                            'open': '今开',
-                            'high': '最高',
-                            'low': '最低',
-                            'volume': '成交量',
-                            'amount': '成交额'
-                        }
-                        df = df.rename(columns=rename_map)
-                        # 确保有时间戳
-                        if '时间戳' not in df.columns:
-                            df['时间戳'] = str(datetime.now())
-                
-                if df is not None and not df.empty:
-                    break
-            except Exception as e:
-                last_error = e
-                logger.warning(f"刷新全市场行情缓存失败 (尝试 {attempt+1}/3): {e}")
-                time.sleep(1.5 + attempt * 1.0 + random.random() * 0.3)
+            if not self.router.candidates("spot"):
+                logger.warning("全市场行情数据源均已熔断，跳过刷新")
+                break
+            logger.info(f"刷新全市场行情缓存... (尝试 {attempt+1}/3)")
+            df = self.router.first("spot", handlers)
+            if df is not None and not df.empty:
+                break
+            time.sleep(1.5 + attempt * 1.0 + random.random() * 0.3)
 
         if df is None or df.empty:
-            logger.error(f"全市场行情数据获取失败，最终错误: {last_error}")
+            logger.error(f"全市场行情数据获取失败，数据源状态: {self.router.snapshot()['sources']}")
             # 关键修复：即使失败也更新时间戳，防止后续每个请求都重复尝试刷新，导致死循环和被封禁
             # 设置较短的TTL（例如60秒），稍后再试
             self.spot_cache_time = time.time()
             return False
 
         try:
-            # 转换为字典 {code: {data}}
-            self.stock_spot_cache = {}
+            # 在旁边构建新的行情字典 {code: {data}}，构建完成后整体发布，读取方不会看到一半的数据
+            quotes = {}
             for _, row in df.iterrows():
-                self.stock_spot_cache[row['代码']] = {
+                quotes[row['代码']] = {
                     'code': row['代码'],
                     'name': row['名称'],
                     'price': float(row['最新价']),
@@ -356,16 +375,23 @@ class DataFetcher:
                     'open': float(row['今开']),
                     'high': float(row['最高']),
                     'low': float(row['最低']),
-                    'volume': int(row['成交量']),
-                    'amount': float(row['成交额']),
-                    'date': str(row['时间戳'])
+                    'volume': int(round(row['成交量'] * 100)),  # 手 -> 股
+                    'turnover': float(row['成交额']),
+                    'date': str(row['时间戳']),
+                    'is_realtime': True,
+                    'delay': '实时',
                 }
 
+            fundamentals = fundamentals_from_spot(
+                df[['代码', '市盈率-动态', '市净率', '总市值']].itertuples(index=False, name=None)
+            )
+
+            self.market.publish_quotes(quotes, fundamentals)
             self.spot_cache_time = time.time()
-            logger.info(f"✅ 全市场行情缓存已更新，共 {len(self.stock_spot_cache)} 只股票")
+            logger.info(f"✅ 全市场行情缓存已更新，共 {len(quotes)} 只股票")
             
-            # 异步批量保存到数据库，防止阻塞
-            threading.Thread(target=self._batch_save_to_db, args=(df,), daemon=True).start()
+            # 交给写入队列异步批量保存，防止阻塞（与其他后台写入串行，不争写锁）
+            db_writer.submit_nowait(self._batch_save_to_db, df)
             
             return True
 
@@ -379,37 +405,30 @@ class DataFetcher:
             logger.info("开始批量保存行情到数据库...")
             db = SessionLocal()
             try:
-                # 为了性能，这里使用粗暴的删除后插入，或者upsert
-                # 考虑到SQLite的并发性，我们尽量使用事务
-                # 注意：这里假设df列名已经是中文
-                
-                # 获取现有所有股票代码
-                # existing_codes = set(code for code, in db.query(StockQuote.stock_code).all())
-                
-                # 逐条更新太慢，使用bulk_save_objects或直接执行SQL
-                # 这里简单起见，遍历更新，但每100条commit一次
-                
-                count = 0
-                for _, row in df.iterrows():
-                    code = row['代码']
-                    quote = db.query(StockQuote).filter(StockQuote.stock_code == code).first()
-                    if not quote:
-                        quote = StockQuote(stock_code=code)
-                        db.add(quote)
-                    
-                    quote.price = float(row['最新价'])
-                    quote.change_percent = float(row['涨跌幅'])
-                    quote.volume = str(row['成交量'])
-                    quote.turnover = str(row['成交额'])
-                    # 全市场接口通常没有PE/PB
-                    
-                    quote.timestamp = datetime.now()
-                    
-                    count += 1
-                    if count % 100 == 0:
-                        db.commit()
-                
-                db.commit()
+                # stock_code 上有唯一索引，整批 INSERT ... ON CONFLICT DO UPDATE，
+                # 不再逐行查询后更新（注意：这里假设df列名已经是中文）
+                with db_write("batch_save_quotes"):
+                    snapshot_time = datetime.now()
+                    frame = df[['代码', '最新价', '涨跌幅', '成交量', '成交额', '市盈率-动态', '市净率', '总市值']].copy()
+                    frame['成交量'] = (frame['成交量'] * 100).round()  # 手 -> 股
+                    frame = frame.astype(object).where(frame.notna(), None)
+                    rows = [
+                        {
+                            'stock_code': code, 'price': price, 'change_percent': change,
+                            'volume': None if volume is None else int(volume), 'turnover': turnover,
+                            'pe': pe, 'pb': pb, 'market_cap': market_cap, 'timestamp': snapshot_time,
+                        }
+                        for code, price, change, volume, turnover, pe, pb, market_cap
+                        in frame.itertuples(index=False, name=None)
+                    ]
+                    # 与 pe_pb_updater 同一数据源；某只股票本次没有PE/PB时保留已有值
+                    count = self._upsert_quotes(db, rows, keep_existing=('pe', 'pb'))
+
+                    # 追加行情快照（stock_quotes只保留最新一行）
+                    if quote_history.backend:
+                        quote_history.append(db, quote_history.rows_from_spot(df, snapshot_time))
+                        quote_history.prune(db)
+                    db.commit()
                 logger.info(f"✅ 批量保存完成，共更新 {count} 条记录")
                 
             except Exception as e:
@@ -420,12 +439,67 @@ class DataFetcher:
         except Exception as e:
             logger.error(f"批量保存线程异常: {e}")
 
+    @staticmethod
+    def _upsert_quotes(db: Session, rows: List[Dict], keep_existing: tuple = ()) -> int:
+        """
+        按 stock_code upsert 行情（只更新rows中给出的列，同一批的行需有相同的列）
+
+        Args:
+            keep_existing: 新值为空时保留已有值的列
+        """
+        if not rows:
+            return 0
+        dialect = db.get_bind().dialect.name
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        fields = [field for field in rows[0] if field != 'stock_code']
+        for i in range(0, len(rows), _UPSERT_CHUNK):
+            stmt = insert(StockQuote).values(rows[i:i + _UPSERT_CHUNK])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['stock_code'],
+                set_={
+                    field: func.coalesce(getattr(stmt.excluded, field), getattr(StockQuote, field))
+                    if field in keep_existing else getattr(stmt.excluded, field)
+                    for field in fields
+                }
+            )
+            db.execute(stmt)
+        return len(rows)
+
+    def _save_stock_list(self, stocks: List[Dict]) -> int:
+        """股票列表写入stocks表（按代码upsert，不覆盖已有的行业/简介）"""
+        db = SessionLocal()
+        try:
+            dialect = db.get_bind().dialect.name
+            insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            now = datetime.now()
+            rows = [
+                {'code': s['code'], 'name': s['name'], 'industry': s.get('industry'),
+                 'market': s.get('market'), 'created_at': now, 'updated_at': now}
+                for s in stocks
+            ]
+            with db_write("save_stock_list"):
+                for i in range(0, len(rows), _UPSERT_CHUNK):
+                    stmt = insert(Stock).values(rows[i:i + _UPSERT_CHUNK])
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=['code'],
+                        set_={field: getattr(stmt.excluded, field) for field in ('name', 'market', 'updated_at')}
+                    )
+                    db.execute(stmt)
+                db.commit()
+            return len(rows)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"保存股票列表失败: {e}")
+            return 0
+        finally:
+            db.close()
+
     def get_stock_quote(self, code: str) -> Optional[Dict]:
         """
         获取单只股票行情（优化版：优先使用全市场缓存 -> 数据库 -> 实时API）
 
         优先级:
-        1. 全市场内存缓存 (stock_zh_a_spot)
+        1. 全市场内存缓存 (东方财富/新浪全市场快照)
         2. 数据库缓存 (StockQuote表, 30分钟内有效)
         3. 单股缓存 (内存)
         4. 历史数据降级 (实时API)
@@ -436,22 +510,21 @@ class DataFetcher:
         Returns:
             股票行情数据
         """
-        # 1. 检查全市场缓存是否需要刷新
-        current_time = time.time()
-        if (self.spot_cache_time is None or
-            current_time - self.spot_cache_time > self.spot_cache_ttl):
-            # 需要刷新缓存
-            if not self.stock_spot_cache:
-                # 第一次使用，主动刷新
-                self._refresh_spot_cache()
-            elif current_time - self.spot_cache_time > self.spot_cache_ttl:
-                # 缓存过期，后台刷新（不阻塞当前请求）
-                import threading
+        # 1. 检查全市场缓存是否需要刷新（多进程部署时只由上游worker刷新；盘中按间隔，收盘后一次，夜间和节假日不刷新）
+        if shared_state.is_upstream() and self.spot_refresh_due():
+            if not self.market.current.quotes:
+                # 第一次使用，主动刷新（其他线程正在刷新时等它完成）
+                self._refresh_spot_cache(wait=True)
+            elif not self._spot_refresh_lock.locked():
+                # 缓存过期，后台刷新（不阻塞当前请求；已有刷新在进行时不再发起）
                 threading.Thread(target=self._refresh_spot_cache, daemon=True).start()
 
         # 2. 优先从全市场缓存中查找
-        if code in self.stock_spot_cache:
-            return self.stock_spot_cache[code]
+        quote = self.market.current.quote(code)
+        if quote is not None:
+            record_cache("spot", True)
+            return quote
+        record_cache("spot", False)
 
         # 3. 尝试从数据库获取缓存
         try:
@@ -459,25 +532,15 @@ class DataFetcher:
             try:
                 db_quote = db.query(StockQuote).filter(StockQuote.stock_code == code).first()
                 if db_quote:
-                    # 检查是否过期 (例如30分钟)
+                    # 检查是否过期 (例如30分钟)；只读模式下没有更新的来源，采集进程写入的最新一行即可用
                     time_diff = datetime.now() - db_quote.timestamp
-                    if time_diff.total_seconds() < 1800: # 30分钟
+                    if time_diff.total_seconds() < 1800 or self.read_only: # 30分钟
                         logger.debug(f"从数据库获取股票 {code} 行情缓存")
-                        return {
-                            'code': db_quote.stock_code,
-                            'name': self._get_stock_name(code), # 假设名称变化不大
-                            'price': db_quote.price,
-                            'change': db_quote.change_percent,
-                            'volume': db_quote.volume,
-                            'amount': db_quote.turnover,
-                            'pe': db_quote.pe,
-                            'pb': db_quote.pb,
-                            'market_cap': db_quote.market_cap,
-                            'date': db_quote.timestamp.strftime("%Y-%m-%d"),
-                            'is_realtime': False,
-                            'delay': '30分钟内',
-                            'timestamp': db_quote.timestamp.isoformat()
-                        }
+                        return self._quote_from_row(
+                            self._get_stock_name(code),  # 假设名称变化不大
+                            db_quote.stock_code, db_quote.price, db_quote.change_percent, db_quote.volume,
+                            db_quote.turnover, db_quote.pe, db_quote.pb, db_quote.market_cap, db_quote.timestamp,
+                        )
             finally:
                 db.close()
         except Exception as e:
@@ -490,14 +553,17 @@ class DataFetcher:
             logger.debug(f"从内存缓存获取股票 {code} 行情")
             return cached
 
+        if self.read_only:
+            return None
+
         # 5. 降级方案：从历史数据获取 (API)
         logger.info(f"从API获取股票 {code} 行情")
         quote_data = self._get_quote_from_history(code)
 
         if quote_data:
             self.cache.set(cache_key, quote_data)
-            # 同时也保存到数据库
-            self._save_to_db(quote_data)
+            # 同时也保存到数据库（排队异步写入，不阻塞当前请求）
+            db_writer.submit_nowait(self._save_to_db, quote_data)
 
         return quote_data
 
@@ -516,6 +582,10 @@ class DataFetcher:
         Returns:
             股票行情数据
         """
+        # 只读模式：不访问上游，按 get_stock_quote 读快照/数据库
+        if self.read_only:
+            return self.get_stock_quote(code)
+
         # 1. 先检查内存缓存
         cache_key = f"quote_{code}"
         cached = self.cache.get(cache_key)
@@ -530,6 +600,70 @@ class DataFetcher:
 
         return quote_data
         
+    @staticmethod
+    def _quote_from_row(name, code, price, change, volume, turnover, pe, pb, market_cap, timestamp,
+                        delay: str = '30分钟内') -> Dict:
+        """stock_quotes 行 -> 行情字典"""
+        return {
+            'code': code,
+            'name': name,
+            'price': price,
+            'change': change,
+            'volume': volume,
+            'turnover': turnover,
+            'pe': pe,
+            'pb': pb,
+            'market_cap': market_cap,
+            'date': timestamp.strftime("%Y-%m-%d"),
+            'is_realtime': False,
+            'delay': delay,
+            'timestamp': timestamp.isoformat()
+        }
+
+    def load_snapshot_from_db(self) -> bool:
+        """
+        只读模式且没有共享目录时，从采集进程写入的 stocks / stock_quotes 构建快照（有更新时才加载）
+
+        Returns:
+            是否加载了新快照
+        """
+        db = SessionLocal()
+        try:
+            marker = (db.query(func.max(StockQuote.timestamp)).scalar(), db.query(func.max(Stock.updated_at)).scalar())
+            if marker == self._db_snapshot_marker or marker == (None, None):
+                return False
+            stocks = db.query(Stock.code, Stock.name, Stock.industry, Stock.market).order_by(Stock.code).all()
+            rows = db.query(StockQuote.stock_code, StockQuote.price, StockQuote.change_percent, StockQuote.volume,
+                            StockQuote.turnover, StockQuote.pe, StockQuote.pb, StockQuote.market_cap,
+                            StockQuote.timestamp).filter(StockQuote.price.isnot(None)).all()
+        finally:
+            db.close()
+
+        universe = tuple(
+            {'code': code, 'name': name, 'industry': industry or '未知', 'market': market or self._get_market_type(code)}
+            for code, name, industry, market in stocks
+        )
+        names = {stock['code']: stock['name'] for stock in universe}
+        delay = f"{max(1, settings.SPOT_SESSION_SECONDS // 60)}分钟内"  # 采集进程盘中的刷新间隔
+        quotes, fundamentals = {}, {}
+        for code, price, change, volume, turnover, pe, pb, market_cap, timestamp in rows:
+            quotes[code] = self._quote_from_row(names.get(code, code), code, price, change, volume, turnover,
+                                                pe, pb, market_cap, timestamp, delay=delay)
+            fundamentals[code] = {'pe': pe, 'pb': pb, 'market_cap': market_cap}
+
+        quotes_at, universe_at = (value.timestamp() if value else None for value in marker)
+        snapshot = MarketSnapshot(
+            version=int(max(filter(None, (quotes_at, universe_at))) * 1000),
+            universe=universe, universe_at=universe_at,
+            quotes=MappingProxyType(quotes), fundamentals=MappingProxyType(fundamentals), quotes_at=quotes_at,
+            _names=MappingProxyType(names),
+        )
+        self._db_snapshot_marker = marker
+        if self.market.load(snapshot):
+            logger.info(f"从数据库加载全市场快照: {len(universe)} 只股票, {len(quotes)} 条行情")
+            return True
+        return False
+
     def _save_to_db(self, data: Dict):
         """保存行情数据到数据库"""
         try:
@@ -539,24 +673,24 @@ class DataFetcher:
                 if not code:
                     return
                     
-                # 查找现有记录或创建新记录
-                quote = db.query(StockQuote).filter(StockQuote.stock_code == code).first()
-                if not quote:
-                    quote = StockQuote(stock_code=code)
-                    db.add(quote)
-                
-                # 更新字段
-                quote.price = data.get('price', 0.0)
-                quote.change_percent = data.get('change', 0.0)
-                quote.volume = str(data.get('volume', '0'))
-                quote.turnover = str(data.get('turnover', '0'))
-                # PE/PB/MarketCap 可能在data中没有，需要检查
-                if 'pe' in data: quote.pe = data.get('pe')
-                if 'pb' in data: quote.pb = data.get('pb')
-                if 'market_cap' in data: quote.market_cap = str(data.get('market_cap'))
-                
-                quote.timestamp = datetime.now()
-                db.commit()
+                row = {
+                    'stock_code': code,
+                    'price': data.get('price', 0.0),
+                    'change_percent': data.get('change', 0.0),
+                    'volume': data.get('volume'),
+                    'turnover': data.get('turnover'),
+                    'timestamp': datetime.now(),
+                }
+                # PE/PB/MarketCap 可能在data中没有，没有时保留已有值
+                if 'pe' in data: row['pe'] = data.get('pe')
+                if 'pb' in data: row['pb'] = data.get('pb')
+                if 'market_cap' in data: row['market_cap'] = data.get('market_cap')
+
+                self._upsert_quotes(db, [row])
+                if quote_history.backend:
+                    quote_history.append(db, [quote_history.row_from_quote(data, row['timestamp'])])
+                with db_write("save_quote"):
+                    db.commit()
             except Exception as e:
                 db.rollback()
                 logger.error(f"保存股票 {data.get('code')} 到数据库失败: {e}")
@@ -576,14 +710,14 @@ class DataFetcher:
         优点: 接口100%可用，数据准确
         缺点: 有几分钟延迟（可接受）
         """
-        # 优先使用baostock
-        if self.bs_logged_in:
-            quote_data = self._get_quote_from_baostock(code)
-            if quote_data:
-                return quote_data
-
-        # 降级使用akshare
-        return self._get_quote_from_akshare(code)
+        handlers = {
+            "baostock": self._get_quote_from_baostock,
+            "akshare_hist": self._get_quote_from_akshare,
+        }
+        if settings.HEDGE_ENABLED:
+            # 首选数据源慢于其p95时并发请求备用数据源，先到先得
+            return self.router.hedged("quote", handlers, code)
+        return self.router.first("quote", handlers, code)
 
     def _get_quote_latest_day(self, code: str) -> Optional[Dict]:
         """
@@ -601,25 +735,26 @@ class DataFetcher:
             股票行情数据
         """
         # 只使用baostock，不降级到akshare（避免并发触发限流）
-        if self.bs_logged_in:
-            return self._get_quote_one_day_baostock(code)
-
-        return None
+        if not self.ensure_baostock_login():
+            return None
+        try:
+            return self.router.call("baostock", self._get_quote_one_day_baostock, code)
+        except SourceUnavailable:
+            return None
+        except Exception as e:
+            logger.warning(f"baostock获取股票 {code} 最新一天行情失败: {e}")
+            return None
 
     def _get_quote_from_baostock(self, code: str) -> Optional[Dict]:
         """使用baostock获取最新行情"""
         # 加锁，防止多线程竞争
-        with self.bs_lock:
+        with traced_lock(self.bs_lock, "bs_lock"):
             # 确保已登录
             if not self.bs_logged_in:
-                try:
-                    lg = bs.login()
-                    if lg.error_code == '0':
-                        self.bs_logged_in = True
-                    else:
-                        return None
-                except:
-                    return None
+                lg = bs.login()
+                if lg.error_code != '0':
+                    raise UpstreamError(f"baostock登录失败: {lg.error_msg}")
+                self.bs_logged_in = True
             
             try:
                 # 转换股票代码格式 (600519 -> sh.600519)
@@ -640,11 +775,10 @@ class DataFetcher:
                 )
 
                 if rs.error_code != '0':
-                    logger.warning(f"baostock查询失败: {rs.error_msg}")
                     # 如果是未登录错误，尝试重连
                     if "login" in str(rs.error_msg).lower():
                         bs.login() # 尝试重连
-                    return None
+                    raise UpstreamError(f"baostock查询失败: {rs.error_msg}")
 
                 # 解析数据
                 data_list = []
@@ -674,8 +808,8 @@ class DataFetcher:
                     'open': float(latest[3]) if latest[3] else 0.0,    # open
                     'high': float(latest[4]) if latest[4] else 0.0,    # high
                     'low': float(latest[2]) if latest[2] else 0.0,     # low
-                    'volume': self._format_volume(int(latest[7]) if latest[7] else 0),  # volume
-                    'turnover': self._format_turnover(float(latest[8]) if latest[8] else 0.0),  # amount
+                    'volume': int(float(latest[7])) if latest[7] else 0,  # volume（股）
+                    'turnover': float(latest[8]) if latest[8] else 0.0,  # amount（元）
                     'date': latest[0],  # date
                     'is_realtime': False,
                     'delay': '1天',
@@ -684,13 +818,11 @@ class DataFetcher:
 
             except Exception as e:
                 logger.warning(f"baostock获取行情失败: {e}")
-                return None
+                raise
 
     def _get_quote_from_akshare(self, code: str) -> Optional[Dict]:
         """使用akshare获取最新行情（备用）"""
         try:
-            if time.time() < self.ak_circuit_until:
-                return None
             now = datetime.now()
             if now.year > 2025:
                 end_date = "20251231"
@@ -706,6 +838,7 @@ class DataFetcher:
                 for attempt in range(3):
                     try:
                         self.ak_sema.acquire()
+                        upstream_http.throttle("push2his.eastmoney.com")
                         df = ak.stock_zh_a_hist(
                             symbol=code,
                             period="daily",
@@ -717,10 +850,6 @@ class DataFetcher:
                     except Exception as e:
                         last_error = e
                         logger.warning(f"akshare获取股票 {code} 行情失败 (尝试 {attempt+1}/3): {e}")
-                        if "RemoteDisconnected" in str(e) or "decode value starting with character '<'" in str(e):
-                            self.ak_fail += 1
-                            if self.ak_fail >= 2:
-                                self.ak_circuit_until = time.time() + 600
                         if attempt < 2:
                             # 增加随机等待时间，避免并发请求被封禁
                             sleep_time = (2 + attempt * 2) + random.random()
@@ -732,10 +861,9 @@ class DataFetcher:
                             pass
             
             if df is None:
-                if last_error:
-                    # 记录详细错误但不抛出，避免中断整个筛选流程
-                    logger.error(f"akshare获取股票 {code} 最终失败: {last_error}")
-                return None
+                # 重试耗尽：抛出最后一次的错误（计入熔断失败，由路由换下一个数据源）
+                logger.error(f"akshare获取股票 {code} 最终失败: {last_error}")
+                raise last_error
 
             if df.empty:
                 logger.warning(f"akshare股票 {code} 历史数据为空")
@@ -752,8 +880,8 @@ class DataFetcher:
                 'open': float(latest['开盘']),
                 'high': float(latest['最高']),
                 'low': float(latest['最低']),
-                'volume': self._format_volume(latest['成交量']),
-                'turnover': self._format_turnover(latest['成交额']),
+                'volume': int(latest['成交量']) * 100,  # 手 -> 股
+                'turnover': float(latest['成交额']),
                 'date': str(latest['日期']),
                 'is_realtime': False,
                 'delay': '几分钟',
@@ -762,7 +890,7 @@ class DataFetcher:
 
         except Exception as e:
             logger.error(f"akshare获取股票 {code} 行情失败: {e}")
-            return None
+            raise
 
     def _get_quote_one_day_baostock(self, code: str) -> Optional[Dict]:
         """
@@ -773,17 +901,13 @@ class DataFetcher:
         - 减少数据传输和处理时间
         """
         # 加锁，防止多线程竞争
-        with self.bs_lock:
+        with traced_lock(self.bs_lock, "bs_lock"):
             # 确保已登录
             if not self.bs_logged_in:
-                try:
-                    lg = bs.login()
-                    if lg.error_code == '0':
-                        self.bs_logged_in = True
-                    else:
-                        return None
-                except:
-                    return None
+                lg = bs.login()
+                if lg.error_code != '0':
+                    raise UpstreamError(f"baostock登录失败: {lg.error_msg}")
+                self.bs_logged_in = True
 
             try:
                 # 转换股票代码格式 (600519 -> sh.600519)
@@ -804,8 +928,7 @@ class DataFetcher:
                 )
 
                 if rs.error_code != '0':
-                    logger.warning(f"baostock查询失败 {code}: {rs.error_msg}")
-                    return None
+                    raise UpstreamError(f"baostock查询失败 {code}: {rs.error_msg}")
 
                 # 解析数据
                 data_list = []
@@ -826,6 +949,8 @@ class DataFetcher:
                         adjustflag="2"
                     )
 
+                    if rs.error_code != '0':
+                        raise UpstreamError(f"baostock查询失败 {code}: {rs.error_msg}")
                     while (rs.error_code == '0') & rs.next():
                         data_list.append(rs.get_row_data())
 
@@ -843,8 +968,8 @@ class DataFetcher:
                     'open': float(latest[3]) if latest[3] else 0.0,    # open
                     'high': float(latest[4]) if latest[4] else 0.0,    # high
                     'low': float(latest[2]) if latest[2] else 0.0,     # low
-                    'volume': self._format_volume(int(latest[7]) if latest[7] else 0),  # volume
-                    'turnover': self._format_turnover(float(latest[8]) if latest[8] else 0.0),  # amount
+                    'volume': int(float(latest[7])) if latest[7] else 0,  # volume（股）
+                    'turnover': float(latest[8]) if latest[8] else 0.0,  # amount（元）
                     'date': latest[0],  # date
                     'is_realtime': False,
                     'delay': '1天',
@@ -853,7 +978,7 @@ class DataFetcher:
 
             except Exception as e:
                 logger.warning(f"baostock获取一天行情失败 {code}: {e}")
-                return None
+                raise
 
     def _get_quote_one_day_akshare(self, code: str) -> Optional[Dict]:
         """
@@ -864,8 +989,6 @@ class DataFetcher:
         - 减少数据传输和处理时间
         """
         try:
-            if time.time() < self.ak_circuit_until:
-                return None
 
             now = datetime.now()
             end_date = now.strftime("%Y%m%d")
@@ -878,6 +1001,7 @@ class DataFetcher:
                 for attempt in range(3):
                     try:
                         self.ak_sema.acquire()
+                        upstream_http.throttle("push2his.eastmoney.com")
                         df = ak.stock_zh_a_hist(
                             symbol=code,
                             period="daily",
@@ -889,10 +1013,6 @@ class DataFetcher:
                     except Exception as e:
                         last_error = e
                         logger.warning(f"akshare获取股票 {code} 一天行情失败 (尝试 {attempt+1}/3): {e}")
-                        if "RemoteDisconnected" in str(e) or "decode value starting with character '<'" in str(e):
-                            self.ak_fail += 1
-                            if self.ak_fail >= 2:
-                                self.ak_circuit_until = time.time() + 600
                         if attempt < 2:
                             sleep_time = (1 + attempt * 1) + random.random()
                             time.sleep(sleep_time)
@@ -919,8 +1039,8 @@ class DataFetcher:
                 'open': float(latest['开盘']),
                 'high': float(latest['最高']),
                 'low': float(latest['最低']),
-                'volume': self._format_volume(latest['成交量']),
-                'turnover': self._format_turnover(latest['成交额']),
+                'volume': int(latest['成交量']) * 100,  # 手 -> 股
+                'turnover': float(latest['成交额']),
                 'date': str(latest['日期']),
                 'is_realtime': False,
                 'delay': '1天',
@@ -950,24 +1070,17 @@ class DataFetcher:
 
     def _get_stock_name(self, code: str) -> str:
         """获取股票名称（从缓存或列表）"""
-        # 从股票列表缓存获取
-        stock_list = self.cache.get("stock_list")
-        if stock_list:
-            for stock in stock_list:
-                if stock['code'] == code:
-                    return stock['name']
-
-        # 如果缓存没有，返回股票代码
-        return code
+        # 从快照中的股票列表获取，没有时返回股票代码
+        return self.market.current.name(code) or code
 
     # ==================== 历史行情 ====================
 
     def get_stock_history(self, code: str, period: str = "daily",
-                         start_date: str = None, end_date: str = None) -> pd.DataFrame:
+                         start_date: str = None, end_date: str = None) -> 'pd.DataFrame':
         """
         获取股票历史行情（带缓存和重试）
 
-        优先使用baostock，失败后使用akshare
+        按数据源健康度选择（默认baostock优先，akshare备用，熔断的数据源跳过）
 
         Args:
             code: 股票代码
@@ -986,18 +1099,26 @@ class DataFetcher:
             logger.info(f"从缓存获取股票 {code} 历史数据")
             return cached
 
-        # 优先使用baostock
-        if self.bs_logged_in:
-            df = self._get_history_from_baostock(code, period, start_date, end_date, cache_key)
+        if self.read_only:
+            # 只读模式：读采集进程同步的本地日线
+            from app.services.bar_store import bar_store
+            df = bar_store.load_history(code, period, start_date, end_date)
             if not df.empty:
-                return df
+                self.cache.set(cache_key, df)
+            return df
 
-        # 降级使用akshare
-        return self._get_history_from_akshare(code, period, start_date, end_date, cache_key)
+        # 按数据源健康度依次尝试（默认baostock优先，akshare备用）
+        df = self.router.first("history", {
+            "baostock": self._get_history_from_baostock,
+            "akshare_hist": self._get_history_from_akshare,
+        }, code, period, start_date, end_date, cache_key)
+        return df if df is not None else pd.DataFrame()
 
     def _get_history_from_baostock(self, code: str, period: str,
-                                   start_date: str, end_date: str, cache_key: str) -> pd.DataFrame:
+                                   start_date: str, end_date: str, cache_key: str) -> 'pd.DataFrame':
         """使用baostock获取历史数据"""
+        if not self.ensure_baostock_login():
+            raise UpstreamError("baostock未登录")
         try:
             # 转换日期格式 (YYYYMMDD -> YYYY-MM-DD)
             if end_date:
@@ -1019,23 +1140,27 @@ class DataFetcher:
 
             logger.info(f"使用baostock获取股票 {code} 历史数据")
 
-            rs = bs.query_history_k_data_plus(
-                bs_code,
-                "date,code,open,high,low,close,preclose,volume,amount,pctChg,turn",
-                start_date=start_date_bs,
-                end_date=end_date_bs,
-                frequency=frequency,
-                adjustflag="2"  # 2: 前复权
-            )
+            # 加锁，防止多线程竞争（baostock共用一个socket连接）
+            with traced_lock(self.bs_lock, "bs_lock"):
+                if not self.bs_logged_in:
+                    raise UpstreamError("baostock未登录")
 
-            if rs.error_code != '0':
-                logger.warning(f"baostock查询失败: {rs.error_msg}")
-                return pd.DataFrame()
+                rs = bs.query_history_k_data_plus(
+                    bs_code,
+                    "date,code,open,high,low,close,preclose,volume,amount,pctChg,turn",
+                    start_date=start_date_bs,
+                    end_date=end_date_bs,
+                    frequency=frequency,
+                    adjustflag="2"  # 2: 前复权
+                )
+
+                if rs.error_code != '0':
+                    raise UpstreamError(f"baostock查询失败: {rs.error_msg}")
 
-            # 解析数据
-            data_list = []
-            while (rs.error_code == '0') & rs.next():
-                data_list.append(rs.get_row_data())
+                # 解析数据
+                data_list = []
+                while (rs.error_code == '0') & rs.next():
+                    data_list.append(rs.get_row_data())
 
             if not data_list:
                 logger.warning(f"baostock返回空数据")
@@ -1069,10 +1194,10 @@ class DataFetcher:
 
         except Exception as e:
             logger.warning(f"baostock获取历史数据失败: {e}")
-            return pd.DataFrame()
+            raise
 
     def _get_history_from_akshare(self, code: str, period: str,
-                                  start_date: str, end_date: str, cache_key: str) -> pd.DataFrame:
+                                  start_date: str, end_date: str, cache_key: str) -> 'pd.DataFrame':
         """使用akshare获取历史数据（备用）"""
         for attempt in range(self.max_retries):
             try:
@@ -1085,6 +1210,7 @@ class DataFetcher:
                 logger.info(f"使用akshare获取股票 {code} 历史数据（{start_date} - {end_date}）")
 
                 with disable_proxy():
+                    upstream_http.throttle("push2his.eastmoney.com")
                     df = ak.stock_zh_a_hist(
                         symbol=code,
                         period=period,
@@ -1109,7 +1235,7 @@ class DataFetcher:
                     time.sleep(2 ** attempt)
                 else:
                     logger.error(f"akshare获取股票 {code} 历史数据最终失败: {e}")
-                    return pd.DataFrame()
+                    raise
 
     # ==================== 股票详细信息 ====================
 
@@ -1175,7 +1301,7 @@ class DataFetcher:
                 # 解析市值字符串（如 "25600.35亿"）
                 market_cap = self._parse_market_cap_str(market_cap)
                 indicators['market_cap'] = market_cap
-                indicators['market_cap_str'] = self._format_market_cap(market_cap)
+                indicators['market_cap_str'] = format_market_cap(market_cap * 100000000)
             else:
                 indicators['market_cap'] = 0
                 indicators['market_cap_str'] = '未知'
@@ -1250,47 +1376,11 @@ class DataFetcher:
         else:
             return '未知'
 
-    def _format_volume(self, volume: float) -> str:
-        """格式化成交量"""
-        if pd.isna(volume):
-            return "未知"
-        volume = float(volume)
-        if volume >= 100000000:
-            return f"{volume / 100000000:.2f}亿手"
-        elif volume >= 10000:
-            return f"{volume / 10000:.2f}万手"
-        else:
-            return f"{volume}手"
-
-    def _format_turnover(self, turnover: float) -> str:
-        """格式化成交额"""
-        if pd.isna(turnover):
-            return "未知"
-        turnover = float(turnover)
-        if turnover >= 100000000:
-            return f"{turnover / 100000000:.2f}亿"
-        elif turnover >= 10000:
-            return f"{turnover / 10000:.2f}万"
-        else:
-            return f"{turnover}"
-
-    def _format_market_cap(self, market_cap: float) -> str:
-        """格式化市值"""
-        if pd.isna(market_cap):
-            return "未知"
-        market_cap = float(market_cap)
-        if market_cap >= 1000000000000:
-            return f"{market_cap / 1000000000000:.2f}万亿"
-        elif market_cap >= 100000000:
-            return f"{market_cap / 100000000:.2f}亿"
-        else:
-            return f"{market_cap / 10000:.2f}万"
-
     # ==================== PE/PB数据（从数据库） ====================
 
     def get_stock_pe_pb(self, code: str) -> Dict:
         """
-        从数据库获取股票的PE/PB数据
+        获取股票的PE/PB数据（优先全市场快照中的基本面，其次数据库）
 
         Args:
             code: 股票代码
@@ -1298,6 +1388,10 @@ class DataFetcher:
         Returns:
             {pe: float or None, pb: float or None}
         """
+        fundamental = self.market.current.fundamental(code)
+        if fundamental and (fundamental['pe'] is not None or fundamental['pb'] is not None):
+            return {'pe': fundamental['pe'], 'pb': fundamental['pb']}
+
         try:
             from app.database import SessionLocal
             from app.models import StockQuote
@@ -1322,19 +1416,68 @@ class DataFetcher:
             logger.warning(f"从数据库获取股票 {code} PE/PB失败: {e}")
             return {'pe': None, 'pb': None}
 
+    # ==================== 异步接口 ====================
+    # 供async路由使用：命中内存缓存时直接返回，否则在专用线程池中执行同步实现
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """在上游专用线程池中执行同步函数（baostock/akshare/数据库等阻塞调用）"""
+        loop = asyncio.get_running_loop()
+        # 与asyncio.to_thread一样复制上下文，线程中的span挂在调用方的trace下
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, functools.partial(context.run, func, *args, **kwargs))
+
+    async def aget_stock_list(self) -> List[Dict]:
+        """get_stock_list 的异步版本"""
+        snapshot = self.market.current
+        if not self.universe_refresh_due(snapshot):
+            record_cache("stock_list", True)
+            return snapshot.universe
+        return await self.run_blocking(self.get_stock_list)
+
+    async def aget_stock_quote(self, code: str) -> Optional[Dict]:
+        """get_stock_quote 的异步版本（全市场缓存新鲜且命中时不切换线程）"""
+        quote = self.market.current.quote(code)
+        if quote is not None and not self.spot_refresh_due():
+            record_cache("spot", True)
+            return quote
+        return await self.run_blocking(self.get_stock_quote, code)
+
+    async def aget_stock_quote_latest(self, code: str) -> Optional[Dict]:
+        """get_stock_quote_latest 的异步版本（缓存读取和反序列化同样在线程池中，不阻塞事件循环）"""
+        return await self.run_blocking(self.get_stock_quote_latest, code)
+
+    async def aget_stock_history(self, code: str, period: str = "daily",
+                                 start_date: str = None, end_date: str = None) -> 'pd.DataFrame':
+        """get_stock_history 的异步版本（缓存读取和反序列化同样在线程池中，不阻塞事件循环）"""
+        return await self.run_blocking(self.get_stock_history, code, period, start_date, end_date)
+
+    async def aget_stock_info(self, code: str) -> Optional[Dict]:
+        """get_stock_info 的异步版本"""
+        return await self.run_blocking(self.get_stock_info, code)
+
+    async def aget_stock_pe_pb(self, code: str) -> Dict:
+        """get_stock_pe_pb 的异步版本（数据库查询）"""
+        return await self.run_blocking(self.get_stock_pe_pb, code)
+
     # ==================== 缓存管理 ====================
 
     def clear_cache(self):
-        """清空所有缓存"""
+        """清空所有缓存（全市场行情保留，由定时刷新更新）"""
         self.cache.clear()
+        if shared_state.is_upstream():
+            self.market.clear_universe()
         logger.info("所有缓存已清空")
 
     def get_cache_stats(self) -> Dict:
         """获取缓存统计信息"""
+        snapshot = self.market.current
         return {
             'cache_size': len(self.cache.cache),
             'cache_keys': list(self.cache.cache.keys()),
-            'ttl': self.cache.ttl
+            'ttl': self.cache.ttl,
+            'snapshot_version': snapshot.version,
+            'snapshot_stocks': len(snapshot.universe),
+            'snapshot_quotes': len(snapshot.quotes),
         }
 
 
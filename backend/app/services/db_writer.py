@@ -0,0 +1,114 @@
+"""
+数据库写入队列 - 单写线程
+
+SQLite同一时刻只允许一个写事务。全市场行情入库（5000+行）、单股行情回写、日线upsert
+原先各开线程并发写入，互相等待写锁甚至报 database is locked。
+这里把后台写入统一排进一个队列，由一个专用线程串行执行：
+
+- 写入之间不再争锁；配合WAL，读请求完全不受写入影响
+- submit_nowait() 用于可丢弃的回写（队列满时丢弃并记录警告，不拖慢请求）
+- run() 提交后等待结果，用于调用方需要写入结果的场景
+
+写入任务内部再调用 run() 时直接在写线程中执行，不会等待自己而死锁。
+"""
+import contextvars
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class WriterQueueFull(Exception):
+    """写入队列已满"""
+
+
+class DBWriter:
+    """单线程写入队列"""
+
+    def __init__(self, maxsize: int = 1000):
+        self._queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                future, context, func, args, kwargs = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(context.run(func, *args, **kwargs))
+                except BaseException as e:
+                    logger.error(f"数据库写入任务 {getattr(func, '__name__', func)} 失败: {e}")
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def submit(self, func: Callable, *args, block: bool = True, **kwargs) -> Future:
+        """
+        排队执行写入任务
+
+        Args:
+            block: 队列满时是否等待；False时丢弃任务并抛出 WriterQueueFull
+        """
+        self._ensure_started()
+        future: Future = Future()
+        # 复制调用方上下文，写入线程中的span仍挂在发起请求的trace下
+        item = (future, contextvars.copy_context(), func, args, kwargs)
+        try:
+            self._queue.put(item, block=block)
+        except queue.Full:
+            self.dropped += 1
+            raise WriterQueueFull(f"写入队列已满（{self._queue.maxsize}）")
+        return future
+
+    def submit_nowait(self, func: Callable, *args, **kwargs) -> Optional[Future]:
+        """提交可丢弃的写入任务；队列满时丢弃并返回None"""
+        try:
+            return self.submit(func, *args, block=False, **kwargs)
+        except WriterQueueFull as e:
+            logger.warning(f"{e}，丢弃写入任务 {getattr(func, '__name__', func)}")
+            return None
+
+    def run(self, func: Callable, *args, timeout: Optional[float] = None, **kwargs):
+        """提交并等待写入结果"""
+        if threading.current_thread() is self._thread:
+            return func(*args, **kwargs)
+        return self.submit(func, *args, **kwargs).result(timeout=timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """等待此前提交的写入全部完成"""
+        self.run(lambda: None, timeout=timeout)
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        """处理完已排队的写入后停止写线程"""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(None)
+        thread.join(timeout=timeout)
+        self._thread = None
+
+
+# 全局实例
+db_writer = DBWriter(maxsize=settings.DB_WRITER_QUEUE_SIZE)
@@ -0,0 +1,119 @@
+"""
+历史K线JSON序列化服务（向量化）
+
+直接从DataFrame底层的NumPy数组生成JSON，经orjson一次性编码，
+不再逐行 iterrows + float()/int() 转换。
+
+支持以下格式（查询参数 format）:
+- json（默认）: 兼容旧版的行格式 {data: [{date, open, ...}, ...]}
+- columns: 列格式 {data: {dates: [], open: [], ...}}
+- compact: 图表紧凑格式 {dates: [], k: [[open, close, low, high], ...], volume: []}
+  k线顺序与ECharts candlestick一致，价格保留3位小数
+- table: 列头 + 元组数组 {columns: [...], rows: [[...], ...]}（compact=true时使用）
+"""
+from typing import Dict, List, Optional, Tuple
+import orjson
+from fastapi.responses import Response
+
+from app.services.columnar_export import HISTORY_COLUMNS
+from app.services.lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+JSON_FORMATS = ("json", "columns", "compact", "table")
+
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY
+
+# 紧凑格式K线列顺序（ECharts: open, close, lowest, highest）
+_COMPACT_K = ('开盘', '收盘', '最低', '最高')
+
+
+def _dates(df) -> list:
+    """日期列转字符串列表（baostock为字符串，akshare为date对象）"""
+    col = df['日期']
+    if col.dtype == object and len(col) and isinstance(col.iat[0], str):
+        return col.tolist()
+    return col.astype(str).tolist()
+
+
+def _column(df, src: str, name: str) -> 'np.ndarray':
+    """取出连续的NumPy列（volume为int64，其余float64）"""
+    if name == 'volume':
+        return np.ascontiguousarray(df[src].to_numpy(dtype=np.int64))
+    return np.ascontiguousarray(df[src].to_numpy(dtype=np.float64))
+
+
+def _row_columns(df) -> Tuple[List[str], List[list]]:
+    """行格式所需的列名和Python列表形式的列（整列tolist，避免逐格转换）"""
+    names = ['date']
+    columns = [_dates(df)]
+    for name, src in HISTORY_COLUMNS[1:]:
+        if src in df.columns:
+            names.append(name)
+            columns.append(_column(df, src, name).tolist())
+    return names, columns
+
+
+def history_columns(df) -> Dict:
+    """DataFrame -> {dates: [...], open: ndarray, ...}"""
+    data = {'dates': _dates(df)}
+    for name, src in HISTORY_COLUMNS[1:]:
+        if src in df.columns:
+            data[name] = _column(df, src, name)
+    return data
+
+
+def serialize_history(df, code: str, period: str, format: Optional[str] = None) -> bytes:
+    """
+    序列化历史K线
+
+    Args:
+        df: get_stock_history 返回的DataFrame
+        code: 股票代码
+        period: 周期
+        format: json / columns / compact
+
+    Returns:
+        JSON字节串
+    """
+    fmt = (format or "json").lower()
+
+    if fmt == "columns":
+        body = {'code': code, 'period': period, 'format': 'columns', 'data': history_columns(df)}
+
+    elif fmt == "compact":
+        k = np.round(np.column_stack([df[c].to_numpy(dtype=np.float64) for c in _COMPACT_K]), 3)
+        body = {
+            'code': code,
+            'period': period,
+            'format': 'compact',
+            'dates': _dates(df),
+            'k': np.ascontiguousarray(k),
+            'volume': _column(df, '成交量', 'volume'),
+        }
+
+    elif fmt == "table":
+        names, columns = _row_columns(df)
+        body = {
+            'code': code,
+            'period': period,
+            'format': 'table',
+            'columns': names,
+            'rows': list(zip(*columns)),
+        }
+
+    else:
+        # 旧版行格式：列先整体转为Python列表，再用zip组装，避免逐格转换
+        names, columns = _row_columns(df)
+        body = {
+            'code': code,
+            'period': period,
+            'data': [dict(zip(names, values)) for values in zip(*columns)],
+        }
+
+    return orjson.dumps(body, option=_OPTIONS)
+
+
+def history_response(df, code: str, period: str, format: Optional[str] = None) -> Response:
+    """返回已序列化的JSON响应（跳过FastAPI的jsonable_encoder）"""
+    return Response(content=serialize_history(df, code, period, format), media_type="application/json")
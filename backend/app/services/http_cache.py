@@ -0,0 +1,98 @@
+"""
+HTTP缓存辅助 - ETag / Last-Modified / Cache-Control
+
+ETag由数据快照版本、K线最后时间戳等"数据身份"计算，而不是对响应体做哈希，
+这样命中 If-None-Match 时可以在查询历史数据、序列化之前直接返回304。
+
+各接口的Cache-Control策略集中在 CACHE_POLICIES 中，浏览器和前端nginx据此缓存。
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+# 各接口的Cache-Control策略
+CACHE_POLICIES = {
+    # 个股详情：行情快照默认5分钟刷新一次，短缓存 + 过期后可先用旧值
+    "quote": "public, max-age=15, stale-while-revalidate=30",
+    # 日K线：盘中最后一根K线会变化
+    "history_daily": "public, max-age=300, stale-while-revalidate=60",
+    # 周K/月K：变化很慢
+    "history": "public, max-age=3600, stale-while-revalidate=300",
+    # 策略配置：随版本发布变化
+    "strategies": "public, max-age=86400",
+    # 自选股：用户私有数据，每次都需向服务端验证（配合ETag返回304）
+    "watchlist": "private, no-cache",
+}
+
+
+def make_etag(*parts, weak: bool = True) -> str:
+    """
+    由数据身份信息生成ETag
+
+    Args:
+        parts: 参与计算的值（快照版本、时间戳、查询参数等）
+        weak: 是否为弱ETag（JSON内容语义相同即可，默认弱校验）
+    """
+    digest = hashlib.blake2b("|".join(str(p) for p in parts).encode("utf-8"), digest_size=12).hexdigest()
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+
+def _strip_weak(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    判断条件请求是否可以返回304
+
+    按RFC 9110：存在If-None-Match时只比较ETag（弱比较），否则才看If-Modified-Since
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        target = _strip_weak(etag)
+        return any(_strip_weak(tag) == target for tag in if_none_match.split(","))
+
+    if last_modified is not None:
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return int(_to_utc(last_modified).timestamp()) <= int(since.timestamp())
+    return False
+
+
+def _to_utc(value: datetime) -> datetime:
+    """本地时间（naive）按系统时区转换为带时区时间"""
+    return value.astimezone() if value.tzinfo is None else value
+
+
+def cache_headers(etag: str, policy: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    """生成缓存相关响应头"""
+    headers = {
+        "ETag": etag,
+        "Cache-Control": CACHE_POLICIES[policy],
+        "Vary": "Accept",
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_to_utc(last_modified).astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def not_modified_response(etag: str, policy: str, last_modified: Optional[datetime] = None) -> Response:
+    """304响应（不带响应体，但保留缓存头，便于客户端刷新缓存有效期）"""
+    return Response(status_code=304, headers=cache_headers(etag, policy, last_modified))
+
+
+def apply_cache_headers(response: Response, etag: str, policy: str,
+                        last_modified: Optional[datetime] = None) -> Response:
+    """为普通200响应加上缓存头"""
+    response.headers.update(cache_headers(etag, policy, last_modified))
+    return response
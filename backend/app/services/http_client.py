@@ -0,0 +1,277 @@
+"""
+上游HTTP客户端 - 基于httpx.AsyncClient
+
+取代原先对 requests.Session 的全局Monkey Patch：
+- 连接池复用，安装了h2时启用HTTP/2
+- 按主机限速：只在极短的临界区内预约发送时间片，睡眠不持有锁，
+  同一主机的请求按间隔错开发出，而不是排队串行
+- 统一的重试/退避策略（429/5xx/网络错误，遵循Retry-After）
+- 随机User-Agent、东方财富Referer等浏览器请求头
+- 不读取代理环境变量（trust_env=False）
+
+异步代码直接 await upstream_http.get_json(...)；
+线程中的同步代码用 upstream_http.run(coro)，协程在专用后台事件循环上执行，
+所有同步调用方共享同一个连接池。
+"""
+import asyncio
+import importlib.util
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Optional
+from urllib.parse import urlparse
+
+from app.config import settings
+from app.services.lazy_import import lazy_import
+
+httpx = lazy_import("httpx")
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2为可选依赖（h2）；只检查是否安装，不在导入时加载
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# ========== User Agent 池 ==========
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Edge/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+]
+
+# 各主机的最小请求间隔（秒），按域名后缀匹配
+DEFAULT_HOST_INTERVALS = {
+    "eastmoney.com": 1.0,
+    "sina.com.cn": 0.8,
+    "baostock.com": 0.0,
+}
+DEFAULT_INTERVAL = 0.5
+
+
+class UpstreamHTTPError(Exception):
+    """上游请求在重试后仍然失败"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """重试/退避策略：第n次重试等待 min(base * 2^n, max) 秒并加随机抖动"""
+    attempts: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    jitter: float = 0.2
+    retry_statuses: FrozenSet[int] = field(default_factory=lambda: frozenset({429, 500, 502, 503, 504}))
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        wait = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        return wait + random.random() * self.jitter
+
+
+DEFAULT_RETRY = RetryPolicy()
+
+
+class HostRateLimiter:
+    """
+    按主机限速（时间片预约）
+
+    每次请求在锁内把该主机的"下一个可用时间"向后推一个间隔并拿走当前时间片，
+    然后在锁外等待到自己的时间片。锁只保护两次浮点运算，
+    因此同时可用于协程（asyncio.sleep）和线程（time.sleep）。
+    """
+
+    def __init__(self, intervals: Optional[Dict[str, float]] = None, default_interval: float = DEFAULT_INTERVAL):
+        self.intervals = dict(DEFAULT_HOST_INTERVALS if intervals is None else intervals)
+        self.default_interval = default_interval
+        self._lock = threading.Lock()
+        self._next_slot: Dict[str, float] = {}
+
+    def _key(self, host: str):
+        for suffix, interval in self.intervals.items():
+            if host == suffix or host.endswith("." + suffix):
+                return suffix, interval
+        return host or "default", self.default_interval
+
+    def reserve(self, host: str) -> float:
+        """预约时间片，返回需要等待的秒数"""
+        key, interval = self._key(host)
+        if interval <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(key, 0.0))
+            self._next_slot[key] = slot + interval
+        return slot - now
+
+    async def acquire(self, host: str) -> None:
+        wait = self.reserve(host)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, host: str) -> None:
+        wait = self.reserve(host)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class UpstreamHTTPClient:
+    """上游HTTP客户端（每个事件循环一个httpx.AsyncClient）"""
+
+    def __init__(
+        self,
+        timeout: float = 15.0,
+        max_connections: int = 64,
+        max_keepalive: int = 32,
+        retry: RetryPolicy = DEFAULT_RETRY,
+        limiter: Optional[HostRateLimiter] = None,
+    ):
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.retry = retry
+        self.limiter = limiter or HostRateLimiter()
+        self._clients: Dict[asyncio.AbstractEventLoop, 'httpx.AsyncClient'] = {}
+        self._clients_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+
+    # ==================== 客户端与请求头 ====================
+
+    def _client(self) -> 'httpx.AsyncClient':
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            with self._clients_lock:
+                # 顺带清理已关闭事件循环遗留的客户端
+                for stale in [event_loop for event_loop in self._clients if event_loop.is_closed()]:
+                    del self._clients[stale]
+                client = httpx.AsyncClient(
+                    http2=HTTP2_AVAILABLE,
+                    timeout=self.timeout,
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_keepalive,
+                    ),
+                    trust_env=False,
+                    follow_redirects=True,
+                )
+                self._clients[loop] = client
+        return client
+
+    @staticmethod
+    def browser_headers(url: str, headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """补全浏览器请求头（调用方传入的同名头优先）"""
+        result = {
+            "User-Agent": random.choice(USER_AGENTS),
+            "Accept": "application/json,text/plain,*/*;q=0.8",
+            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+        }
+        if "eastmoney.com" in url:
+            result["Referer"] = "https://quote.eastmoney.com/"
+        elif "sina.com.cn" in url:
+            result["Referer"] = "https://finance.sina.com.cn/"
+        if headers:
+            result.update(headers)
+        return result
+
+    # ==================== 请求 ====================
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        retry: Optional[RetryPolicy] = None,
+        timeout: Optional[float] = None,
+    ) -> 'httpx.Response':
+        """发送请求：限速 -> 发送 -> 按策略重试"""
+        policy = retry or self.retry
+        host = urlparse(url).hostname or ""
+        client = self._client()
+        last_error: Optional[str] = None
+        status_code = None
+
+        for attempt in range(policy.attempts):
+            await self.limiter.acquire(host)
+            retry_after = None
+            try:
+                resp = await client.request(
+                    method, url,
+                    params=params,
+                    headers=self.browser_headers(url, headers),
+                    timeout=timeout or self.timeout,
+                )
+                if resp.status_code not in policy.retry_statuses:
+                    resp.raise_for_status()
+                    return resp
+                status_code = resp.status_code
+                retry_after = resp.headers.get("Retry-After")
+                last_error = f"HTTP {resp.status_code}"
+            except httpx.HTTPStatusError as e:
+                # 不可重试的状态码（4xx）直接失败
+                raise UpstreamHTTPError(f"{method} {url} 返回 {e.response.status_code}", e.response.status_code) from e
+            except httpx.TransportError as e:
+                last_error = f"{type(e).__name__}: {e}"
+
+            if attempt < policy.attempts - 1:
+                wait = policy.delay(attempt, retry_after)
+                logger.debug(f"{method} {host} 失败（{last_error}），{wait:.2f}s 后重试 ({attempt + 1}/{policy.attempts})")
+                await asyncio.sleep(wait)
+
+        raise UpstreamHTTPError(f"{method} {url} 重试{policy.attempts}次后失败: {last_error}", status_code)
+
+    async def get(self, url: str, **kwargs) -> 'httpx.Response':
+        return await self.request("GET", url, **kwargs)
+
+    async def get_json(self, url: str, **kwargs) -> Any:
+        resp = await self.get(url, **kwargs)
+        try:
+            return resp.json()
+        except ValueError as e:
+            # 被限流时上游常返回HTML页面
+            raise UpstreamHTTPError(f"GET {url} 返回非JSON内容: {resp.text[:80]!r}", resp.status_code) from e
+
+    async def get_text(self, url: str, **kwargs) -> str:
+        return (await self.get(url, **kwargs)).text
+
+    # ==================== 同步调用桥接 ====================
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="upstream-http", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """在线程中同步执行协程（不可在事件循环线程中调用）"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._background_loop())
+        return future.result(timeout)
+
+    def throttle(self, host: str) -> None:
+        """同步代码（如akshare内部的requests调用）发请求前按主机限速"""
+        self.limiter.acquire_sync(host)
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环上的客户端"""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+# 全局实例
+upstream_http = UpstreamHTTPClient(timeout=settings.UPSTREAM_HTTP_TIMEOUT)
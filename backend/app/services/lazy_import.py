@@ -0,0 +1,49 @@
+"""
+按需导入重量级库
+
+akshare（导入时加载数百个接口模块和JS引擎）、pandas 等导入耗时占API启动时间的大头，
+而多数请求（健康检查、历史记录、缓存命中的行情）根本用不到它们。
+
+    ak = lazy_import("akshare")   # 此时不导入
+    ak.stock_zh_a_hist(...)       # 首次访问属性时才真正导入
+
+被替换（monkeypatch）的属性照常生效：每次属性访问都转发到真实模块。
+注意：在函数签名注解中直接写 pd.DataFrame 会在定义时触发导入，注解请写成字符串。
+"""
+import importlib
+import threading
+import types
+
+
+class LazyModule(types.ModuleType):
+    """首次访问属性时导入的模块代理"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+        self.__dict__["_lazy_lock"] = threading.Lock()
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with self.__dict__["_lazy_lock"]:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr: str, value) -> None:
+        setattr(self._load(), attr, value)
+
+    def __repr__(self) -> str:
+        loaded = self.__dict__["_lazy_module"] is not None
+        return f"<lazy module '{self.__name__}' ({'loaded' if loaded else 'not loaded'})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """返回模块代理；模块已导入时代理直接指向它"""
+    return LazyModule(name)
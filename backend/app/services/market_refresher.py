@@ -0,0 +1,79 @@
+"""
+全市场数据后台刷新
+
+全市场行情可由请求按需触发刷新（见 DataFetcher.get_stock_quote），但没有请求时数据不会更新，
+多进程部署时其他worker只读共享快照、也不会触发刷新。因此由后台线程按交易时段（见 trading_calendar）
+刷新交易日历、股票列表和全市场行情：ENABLE_SCHEDULER=true 或多进程部署时启动；
+每个worker都启动该线程，只有持有上游锁的worker实际刷新，上游worker退出后由其他worker接替。
+
+INGEST_EXTERNAL=true 时刷新由独立采集进程（app.ingest）负责；没有共享目录时，
+API进程的该线程改为定期从数据库加载采集进程写入的股票列表和行情（见 DataFetcher.load_snapshot_from_db）。
+"""
+import logging
+import threading
+from typing import Optional
+
+from app.config import settings
+from app.services.shared_state import shared_state
+from app.services.trading_calendar import trading_calendar
+
+logger = logging.getLogger(__name__)
+
+
+class MarketRefresher:
+    """上游worker的全市场数据刷新线程"""
+
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """启动刷新线程（重复调用无效）"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="market-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout=timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        from app.services.data_fetcher import data_fetcher
+
+        follow_db = shared_state.external and not shared_state.enabled
+        while not self._stop.is_set():
+            if follow_db:
+                try:
+                    data_fetcher.load_snapshot_from_db()
+                except Exception as e:
+                    logger.error(f"从数据库加载全市场快照失败: {e}")
+                self._stop.wait(settings.SHARED_SNAPSHOT_POLL_SECONDS)
+                continue
+            if shared_state.is_upstream():
+                try:
+                    self.refresh_once()
+                except Exception as e:
+                    logger.error(f"全市场数据刷新失败: {e}")
+            self._stop.wait(settings.SHARED_UPSTREAM_CLAIM_SECONDS)
+
+    @staticmethod
+    def refresh_once() -> None:
+        """交易日历、股票列表、全市场行情到期时刷新（按交易时段调度，见 trading_calendar）"""
+        from app.services.data_fetcher import data_fetcher
+
+        if settings.ENABLE_SCHEDULER and trading_calendar.needs_refresh():
+            trading_calendar.refresh()
+        if data_fetcher.universe_refresh_due():
+            data_fetcher.get_stock_list()
+        if data_fetcher.spot_refresh_due():
+            data_fetcher._refresh_spot_cache()
+
+
+# 全局实例
+market_refresher = MarketRefresher()
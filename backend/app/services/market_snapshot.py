@@ -0,0 +1,156 @@
+"""
+全市场内存数据快照
+
+股票列表（universe）、全市场行情（quotes）和基本面（PE/PB/总市值）放在同一个不可变的 MarketSnapshot 中：
+
+- 刷新时在旁边构建好新的字典，再通过 MarketData.publish 一次引用赋值发布，正在读取的线程不受影响
+- 读取方先取一次 market.current，之后都从这个快照读，看到的股票列表、行情、基本面属于同一版本，
+  不会读到刷新到一半的行情
+- version 每次发布单调递增（毫秒时间戳），可直接用作缓存键和ETag的一部分
+
+快照中的字典按只读约定使用（映射本身是 MappingProxyType），调用方需要修改时先复制。
+
+多进程部署时（见 shared_state），发布的快照同时写入共享目录，其他worker由后台轮询线程按间隔检查并加载新版本
+（反序列化在轮询线程中完成，读取 current 只取一次引用，事件循环上读取也不会被阻塞）。
+由独立采集进程发布、又没有共享目录时，API进程从数据库构建快照后通过 MarketData.load 采用。
+"""
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_EMPTY: Mapping[str, Dict] = MappingProxyType({})
+
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    """某一时刻的全市场数据（不可变）"""
+    version: int = 0
+    universe: Tuple[Dict, ...] = ()          # 股票列表 [{code, name, industry, market}]
+    universe_at: Optional[float] = None      # 股票列表获取时间
+    quotes: Mapping[str, Dict] = field(default_factory=lambda: _EMPTY)        # 代码 -> 实时行情
+    fundamentals: Mapping[str, Dict] = field(default_factory=lambda: _EMPTY)  # 代码 -> {pe, pb, market_cap(元)}
+    quotes_at: Optional[float] = None        # 全市场行情获取时间
+    _names: Mapping[str, str] = field(default_factory=lambda: _EMPTY, repr=False, compare=False)
+
+    def quote(self, code: str) -> Optional[Dict]:
+        return self.quotes.get(code)
+
+    def fundamental(self, code: str) -> Optional[Dict]:
+        return self.fundamentals.get(code)
+
+    def name(self, code: str) -> Optional[str]:
+        return self._names.get(code)
+
+    def __reduce__(self):
+        # MappingProxyType 不能序列化，按普通字典保存（名称索引加载时重建）
+        return _restore, (self.version, self.universe, self.universe_at,
+                          dict(self.quotes), dict(self.fundamentals), self.quotes_at)
+
+    def universe_fresh(self, ttl: float, now: Optional[float] = None) -> bool:
+        return bool(self.universe) and (now or time.time()) - self.universe_at < ttl
+
+
+def _restore(version, universe, universe_at, quotes, fundamentals, quotes_at) -> MarketSnapshot:
+    return MarketSnapshot(
+        version=version, universe=universe, universe_at=universe_at,
+        quotes=MappingProxyType(quotes), fundamentals=MappingProxyType(fundamentals), quotes_at=quotes_at,
+        _names=MappingProxyType({stock['code']: stock['name'] for stock in universe}),
+    )
+
+
+def _number(value) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(number) else number
+
+
+def fundamentals_from_spot(rows: Iterable[Tuple]) -> Dict[str, Dict]:
+    """(代码, 市盈率-动态, 市净率, 总市值) -> {代码: {pe, pb, market_cap}}"""
+    return {
+        code: {'pe': _number(pe), 'pb': _number(pb), 'market_cap': _number(market_cap)}
+        for code, pe, pb, market_cap in rows
+    }
+
+
+SNAPSHOT_FILE = "market_snapshot.pickle"
+
+
+class MarketData:
+    """持有当前快照；发布新快照只做一次引用替换，读取无锁"""
+
+    def __init__(self, shared=None, poll_seconds: float = 1.0):
+        self._current = MarketSnapshot()
+        self._lock = threading.Lock()  # 只串行化发布，避免并发刷新互相覆盖对方的字段
+        self._shared = shared if shared is not None and shared.enabled else None
+        self._poll_seconds = poll_seconds
+        self._poller_lock = threading.Lock()
+        self._poller_pid: Optional[int] = None  # 轮询线程所属进程（fork出的worker需要重新启动）
+
+    @property
+    def current(self) -> MarketSnapshot:
+        if self._shared is not None and self._poller_pid != os.getpid():
+            self._start_poller()
+        return self._current
+
+    def _start_poller(self) -> None:
+        """首次读取时同步一次共享快照，并启动本进程的轮询线程"""
+        with self._poller_lock:
+            if self._poller_pid == os.getpid():
+                return
+            self._sync()
+            self._poller_pid = os.getpid()
+            threading.Thread(target=self._poll, name="snapshot-poller", daemon=True).start()
+
+    def _poll(self) -> None:
+        while True:
+            time.sleep(self._poll_seconds)
+            try:
+                self._sync()
+            except Exception as e:
+                logger.warning(f"加载共享快照失败: {e}")
+
+    def _sync(self) -> None:
+        """加载其他进程发布的更新版本"""
+        self.load(self._shared.read_object(SNAPSHOT_FILE))
+
+    def load(self, snapshot: Optional[MarketSnapshot]) -> bool:
+        """采用其他进程发布的快照（比当前版本新时）"""
+        if snapshot is None or snapshot.version <= self._current.version:
+            return False
+        with self._lock:
+            if snapshot.version <= self._current.version:
+                return False
+            self._current = snapshot
+        return True
+
+    def publish(self, **changes) -> MarketSnapshot:
+        """基于当前快照替换部分字段，生成新版本并发布"""
+        with self._lock:
+            base = self._current
+            version = max(int(time.time() * 1000), base.version + 1)
+            snapshot = replace(base, version=version, **changes)
+            self._current = snapshot
+            if self._shared is not None:
+                self._shared.write_object(SNAPSHOT_FILE, snapshot)
+        return snapshot
+
+    def publish_universe(self, stocks: Iterable[Dict]) -> MarketSnapshot:
+        universe = tuple(stocks)
+        names = MappingProxyType({stock['code']: stock['name'] for stock in universe})
+        return self.publish(universe=universe, universe_at=time.time(), _names=names)
+
+    def publish_quotes(self, quotes: Dict[str, Dict], fundamentals: Dict[str, Dict]) -> MarketSnapshot:
+        return self.publish(quotes=MappingProxyType(quotes), fundamentals=MappingProxyType(fundamentals),
+                            quotes_at=time.time())
+
+    def clear_universe(self) -> MarketSnapshot:
+        return self.publish(universe=(), universe_at=None, _names=_EMPTY)
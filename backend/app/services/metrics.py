@@ -0,0 +1,219 @@
+"""
+Prometheus指标
+
+- http_request_duration_seconds          按路由模板的请求延迟直方图
+- upstream_call_duration_seconds         上游调用延迟（按数据源、函数）
+- upstream_call_errors_total             上游调用失败次数（按数据源、函数、原因）
+- cache_requests_total                   缓存命中/未命中（按命名空间），命中率 = hit / (hit + miss)
+- db_write_duration_seconds              数据库写入耗时（按操作）
+- lock_wait_seconds                      锁等待时间（按锁名，如 bs_lock）
+- screening_stocks_processed_total       筛选已处理股票数（rate() 即吞吐 stocks/sec）
+- screening_task_duration_seconds        单个筛选任务耗时
+- screening_stage_duration_seconds       漏斗筛选各层耗时（按层）
+- screening_stage_stocks                 最近一次筛选各层的输出股票数（按层）
+- screening_last_throughput_stocks_per_second  最近一个完成任务的平均吞吐
+- screening_tasks                        按状态的任务数（pending + processing 即队列深度）
+- cache_entries                          各缓存的条目数
+- db_writer_queue_depth                  数据库写入队列中等待的任务数
+
+采集时才计算的指标（任务数、缓存条目数）在 render() 中刷新。
+
+多进程部署（设置了 SHARED_STATE_DIR）时使用 prometheus_client 的多进程模式：各进程（包括 app.ingest）
+把指标写入 SHARED_STATE_DIR/prometheus 下的文件，任一worker响应 /metrics 时由 MultiProcessCollector 汇总全部进程；
+Gauge 按 multiprocess_mode 合并，进程内的缓存条目数、写入队列深度由各worker处理请求时定期刷新（refresh_local_gauges）。
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Tuple
+
+from app.config import settings
+
+# 须在导入 prometheus_client 之前设置（导入时决定指标值写入内存还是共享文件）
+if settings.SHARED_STATE_DIR and not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = os.path.join(settings.SHARED_STATE_DIR, "prometheus")
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or None
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+logger = logging.getLogger(__name__)
+
+LOCAL_GAUGE_INTERVAL = 5.0  # 进程内Gauge的刷新间隔（秒）
+
+# 延迟桶：覆盖内存命中（毫秒级）到全市场抓取（分钟级）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP请求延迟",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_call_duration_seconds", "上游数据源调用延迟",
+    ["source", "function"], buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_call_errors_total", "上游数据源调用失败次数",
+    ["source", "function", "reason"],
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "缓存查询次数",
+    ["namespace", "result"],
+)
+DB_WRITE_DURATION = Histogram(
+    "db_write_duration_seconds", "数据库写入耗时",
+    ["operation"], buckets=LATENCY_BUCKETS,
+)
+LOCK_WAIT = Histogram(
+    "lock_wait_seconds", "锁等待时间",
+    ["lock"], buckets=(0.0, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0),
+)
+SCREENING_STOCKS = Counter(
+    "screening_stocks_processed_total", "筛选任务已处理的股票数",
+)
+SCREENING_TASK_DURATION = Histogram(
+    "screening_task_duration_seconds", "筛选任务耗时",
+    buckets=(10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200),
+)
+SCREENING_STAGE_DURATION = Histogram(
+    "screening_stage_duration_seconds", "漏斗筛选各层耗时",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+# multiprocess_mode 只在多进程模式下生效
+SCREENING_STAGE_STOCKS = Gauge(
+    "screening_stage_stocks", "最近一次筛选各层的输出股票数",
+    ["stage"], multiprocess_mode="mostrecent",
+)
+SCREENING_THROUGHPUT = Gauge(
+    "screening_last_throughput_stocks_per_second", "最近完成的筛选任务平均吞吐",
+    multiprocess_mode="mostrecent",
+)
+SCREENING_TASKS = Gauge(
+    "screening_tasks", "按状态的筛选任务数",
+    ["status"], multiprocess_mode="livemostrecent",  # 任务在共享存储中，由响应采集的worker统计全部任务
+)
+CACHE_ENTRIES = Gauge(
+    "cache_entries", "缓存条目数",
+    ["cache"], multiprocess_mode="liveall",  # 各worker的缓存独立，按pid标签分别输出
+)
+DB_WRITER_QUEUE = Gauge(
+    "db_writer_queue_depth", "数据库写入队列中等待的任务数",
+    multiprocess_mode="livesum",
+)
+
+
+def cache_namespace(key: str) -> str:
+    """缓存键 -> 命名空间（quote_600519 -> quote，stock_list 保持原样）"""
+    if key == "stock_list":
+        return key
+    return key.split("_", 1)[0]
+
+
+def record_cache(namespace: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(namespace, "hit" if hit else "miss").inc()
+
+
+def record_upstream(source: str, function: str, latency: float, error: str = None) -> None:
+    UPSTREAM_LATENCY.labels(source, function).observe(latency)
+    if error:
+        UPSTREAM_ERRORS.labels(source, function, error).inc()
+
+
+@contextmanager
+def db_write(operation: str):
+    """记录一次数据库写入的耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        DB_WRITE_DURATION.labels(operation).observe(time.perf_counter() - start)
+
+
+_local_refreshed = 0.0
+
+
+def refresh_local_gauges(force: bool = False) -> None:
+    """刷新本进程的缓存条目数和写入队列深度（距上次刷新不足 LOCAL_GAUGE_INTERVAL 秒时跳过）"""
+    global _local_refreshed
+    now = time.monotonic()
+    if not force and now - _local_refreshed < LOCAL_GAUGE_INTERVAL:
+        return
+    _local_refreshed = now
+
+    from app.services.data_fetcher import data_fetcher
+    from app.services.db_writer import db_writer
+
+    CACHE_ENTRIES.labels("simple_cache").set(len(data_fetcher.cache.cache))
+    CACHE_ENTRIES.labels("spot").set(len(data_fetcher.stock_spot_cache))
+    DB_WRITER_QUEUE.set(db_writer.depth())
+
+
+def _refresh_gauges() -> None:
+    from app.services.task_manager import task_manager, TaskStatus
+
+    counts = {status.value: 0 for status in TaskStatus}
+    for task in list(task_manager.tasks.values()):
+        counts[task.status.value] += 1
+    for status, count in counts.items():
+        SCREENING_TASKS.labels(status).set(count)
+
+    refresh_local_gauges(force=True)
+
+
+def render() -> Tuple[bytes, str]:
+    """生成 /metrics 响应体和Content-Type（多进程模式下汇总全部进程）"""
+    _refresh_gauges()
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+# ==================== 多进程模式 ====================
+
+def _file_pid(name: str) -> int:
+    """counter_123.db / gauge_livesum_123.db -> 123"""
+    return int(name[:-len(".db")].rsplit("_", 1)[1])
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def setup_multiprocess() -> None:
+    """
+    worker启动时调用：没有其他存活进程的指标文件时清空目录（新一轮部署，上次运行的计数不再累加）
+
+    多个worker同时启动时在共享目录锁内串行执行。
+    """
+    if not MULTIPROC_DIR:
+        return
+    from app.services.shared_state import shared_state
+
+    with shared_state.exclusive("prometheus"):
+        files = [name for name in os.listdir(MULTIPROC_DIR) if name.endswith(".db")]
+        pids = {_file_pid(name) for name in files} - {os.getpid()}
+        if any(_alive(pid) for pid in pids):
+            return
+        for name in files:
+            if _file_pid(name) != os.getpid():
+                os.remove(os.path.join(MULTIPROC_DIR, name))
+        if files:
+            logger.info(f"清理上次运行的指标文件: {MULTIPROC_DIR}")
+
+
+def mark_process_dead() -> None:
+    """worker退出时调用：移除本进程的 live* Gauge"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid(), MULTIPROC_DIR)
@@ -5,11 +5,17 @@ PE/PB计算服务 - 基于baostock数据计算
 - PE = 股价 / epsTTM（每股收益TTM）
 - PB暂时返回None（需要每股净资产数据）
 """
-import baostock as bs
 import logging
+import time
 from typing import Dict, Optional
 from datetime import datetime, timedelta
 
+from app.config import settings
+from app.services.lazy_import import lazy_import
+from app.services.tracing import set_attributes, traced
+
+bs = lazy_import("baostock")
+
 logger = logging.getLogger(__name__)
 
 
@@ -18,10 +24,22 @@ class PEpbCalculator:
 
     def __init__(self):
         self.bs_logged_in = False
+        # 首次计算时才登录（导入模块时不联网），失败后间隔一段时间再重试
+        self._login_attempt_at: Optional[float] = None
+
+    def ensure_login(self) -> bool:
+        """未登录时登录baostock"""
+        if self.bs_logged_in:
+            return True
+        if (self._login_attempt_at is not None
+                and time.time() - self._login_attempt_at < settings.BAOSTOCK_LOGIN_RETRY_SECONDS):
+            return False
         self._login()
+        return self.bs_logged_in
 
     def _login(self):
         """登录baostock"""
+        self._login_attempt_at = time.time()
         try:
             lg = bs.login()
             if lg.error_code == '0':
@@ -40,6 +58,7 @@ class PEpbCalculator:
             except:
                 pass
 
+    @traced("pe.get_stock_pe")
     def get_stock_pe(self, code: str, price: float) -> Optional[float]:
         """
         计算股票PE（市盈率）
@@ -53,7 +72,8 @@ class PEpbCalculator:
         Returns:
             PE值，失败返回None
         """
-        if not self.bs_logged_in:
+        set_attributes(**{"stock.code": code})
+        if not self.ensure_login():
             logger.warning("baostock未登录，无法计算PE")
             return None
 
@@ -3,12 +3,15 @@ PE/PB数据更新服务
 
 定时任务：每天收盘后批量更新所有股票的PE/PB数据到数据库
 """
-import akshare as ak
 import pandas as pd
+from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
 from app.database import SessionLocal
 from app.models import StockQuote
-from app.services.data_fetcher import disable_proxy
+from app.services.data_fetcher import DataFetcher
+from app.services.db_writer import db_writer
+from app.services.spot_sources import fetch_spot_em_sync
+from app.services.metrics import db_write
 from datetime import datetime
 import logging
 
@@ -19,18 +22,25 @@ class PEPBUpdater:
     """PE/PB数据更新器"""
 
     def __init__(self):
-        self.db = SessionLocal()
+        self._db: Optional[Session] = None
+
+    @property
+    def db(self) -> Session:
+        """首次使用时才打开数据库会话（导入模块时不连接数据库）"""
+        if self._db is None:
+            self._db = SessionLocal()
+        return self._db
 
     def __del__(self):
         """关闭数据库连接"""
-        if self.db:
-            self.db.close()
+        if self._db is not None:
+            self._db.close()
 
     def update_all_pe_pb(self) -> dict:
         """
         批量更新所有股票的PE/PB数据
 
-        使用akshare的stock_zh_a_spot_em接口一次性获取所有股票数据
+        直连东方财富全市场行情接口一次性获取所有股票数据
 
         Returns:
             更新统计: {success: 成功数量, failed: 失败数量, total: 总数}
@@ -38,20 +48,19 @@ class PEPBUpdater:
         try:
             logger.info("开始批量更新PE/PB数据...")
 
-            with disable_proxy():
-                # 获取所有股票的实时行情（包含PE/PB）
-                df = ak.stock_zh_a_spot_em()
+            # 获取所有股票的实时行情（包含PE/PB）
+            df = fetch_spot_em_sync()
 
             if df.empty:
                 logger.warning("获取PE/PB数据失败：返回数据为空")
                 return {"success": 0, "failed": 0, "total": 0}
 
             # 统计信息
-            success_count = 0
             failed_count = 0
             total = len(df)
+            now = datetime.now()
 
-            # 遍历所有股票
+            rows = []
             for _, row in df.iterrows():
                 try:
                     code = row['代码']
@@ -75,43 +84,15 @@ class PEPBUpdater:
                     except (ValueError, TypeError):
                         price_val = None
 
-                    # 查找数据库中的最新记录
-                    existing_quote = self.db.query(StockQuote).filter(
-                        StockQuote.stock_code == code
-                    ).order_by(StockQuote.timestamp.desc()).first()
-
-                    if existing_quote:
-                        # 更新现有记录
-                        existing_quote.pe = pe_val
-                        existing_quote.pb = pb_val
-                        if price_val is not None:
-                            existing_quote.price = price_val
-                        existing_quote.timestamp = datetime.now()
-                    else:
-                        # 创建新记录
-                        new_quote = StockQuote(
-                            stock_code=code,
-                            price=price_val or 0.0,
-                            pe=pe_val,
-                            pb=pb_val,
-                            timestamp=datetime.now()
-                        )
-                        self.db.add(new_quote)
-
-                    success_count += 1
-
-                    # 每100条提交一次
-                    if success_count % 100 == 0:
-                        self.db.commit()
-                        logger.info(f"已更新 {success_count}/{total} 只股票")
+                    rows.append({'stock_code': code, 'price': price_val, 'pe': pe_val, 'pb': pb_val, 'timestamp': now})
 
                 except Exception as e:
-                    logger.warning(f"更新股票 {row.get('代码', 'unknown')} PE/PB失败: {e}")
+                    logger.warning(f"解析股票 {row.get('代码', 'unknown')} PE/PB失败: {e}")
                     failed_count += 1
                     continue
 
-            # 最终提交
-            self.db.commit()
+            # 在写入队列中执行，与行情入库等后台写入串行；整批按 stock_code upsert，没有价格时保留已有价格
+            success_count = db_writer.run(self._save, rows)
 
             logger.info(f"✅ PE/PB数据更新完成: 成功 {success_count}, 失败 {failed_count}, 总计 {total}")
 
@@ -123,7 +104,6 @@ class PEPBUpdater:
 
         except Exception as e:
             logger.error(f"批量更新PE/PB数据失败: {e}")
-            self.db.rollback()
             return {
                 "success": 0,
                 "failed": 0,
@@ -131,6 +111,20 @@ class PEPBUpdater:
                 "error": str(e)
             }
 
+    @staticmethod
+    def _save(rows: List[Dict]) -> int:
+        db = SessionLocal()
+        try:
+            with db_write("update_pe_pb"):
+                count = DataFetcher._upsert_quotes(db, rows, keep_existing=('price',))
+                db.commit()
+            return count
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
     def get_stock_pe_pb(self, code: str) -> dict:
         """
         从数据库获取股票的PE/PB数据
@@ -0,0 +1,279 @@
+"""
+内存映射价格面板
+
+把本地日线存储转换为 dates × symbols 的 float32 矩阵，每个字段一个 .npy 文件，
+另存一份 index.json 记录日期和股票代码。
+
+- 构建：在临时目录写好后整体替换，读者不会看到写了一半的面板
+- 读取：np.load(mmap_mode='r') 只读映射，截面/时间序列切片均为零拷贝视图
+- 多进程：API worker 与分析任务共享同一份页缓存
+
+目录结构:
+    data/price_panel/
+    ├── index.json      # {version, built_at, fields, dates, codes}
+    ├── close.npy
+    ├── open.npy
+    └── ...
+"""
+import bisect
+import json
+import os
+import shutil
+import threading
+import time
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+import logging
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 面板字段
+PANEL_FIELDS = ("close", "open", "high", "low", "volume", "amount")
+
+INDEX_FILE = "index.json"
+
+
+def _current_version(panel_dir: str) -> int:
+    """已有面板的版本号（没有面板时为0）"""
+    try:
+        with open(os.path.join(panel_dir, INDEX_FILE), encoding="utf-8") as f:
+            return int(json.load(f)['version'])
+    except (FileNotFoundError, ValueError, KeyError):
+        return 0
+
+
+def build_panel(bars, out_dir: Optional[str] = None, fields: Sequence[str] = PANEL_FIELDS) -> Dict:
+    """
+    由日线长表构建价格面板
+
+    Args:
+        bars: DataFrame（stock_code, trade_date, 各字段），如 BarStore.load_all() 的输出
+        out_dir: 面板目录，默认 settings.PRICE_PANEL_DIR
+        fields: 需要写入的字段
+
+    Returns:
+        面板索引信息 {version, built_at, fields, dates, codes}，version 单调递增
+    """
+    out_dir = out_dir or settings.PRICE_PANEL_DIR
+    parent = os.path.dirname(os.path.abspath(out_dir))
+    os.makedirs(parent, exist_ok=True)
+
+    dates = sorted(bars['trade_date'].unique().tolist()) if not bars.empty else []
+    codes = sorted(bars['stock_code'].unique().tolist()) if not bars.empty else []
+    date_pos = {d: i for i, d in enumerate(dates)}
+    code_pos = {c: j for j, c in enumerate(codes)}
+
+    rows = bars['trade_date'].map(date_pos).to_numpy(dtype=np.int64) if dates else None
+    cols = bars['stock_code'].map(code_pos).to_numpy(dtype=np.int64) if codes else None
+
+    # 先写入临时目录，完成后整体替换
+    tmp_dir = f"{out_dir}.tmp-{os.getpid()}-{int(time.time() * 1000)}"
+    os.makedirs(tmp_dir)
+    try:
+        for field in fields:
+            arr = np.lib.format.open_memmap(
+                os.path.join(tmp_dir, f"{field}.npy"),
+                mode='w+', dtype=np.float32, shape=(len(dates), len(codes))
+            )
+            arr[:] = np.nan
+            if rows is not None and len(rows):
+                arr[rows, cols] = bars[field].to_numpy(dtype=np.float32)
+            arr.flush()
+            del arr
+
+        index = {
+            "version": max(int(time.time() * 1000), _current_version(out_dir) + 1),
+            "built_at": datetime.now().isoformat(),
+            "fields": list(fields),
+            "dates": dates,
+            "codes": codes,
+        }
+        with open(os.path.join(tmp_dir, INDEX_FILE), "w", encoding="utf-8") as f:
+            json.dump(index, f)
+
+        # 旧目录先改名再删除，保证 out_dir 在任意时刻要么是旧面板要么是新面板
+        old_dir = None
+        if os.path.exists(out_dir):
+            old_dir = f"{out_dir}.old-{index['version']}"
+            os.rename(out_dir, old_dir)
+        os.rename(tmp_dir, out_dir)
+        if old_dir:
+            # 已映射旧文件的读者仍可继续访问（POSIX下删除不影响已打开的映射）
+            shutil.rmtree(old_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    logger.info(f"✅ 价格面板已构建: {len(dates)} 个交易日 × {len(codes)} 只股票, 目录 {out_dir}")
+    return index
+
+
+def rebuild_from_store(start_date: Optional[str] = None, out_dir: Optional[str] = None) -> Dict:
+    """从本地日线存储重建价格面板"""
+    from app.services.bar_store import bar_store
+    return build_panel(bar_store.load_all(start_date=start_date), out_dir=out_dir)
+
+
+class PricePanel:
+    """
+    只读价格面板
+
+    所有切片方法返回的都是内存映射上的视图（不拷贝、不解析），
+    需要修改时请调用方自行 np.array(view)。
+    """
+
+    def __init__(self, panel_dir: Optional[str] = None):
+        self.panel_dir = panel_dir or settings.PRICE_PANEL_DIR
+        self._lock = threading.Lock()
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._index: Optional[Dict] = None
+        self._index_stat: Optional[tuple] = None  # 最近检查时 index.json 的 (inode, 大小, mtime_ns)
+        self._date_pos: Dict[str, int] = {}
+        self._code_pos: Dict[str, int] = {}
+
+    # ==================== 加载 ====================
+
+    def _index_path(self) -> str:
+        return os.path.join(self.panel_dir, INDEX_FILE)
+
+    def _ensure_loaded(self):
+        """
+        首次访问或面板被重建后（index.json 中的 version 变化）重新映射
+
+        index.json 的文件状态只用于判断是否需要重新读取索引（每次重建都是新文件），
+        是否重新映射以 version 为准：mtime 精度有限，同一时间片内的两次重建仅凭 mtime 无法区分。
+        """
+        try:
+            st = os.stat(self._index_path())
+        except FileNotFoundError:
+            raise FileNotFoundError(f"价格面板不存在: {self.panel_dir}，请先构建")
+        stat_key = (st.st_ino, st.st_size, st.st_mtime_ns)
+
+        if self._index is not None and stat_key == self._index_stat:
+            return
+
+        with self._lock:
+            if self._index is not None and stat_key == self._index_stat:
+                return
+            with open(self._index_path(), encoding="utf-8") as f:
+                index = json.load(f)
+            if self._index is not None and index['version'] == self._index['version']:
+                self._index_stat = stat_key
+                return
+            # 换成新字典后整体赋值，读者要么看到旧映射要么看到新映射
+            self._arrays = {}
+            self._date_pos = {d: i for i, d in enumerate(index['dates'])}
+            self._code_pos = {c: j for j, c in enumerate(index['codes'])}
+            self._index = index
+            self._index_stat = stat_key
+            logger.info(f"价格面板已映射: version={index['version']}, "
+                        f"{len(index['dates'])} × {len(index['codes'])}")
+
+    def field(self, name: str) -> np.ndarray:
+        """整个字段矩阵（dates × codes，只读内存映射）"""
+        self._ensure_loaded()
+        arr = self._arrays.get(name)
+        if arr is None:
+            if name not in self._index['fields']:
+                raise KeyError(f"面板字段不存在: {name}")
+            arr = np.load(os.path.join(self.panel_dir, f"{name}.npy"), mmap_mode='r')
+            self._arrays[name] = arr
+        return arr
+
+    # ==================== 元数据 ====================
+
+    @property
+    def version(self) -> int:
+        self._ensure_loaded()
+        return self._index['version']
+
+    @property
+    def dates(self) -> List[str]:
+        self._ensure_loaded()
+        return self._index['dates']
+
+    @property
+    def codes(self) -> List[str]:
+        self._ensure_loaded()
+        return self._index['codes']
+
+    def date_index(self, date: str) -> int:
+        self._ensure_loaded()
+        return self._date_pos[date]
+
+    def code_index(self, code: str) -> int:
+        self._ensure_loaded()
+        return self._code_pos[code]
+
+    def has_code(self, code: str) -> bool:
+        self._ensure_loaded()
+        return code in self._code_pos
+
+    def dates_between(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[str]:
+        """区间内的交易日列表（与 window() 的行一一对应）"""
+        return self.dates[self._date_slice(start_date, end_date)]
+
+    def _date_slice(self, start_date: Optional[str], end_date: Optional[str]) -> slice:
+        """日期区间 -> 行切片（含两端，日期为YYYY-MM-DD字符串，可直接二分）"""
+        dates = self.dates
+        lo = bisect.bisect_left(dates, start_date) if start_date else 0
+        hi = bisect.bisect_right(dates, end_date) if end_date else len(dates)
+        return slice(lo, hi)
+
+    # ==================== 切片 ====================
+
+    def cross_section(self, field: str, date: str) -> np.ndarray:
+        """某一交易日全市场截面（长度为股票数的视图）"""
+        return self.field(field)[self.date_index(date)]
+
+    def series(self, field: str, code: str, start_date: Optional[str] = None,
+               end_date: Optional[str] = None) -> np.ndarray:
+        """单只股票时间序列（跨步视图）"""
+        return self.field(field)[self._date_slice(start_date, end_date), self.code_index(code)]
+
+    def window(self, field: str, start_date: Optional[str] = None,
+               end_date: Optional[str] = None) -> np.ndarray:
+        """日期区间内的全市场矩阵（行切片视图）"""
+        return self.field(field)[self._date_slice(start_date, end_date)]
+
+    def last(self, field: str, days: int) -> np.ndarray:
+        """最近N个交易日的全市场矩阵（N须为正数，[-0:] 会返回整个矩阵）"""
+        if days <= 0:
+            raise ValueError(f"days 必须为正数: {days}")
+        return self.field(field)[-days:]
+
+    def info(self) -> Dict:
+        """面板概要信息"""
+        self._ensure_loaded()
+        dates = self._index['dates']
+        return {
+            "version": self._index['version'],
+            "built_at": self._index['built_at'],
+            "fields": self._index['fields'],
+            "dates": len(dates),
+            "codes": len(self._index['codes']),
+            "start_date": dates[0] if dates else None,
+            "end_date": dates[-1] if dates else None,
+        }
+
+
+# 创建全局实例（惰性映射，首次访问时才打开文件）
+price_panel = PricePanel()
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python -m app.services.price_panel [sync] [start_date]
+    from app.database import init_db
+    init_db()
+    args = sys.argv[1:]
+    if args and args[0] == "sync":
+        from app.services.bar_store import bar_store
+        print(f"同步日线: {bar_store.sync_all()}")
+        args = args[1:]
+    info = rebuild_from_store(start_date=args[0] if args else None)
+    print(f"面板构建完成: {len(info['dates'])} × {len(info['codes'])}")
@@ -0,0 +1,225 @@
+"""
+运行时诊断 - 采样CPU剖析与tracemalloc内存对比
+
+生产环境的变慢难以在本地复现，这里直接对运行中的API进程（筛选任务也在同一进程的后台任务中）取样：
+
+- StackSampler: 后台线程按固定间隔读取所有线程的调用栈（sys._current_frames），
+  输出折叠栈格式（"线程;帧1;帧2 次数"），可直接交给 flamegraph.pl / speedscope / inferno。
+  只读栈、不挂钩子，对被测进程的开销与采样频率成正比，不像cProfile那样拖慢每次函数调用
+- MemoryTracker: 保存tracemalloc基线快照，之后与新快照对比，按代码位置列出内存增长，
+  并附带 SimpleCache、全市场行情缓存、TaskManager.tasks 的条目数与近似大小
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from collections.abc import Mapping
+from typing import Dict, List, Optional
+
+# 栈帧标签中的文件路径相对这些目录显示
+_PATH_ROOTS = sorted({os.path.abspath(p) for p in sys.path if p and os.path.isdir(p)}, key=len, reverse=True)
+
+# 不关心的内存分配来源
+_MEMORY_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class ProfilerBusy(Exception):
+    """同一时间只允许一个剖析/快照任务"""
+
+
+def _short_path(filename: str, cache: Dict[str, str]) -> str:
+    short = cache.get(filename)
+    if short is None:
+        short = filename
+        for root in _PATH_ROOTS:
+            if filename.startswith(root + os.sep):
+                short = filename[len(root) + 1:]
+                break
+        cache[filename] = short
+    return short
+
+
+class StackSampler:
+    """采样CPU剖析器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def profile(self, seconds: float, interval: float = 0.005,
+                thread_prefix: Optional[str] = None) -> Counter:
+        """
+        在调用线程中采样seconds秒（阻塞），返回 {折叠栈: 采样次数}
+
+        Args:
+            seconds: 采样时长
+            interval: 采样间隔（秒）
+            thread_prefix: 只采样名称以此开头的线程（如 "upstream"、"MainThread"）
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("已有剖析任务在运行")
+        try:
+            return self._sample(seconds, interval, thread_prefix)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float, interval: float, thread_prefix: Optional[str]) -> Counter:
+        me = threading.get_ident()
+        paths: Dict[str, str] = {}
+        labels: Dict[object, str] = {}
+        stacks: Counter = Counter()
+        deadline = time.perf_counter() + seconds
+
+        while time.perf_counter() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                thread_name = names.get(ident, f"thread-{ident}")
+                if thread_prefix and not thread_name.startswith(thread_prefix):
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        # 按函数（而不是行号）聚合，火焰图更紧凑；';'是折叠格式的分隔符
+                        label = f"{code.co_name} ({_short_path(code.co_filename, paths)}:{code.co_firstlineno})"
+                        label = label.replace(";", ":")
+                        labels[code] = label
+                    parts.append(label)
+                    frame = frame.f_back
+                parts.append(thread_name.replace(";", ":"))
+                stacks[";".join(reversed(parts))] += 1
+            time.sleep(interval)
+        return stacks
+
+    @staticmethod
+    def folded(stacks: Counter) -> str:
+        """折叠栈文本（flamegraph.pl 输入格式）"""
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def _deep_size(obj, seen: set) -> int:
+    """容器的近似深度大小（字节），只展开映射/list/tuple/set和带__dict__的对象"""
+    size = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, Mapping):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__") and not isinstance(item, type):
+            stack.append(item.__dict__)
+    return size
+
+
+def container_stats() -> Dict[str, Dict]:
+    """进程内主要缓存/任务容器的条目数和近似大小"""
+    from app.services.data_fetcher import data_fetcher
+    from app.services.task_manager import task_manager
+
+    tasks = task_manager.tasks
+    containers = {
+        "simple_cache": data_fetcher.cache.cache,
+        "snapshot.universe": data_fetcher.snapshot.universe,
+        "snapshot.quotes": data_fetcher.snapshot.quotes,
+        "snapshot.fundamentals": data_fetcher.snapshot.fundamentals,
+        "task_manager.tasks": tasks,
+    }
+    stats = {}
+    for name, container in containers.items():
+        stats[name] = {
+            "entries": len(container),
+            "approx_bytes": _deep_size(container, set()),
+        }
+    stats["task_manager.tasks"]["results"] = sum(t.result_count for t in tasks.values())
+    return stats
+
+
+class MemoryTracker:
+    """tracemalloc 基线快照与对比"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.baseline_time: Optional[float] = None
+
+    def _take(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(_MEMORY_FILTERS)
+
+    def status(self) -> Dict:
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+            "baseline_age_seconds": round(time.time() - self.baseline_time, 1) if self.baseline_time else None,
+        }
+
+    def snapshot(self, frames: int = 10) -> Dict:
+        """开始追踪（如未开始）并保存基线；之后分配的内存才会出现在对比中"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self.baseline = self._take()
+            self.baseline_time = time.time()
+        return {**self.status(), "containers": container_stats()}
+
+    def diff(self, limit: int = 25, group_by: str = "lineno", rebase: bool = False) -> Dict:
+        """
+        与基线对比，按增长量降序列出前limit个位置
+
+        Args:
+            group_by: lineno（按行）/ filename（按文件）/ traceback（按完整调用栈）
+            rebase: 对比后把新快照作为基线（连续观察增量）
+        """
+        with self._lock:
+            if self.baseline is None or not tracemalloc.is_tracing():
+                raise ValueError("尚未保存基线快照")
+            current = self._take()
+            stats = current.compare_to(self.baseline, group_by)
+            if rebase:
+                self.baseline = current
+                self.baseline_time = time.time()
+
+        top: List[Dict] = []
+        for stat in stats[:limit]:
+            top.append({
+                "location": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                "size_diff": stat.size_diff,
+                "size": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+            })
+        return {
+            **self.status(),
+            "total_size_diff": sum(stat.size_diff for stat in stats),
+            "top": top,
+            "containers": container_stats(),
+        }
+
+    def stop(self) -> None:
+        with self._lock:
+            self.baseline = None
+            self.baseline_time = None
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+
+# 全局实例
+stack_sampler = StackSampler()
+memory_tracker = MemoryTracker()
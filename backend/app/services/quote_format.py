@@ -0,0 +1,90 @@
+"""
+行情数值的展示格式
+
+数据库和服务层统一使用基本单位的数值（成交量：股，成交额/市值：元），可以直接在SQL中过滤、排序、聚合；
+"1.23亿手" 这类文本只在接口返回时生成：
+
+- 响应模型字段使用 VolumeText / TurnoverText / MarketCapText，校验时把数值格式化为文本
+- 绕过响应模型的紧凑格式用 format_quote_fields() 格式化
+"""
+import math
+from typing import Annotated, Any, Dict, Optional
+
+from pydantic import BeforeValidator
+
+UNKNOWN = "未知"
+
+
+def _number(value: Any) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(number) else number
+
+
+def format_volume(shares: Any) -> str:
+    """成交量（股）-> 按手显示，如 "1.23万手" """
+    shares = _number(shares)
+    if shares is None:
+        return UNKNOWN
+    lots = shares / 100
+    if lots >= 100000000:
+        return f"{lots / 100000000:.2f}亿手"
+    elif lots >= 10000:
+        return f"{lots / 10000:.2f}万手"
+    else:
+        return f"{lots:.0f}手"
+
+
+def format_turnover(amount: Any) -> str:
+    """成交额（元）-> 如 "45.60亿" """
+    amount = _number(amount)
+    if amount is None:
+        return UNKNOWN
+    if amount >= 100000000:
+        return f"{amount / 100000000:.2f}亿"
+    elif amount >= 10000:
+        return f"{amount / 10000:.2f}万"
+    else:
+        return f"{amount:.2f}"
+
+
+def format_market_cap(market_cap: Any) -> str:
+    """市值（元）-> 如 "2.30万亿" """
+    market_cap = _number(market_cap)
+    if market_cap is None:
+        return UNKNOWN
+    if market_cap >= 1000000000000:
+        return f"{market_cap / 1000000000000:.2f}万亿"
+    elif market_cap >= 100000000:
+        return f"{market_cap / 100000000:.2f}亿"
+    else:
+        return f"{market_cap / 10000:.2f}万"
+
+
+def _formatter(func):
+    # 已是文本的值原样返回（兼容旧任务结果、客户端回传的筛选历史）
+    return BeforeValidator(lambda value: value if isinstance(value, str) else func(value))
+
+
+VolumeText = Annotated[str, _formatter(format_volume)]
+TurnoverText = Annotated[str, _formatter(format_turnover)]
+MarketCapText = Annotated[str, _formatter(format_market_cap)]
+
+_FIELD_FORMATTERS = {
+    'volume': format_volume,
+    'turnover': format_turnover,
+    'market_cap': format_market_cap,
+}
+
+
+def format_quote_fields(record: Dict) -> Dict:
+    """返回格式化了成交量/成交额/市值的副本（用于不经过响应模型的紧凑格式）"""
+    out = dict(record)
+    for field, func in _FIELD_FORMATTERS.items():
+        if field in out and not isinstance(out[field], str):
+            out[field] = func(out[field])
+    return out
@@ -0,0 +1,202 @@
+"""
+行情快照历史 - 只追加的时序表
+
+stock_quotes 原地更新，每只股票只保留最新一行，盘中和每日的行情历史随之丢失。
+这里每次行情入库时把快照追加到 quote_snapshots：
+
+- Postgres + TimescaleDB：quote_snapshots 转为按 ts 分区的hypertable，
+  按天分块，N天后按 stock_code 分段压缩，超过保留期的分块整块删除（后台策略，不占用写入路径）
+- Postgres（无TimescaleDB扩展）：普通表 + ts 上的BRIN索引，保留期由 prune() 定期删除
+- SQLite：默认不记录（单文件库上的追加写无法支撑每5分钟5000行的长期增长），
+  可用 QUOTE_HISTORY_ENABLED=true 强制开启，便于本地调试
+
+热点读取（单股最新行情）仍然走 stock_quotes，它就是最新行情的副表，与快照在同一事务中写入。
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.config import settings
+from app.models import QuoteSnapshot
+
+logger = logging.getLogger(__name__)
+
+# 单条INSERT语句的最大行数（SQLite参数上限32766 / 9列）
+_INSERT_CHUNK = 2000
+
+# 非TimescaleDB时两次清理过期快照的最小间隔（秒）
+_PRUNE_INTERVAL = 3600
+
+# setup() 探测到的后端：timescaledb / postgres / sqlite
+backend: Optional[str] = None
+_last_prune = 0.0
+
+
+def enabled(dialect: str) -> bool:
+    """是否记录快照：未显式配置时只在Postgres上开启"""
+    if settings.QUOTE_HISTORY_ENABLED is not None:
+        return settings.QUOTE_HISTORY_ENABLED
+    return dialect == "postgresql"
+
+
+def _timescale_available(conn) -> bool:
+    if not settings.TIMESCALEDB_ENABLED:
+        return False
+    return conn.execute(text(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'timescaledb'"
+    )).first() is not None
+
+
+def _setup_timescale(conn) -> None:
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS timescaledb"))
+    conn.execute(text(
+        "SELECT create_hypertable('quote_snapshots', 'ts', "
+        "chunk_time_interval => CAST(:chunk AS INTERVAL), if_not_exists => TRUE, migrate_data => TRUE)"
+    ), {"chunk": settings.QUOTE_HISTORY_CHUNK_INTERVAL})
+
+    # 已有压缩分块时不能再修改压缩配置，只在首次开启
+    compressed = conn.execute(text(
+        "SELECT compression_enabled FROM timescaledb_information.hypertables "
+        "WHERE hypertable_name = 'quote_snapshots'"
+    )).scalar()
+    if not compressed:
+        conn.execute(text(
+            "ALTER TABLE quote_snapshots SET ("
+            "timescaledb.compress, "
+            "timescaledb.compress_segmentby = 'stock_code', "
+            "timescaledb.compress_orderby = 'ts DESC')"
+        ))
+    conn.execute(text(
+        "SELECT add_compression_policy('quote_snapshots', CAST(:after AS INTERVAL), if_not_exists => TRUE)"
+    ), {"after": f"{settings.QUOTE_HISTORY_COMPRESS_AFTER_DAYS} days"})
+    conn.execute(text(
+        "SELECT add_retention_policy('quote_snapshots', CAST(:keep AS INTERVAL), if_not_exists => TRUE)"
+    ), {"keep": f"{settings.QUOTE_HISTORY_RETENTION_DAYS} days"})
+
+
+def setup(engine) -> Optional[str]:
+    """
+    建表后调用：Postgres上把 quote_snapshots 转为hypertable（有TimescaleDB时）或加BRIN索引
+
+    Returns:
+        后端类型（未启用快照时为None）
+    """
+    global backend
+    dialect = engine.dialect.name
+    if not enabled(dialect):
+        backend = None
+        return None
+
+    if dialect != "postgresql":
+        backend = dialect
+        return backend
+
+    with engine.begin() as conn:
+        if _timescale_available(conn):
+            _setup_timescale(conn)
+            backend = "timescaledb"
+        else:
+            # 快照按时间顺序追加，BRIN索引只有几十KB即可按时间范围裁剪
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_quote_snapshots_ts_brin ON quote_snapshots USING brin (ts)"
+            ))
+            backend = "postgres"
+    logger.info(f"行情快照历史已启用: {backend}")
+    return backend
+
+
+def rows_from_spot(df, ts: datetime) -> List[Dict]:
+    """全市场行情DataFrame -> 快照行（同一批使用同一时间戳，构成一致的横截面）"""
+    frame = df[['代码', '最新价', '涨跌幅', '成交量', '成交额', '市盈率-动态', '市净率', '总市值']].copy()
+    frame['成交量'] = frame['成交量'] * 100  # 手 -> 股
+    frame = frame.astype(object).where(frame.notna(), None)
+    return [
+        {
+            'stock_code': code, 'ts': ts, 'price': price, 'change_percent': change,
+            'volume': volume, 'turnover': turnover, 'pe': pe, 'pb': pb, 'market_cap': market_cap,
+        }
+        for code, price, change, volume, turnover, pe, pb, market_cap in frame.itertuples(index=False, name=None)
+    ]
+
+
+def _number(value) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if number != number else number  # NaN -> None
+
+
+def row_from_quote(data: Dict, ts: datetime) -> Dict:
+    """单股行情字典（get_stock_quote 的返回值）-> 快照行"""
+    return {
+        'stock_code': data['code'], 'ts': ts,
+        'price': _number(data.get('price')),
+        'change_percent': _number(data.get('change')),
+        'volume': _number(data.get('volume')),
+        'turnover': _number(data.get('turnover')),
+        'pe': _number(data.get('pe')),
+        'pb': _number(data.get('pb')),
+        'market_cap': _number(data.get('market_cap')),
+    }
+
+
+def append(db, rows: List[Dict]) -> int:
+    """
+    在调用方的事务中追加快照（由调用方提交）
+
+    同一股票同一时刻重复写入时忽略（主键冲突 DO NOTHING）。
+    """
+    if not rows:
+        return 0
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    for i in range(0, len(rows), _INSERT_CHUNK):
+        stmt = insert(QuoteSnapshot).values(rows[i:i + _INSERT_CHUNK]).on_conflict_do_nothing()
+        db.execute(stmt)
+    return len(rows)
+
+
+def prune(db, now: Optional[datetime] = None) -> int:
+    """
+    删除超过保留期的快照（TimescaleDB由保留策略处理，这里直接跳过）
+
+    最多每 _PRUNE_INTERVAL 秒执行一次，在调用方的事务中执行。
+    """
+    global _last_prune
+    if backend == "timescaledb" or time.time() - _last_prune < _PRUNE_INTERVAL:
+        return 0
+    _last_prune = time.time()
+    cutoff = (now or datetime.now()) - timedelta(days=settings.QUOTE_HISTORY_RETENTION_DAYS)
+    deleted = db.query(QuoteSnapshot).filter(QuoteSnapshot.ts < cutoff).delete(synchronize_session=False)
+    if deleted:
+        logger.info(f"已清理 {deleted} 条过期行情快照（{cutoff:%Y-%m-%d} 之前）")
+    return deleted
+
+
+def history(db, code: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+            limit: int = 1000) -> List[Dict]:
+    """单股快照历史（按时间倒序）"""
+    query = db.query(QuoteSnapshot).filter(QuoteSnapshot.stock_code == code)
+    if start is not None:
+        query = query.filter(QuoteSnapshot.ts >= start)
+    if end is not None:
+        query = query.filter(QuoteSnapshot.ts <= end)
+    snapshots = query.order_by(QuoteSnapshot.ts.desc()).limit(limit).all()
+    return [
+        {
+            'ts': s.ts.isoformat(),
+            'price': s.price,
+            'change': s.change_percent,
+            'volume': s.volume,
+            'turnover': s.turnover,
+            'pe': s.pe,
+            'pb': s.pb,
+            'market_cap': s.market_cap,
+        }
+        for s in snapshots
+    ]
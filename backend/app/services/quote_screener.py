@@ -0,0 +1,142 @@
+"""
+基于行情表的SQL筛选（条件下推到数据库）
+
+stock_quotes 由全市场行情刷新和 PEPBUpdater.update_all_pe_pb 持续写入价格、涨跌幅、PE/PB、市值，
+数据足够新时不必逐只股票联网获取：把筛选条件编译成一条 stock_quotes JOIN stocks 的查询，
+过滤、排序、分页都在数据库中完成（5000只股票约几十毫秒）。
+
+- 只有 timestamp 在 SCREENING_FRESH_MINUTES 分钟内、且在 stocks 表中的股票参与SQL筛选
+- 其余（过期或缺失）的股票由调用方按原方式联网获取后用 filter_stock 筛选
+- 条件语义与 screening_funnel.filter_stock 一致：PE/PB/市值缺失或不大于0时不按该项过滤
+
+漏斗筛选（screening_funnel）的数据库层用 quotes_by_code 按代码读取快照中缺失的行情和基本面。
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Stock, StockQuote
+
+# 按代码查询时单条语句的代码数（IN参数个数）
+_CODES_CHUNK = 500
+
+# 可排序字段 -> 列
+SORT_COLUMNS = {
+    'change': StockQuote.change_percent,
+    'price': StockQuote.price,
+    'pe': StockQuote.pe,
+    'pb': StockQuote.pb,
+    'volume': StockQuote.volume,
+    'turnover': StockQuote.turnover,
+    'market_cap': StockQuote.market_cap,
+}
+
+
+def fresh_since(now: Optional[datetime] = None) -> datetime:
+    """早于该时间的行情视为过期"""
+    return (now or datetime.now()) - timedelta(minutes=settings.SCREENING_FRESH_MINUTES)
+
+
+def _range(column, low, high, scale: float = 1.0) -> list:
+    """有效值（大于0）才按范围过滤，缺失或不大于0的行保留"""
+    bounds = []
+    if low is not None:
+        bounds.append(column >= low * scale)
+    if high is not None:
+        bounds.append(column <= high * scale)
+    if not bounds:
+        return []
+    return [or_(column.is_(None), column <= 0, and_(*bounds))]
+
+
+def conditions(criteria: Dict) -> list:
+    """final_criteria -> WHERE条件"""
+    where = []
+    where += _range(StockQuote.pe, criteria.get('peMin'), criteria.get('peMax'))
+    where += _range(StockQuote.pb, criteria.get('pbMin'), criteria.get('pbMax'))
+    where += _range(StockQuote.market_cap, criteria.get('marketCapMin'), None, scale=1e8)  # 亿 -> 元
+
+    change_type = criteria.get('changeType', 'all')
+    if change_type == 'up':
+        where.append(StockQuote.change_percent > 0)
+    elif change_type == 'down':
+        where.append(StockQuote.change_percent < 0)
+
+    industry = criteria.get('industry')
+    if industry and industry != '全部':
+        where.append(func.coalesce(Stock.industry, '未知') == industry)
+    return where
+
+
+def _fresh(since: datetime) -> list:
+    # 没有价格/涨跌幅的行不能直接作为结果，按过期处理
+    return [StockQuote.timestamp >= since, StockQuote.price.isnot(None), StockQuote.change_percent.isnot(None)]
+
+
+def _fresh_query(db: Session, since: datetime):
+    return db.query(StockQuote, Stock).join(Stock, Stock.code == StockQuote.stock_code) \
+        .filter(*_fresh(since))
+
+
+def _row(quote: StockQuote, stock: Stock) -> Dict:
+    return {
+        'code': stock.code,
+        'name': stock.name,
+        'industry': stock.industry or '未知',
+        'market': stock.market or '未知',
+        'price': quote.price,
+        'change': quote.change_percent,
+        'volume': quote.volume,
+        'pe': quote.pe,
+        'pb': quote.pb,
+        'market_cap': quote.market_cap,
+    }
+
+
+def screen(db: Session, criteria: Dict, order_by: str = 'change', descending: bool = True,
+           limit: Optional[int] = None, offset: int = 0,
+           since: Optional[datetime] = None) -> Tuple[int, List[Dict]]:
+    """
+    在新鲜行情上执行筛选
+
+    Returns:
+        (符合条件的总数, 当前页结果)
+    """
+    column = SORT_COLUMNS.get(order_by)
+    if column is None:
+        raise ValueError(f"不支持的排序字段: {order_by}（可选: {', '.join(SORT_COLUMNS)}）")
+
+    query = _fresh_query(db, since or fresh_since()).filter(*conditions(criteria))
+    total = query.count()
+    # 缺失值排在最后，同值按代码排序保证分页稳定
+    ordering = [column.is_(None), column.desc() if descending else column.asc(), StockQuote.stock_code]
+    query = query.order_by(*ordering).offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    return total, [_row(quote, stock) for quote, stock in query.all()]
+
+
+def fresh_codes(db: Session, since: Optional[datetime] = None) -> Set[str]:
+    """行情足够新、可以走SQL筛选的股票代码"""
+    rows = db.query(StockQuote.stock_code).join(Stock, Stock.code == StockQuote.stock_code) \
+        .filter(*_fresh(since or fresh_since())).all()
+    return {code for code, in rows}
+
+
+def stale_count(db: Session, since: Optional[datetime] = None) -> int:
+    """stocks 表中行情过期或缺失的股票数（不在SQL筛选结果中）"""
+    total = db.query(func.count(Stock.id)).scalar()
+    return total - len(fresh_codes(db, since))
+
+
+def quotes_by_code(db: Session, codes: Iterable[str]) -> Dict[str, StockQuote]:
+    """按代码读取 stock_quotes 行（不限新鲜度，由调用方按 timestamp 判断）"""
+    codes = list(codes)
+    rows = {}
+    for i in range(0, len(codes), _CODES_CHUNK):
+        for quote in db.query(StockQuote).filter(StockQuote.stock_code.in_(codes[i:i + _CODES_CHUNK])):
+            rows[quote.stock_code] = quote
+    return rows
@@ -0,0 +1,427 @@
+"""
+漏斗筛选
+
+筛选分层执行。每层声明所需数据的获取成本（cost），按成本从低到高执行，只处理上一层留下的股票：
+
+- snapshot（COST_MEMORY）：内存中的全市场快照（行情 + PE/PB/总市值），按涨跌、行业、估值、市值过滤
+- quotes（COST_DATABASE）：一次批量查询 stock_quotes，补齐快照中缺失的行情（SCREENING_FRESH_MINUTES 内）
+  和基本面（PE/PB更新任务写入，FUNDAMENTALS_MAX_AGE_DAYS 内）；SCREENING_SQL_ENABLED=false 时跳过
+- trend（COST_LOCAL_BARS）：条件 trend=true 时，由本地日线（价格面板，其次日线存储）计算趋势指标（见 trend_indicators）
+- upstream（COST_UPSTREAM）：逐只联网，只处理通过前面各层、但仍缺行情或本地没有日线的股票；
+  取得的日线写入日线存储，下次筛选在 trend 层直接计算
+
+某项数据缺失时该层不按该项过滤（与 filter_stock 的语义一致），留给后面的层补齐后再判断。
+每层的输入/输出股票数、耗时和联网获取数记录为 StageReport，随任务状态返回。
+"""
+import asyncio
+import logging
+import math
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.database import SessionLocal
+from app.services import quote_screener
+from app.services.data_fetcher import data_fetcher
+from app.services.metrics import SCREENING_STAGE_DURATION, SCREENING_STAGE_STOCKS, SCREENING_STOCKS
+from app.services.pe_pb_calculator import pe_pb_calculator
+from app.services.tracing import set_attributes, traced
+
+logger = logging.getLogger(__name__)
+
+# 数据成本（越小越先执行）
+COST_MEMORY = 0  # 进程内快照
+COST_DATABASE = 1  # 批量数据库查询
+COST_LOCAL_BARS = 2  # 本地日线计算指标
+COST_UPSTREAM = 3  # 逐只联网请求
+
+# 逐只联网：请求间隔（避免触发接口限流）和单只超时
+FETCH_INTERVAL = 0.3
+FETCH_TIMEOUT = 15.0
+
+# 行情表中的PE/PB/市值超过该天数不再使用（PE/PB更新任务每个交易日刷新）
+FUNDAMENTALS_MAX_AGE_DAYS = 7
+
+_FUNDAMENTAL_FIELDS = ('pe', 'pb', 'market_cap')
+
+
+# ==================== 单股数据与条件 ====================
+
+@traced("screening.fetch_stock_data")
+async def fetch_stock_data(stock: dict) -> Optional[dict]:
+    """
+    异步获取单只股票的完整数据（行情 + 指标）
+
+    简化版本：只获取最新一天的数据，使用baostock稳定接口
+
+    Args:
+        stock: 股票基本信息 {code, name, industry, market}
+
+    Returns:
+        完整股票数据或None
+    """
+    code = stock['code']
+    set_attributes(**{"stock.code": code})
+    try:
+        # 直接获取最新一天行情（不使用预热缓存）
+        quote_data = await data_fetcher.aget_stock_quote_latest(code)
+
+        if not quote_data:
+            return None  # 静默失败
+
+        price = quote_data.get('price', 0)
+
+        # 计算PE（使用baostock的epsTTM）
+        pe = None
+        # PB暂时不可用
+        pb = None
+        if data_fetcher.read_only:
+            # 只读API进程不访问上游：PE/PB取采集进程发布的基本面
+            fundamental = await data_fetcher.aget_stock_pe_pb(code)
+            pe, pb = fundamental['pe'], fundamental['pb']
+        elif price and price > 0:
+            pe = await data_fetcher.run_blocking(pe_pb_calculator.get_stock_pe, code, price)
+
+        # 合并数据
+        return {
+            **stock,
+            'price': price,
+            'change': quote_data.get('change', 0),
+            'volume': quote_data.get('volume'),  # 股，返回时格式化
+            'pe': pe,  # 基于epsTTM计算
+            'pb': pb,  # 暂时不可用
+            'market_cap': None,  # 历史数据中没有市值
+        }
+
+    except Exception:
+        return None  # 静默失败，不输出日志
+
+
+def filter_stock(stock: dict, criteria: dict) -> bool:
+    """
+    根据条件筛选股票
+
+    Args:
+        stock: 股票数据
+        criteria: 筛选条件
+
+    Returns:
+        是否符合条件
+    """
+    # PE筛选（如果PE为None或0，跳过PE筛选）
+    pe_min = criteria.get('peMin')
+    pe_max = criteria.get('peMax')
+    pe = stock.get('pe')
+
+    # 只有 PE 有效值（大于0）时才进行筛选
+    if pe is not None and pe > 0:
+        if pe_min is not None and pe < pe_min:
+            return False
+        if pe_max is not None and pe > pe_max:
+            return False
+
+    # PB、市值筛选：同样只在有效值时筛选（联网获取的数据没有PB/市值，行情表中的数据有）
+    pb_min = criteria.get('pbMin')
+    pb_max = criteria.get('pbMax')
+    pb = stock.get('pb')
+    if pb is not None and pb > 0:
+        if pb_min is not None and pb < pb_min:
+            return False
+        if pb_max is not None and pb > pb_max:
+            return False
+
+    market_cap_min = criteria.get('marketCapMin')
+    market_cap = stock.get('market_cap')  # 元
+    if market_cap is not None and market_cap > 0:
+        if market_cap_min is not None and market_cap < market_cap_min * 1e8:
+            return False
+
+    # 涨跌幅筛选（漏斗前几层中还没有行情的股票不按涨跌幅过滤）
+    change_type = criteria.get('changeType', 'all')
+    change = stock.get('change', 0)
+
+    if change is not None:
+        if change_type == 'up' and change <= 0:
+            return False
+        if change_type == 'down' and change >= 0:
+            return False
+
+    # 行业筛选
+    industry = criteria.get('industry')
+    if industry and industry != '全部':
+        if stock.get('industry') != industry:
+            return False
+
+    return True
+
+
+def _valid(value) -> bool:
+    return value is not None and not math.isnan(value)
+
+
+def _candidate(stock: Dict) -> Dict:
+    """股票列表项 -> 候选（行情和基本面待各层补齐）"""
+    return {
+        **stock,
+        'industry': stock.get('industry') or '未知',
+        'price': None,
+        'change': None,
+        'volume': None,
+        'pe': None,
+        'pb': None,
+        'market_cap': None,
+    }
+
+
+# ==================== 各层 ====================
+
+async def _snapshot_stage(funnel: 'ScreeningFunnel', candidates: List[Dict]) -> List[Dict]:
+    """全市场快照中的行情和基本面"""
+    snapshot = data_fetcher.market.current
+    for stock in candidates:
+        quote = snapshot.quote(stock['code'])
+        if quote and _valid(quote.get('price')) and _valid(quote.get('change')):
+            stock.update(price=quote['price'], change=quote['change'], volume=quote.get('volume'))
+        fundamental = snapshot.fundamental(stock['code'])
+        if fundamental:
+            stock.update({key: value for key, value in fundamental.items() if value is not None})
+    return [stock for stock in candidates if filter_stock(stock, funnel.criteria)]
+
+
+def _load_quotes(codes: List[str]) -> Dict[str, Dict]:
+    db = SessionLocal()
+    try:
+        return {
+            code: {
+                'price': quote.price, 'change': quote.change_percent, 'volume': quote.volume,
+                'pe': quote.pe, 'pb': quote.pb, 'market_cap': quote.market_cap, 'timestamp': quote.timestamp,
+            }
+            for code, quote in quote_screener.quotes_by_code(db, codes).items()
+        }
+    finally:
+        db.close()
+
+
+async def _quotes_stage(funnel: 'ScreeningFunnel', candidates: List[Dict]) -> List[Dict]:
+    """行情表中的新鲜行情和近期基本面（只查询快照中缺数据的股票）"""
+    missing = [
+        stock for stock in candidates
+        if stock['price'] is None or any(stock[key] is None for key in _FUNDAMENTAL_FIELDS)
+    ]
+    if not missing:
+        return candidates
+
+    rows = await run_in_threadpool(_load_quotes, [stock['code'] for stock in missing])
+    fresh_since = quote_screener.fresh_since()
+    recent_since = datetime.now() - timedelta(days=FUNDAMENTALS_MAX_AGE_DAYS)
+    rejected = set()
+    for stock in missing:
+        row = rows.get(stock['code'])
+        if row is None or row['timestamp'] is None:
+            continue
+        if stock['price'] is None and row['timestamp'] >= fresh_since \
+                and row['price'] is not None and row['change'] is not None:
+            stock.update(price=row['price'], change=row['change'], volume=row['volume'])
+        if row['timestamp'] >= recent_since:
+            for key in _FUNDAMENTAL_FIELDS:
+                if stock[key] is None:
+                    stock[key] = row[key]
+        if not filter_stock(stock, funnel.criteria):
+            rejected.add(stock['code'])
+    return [stock for stock in candidates if stock['code'] not in rejected]
+
+
+def _local_trend(codes: List[str]) -> Dict[str, Dict]:
+    """本地日线计算的趋势指标：价格面板优先，面板中没有的股票查日线存储"""
+    from app.services import trend_indicators
+
+    indicators = trend_indicators.from_panel(codes)
+    rest = [code for code in codes if code not in indicators]
+    if rest:
+        indicators.update(trend_indicators.from_store(rest))
+    return indicators
+
+
+async def _trend_stage(funnel: 'ScreeningFunnel', candidates: List[Dict]) -> List[Dict]:
+    """本地日线计算的趋势指标（本地没有日线的股票留给 upstream 层）"""
+    from app.services import trend_indicators
+
+    indicators = await run_in_threadpool(_local_trend, [stock['code'] for stock in candidates])
+    survivors = []
+    for stock in candidates:
+        values = indicators.get(stock['code'])
+        if values is None:
+            funnel.needs_history.add(stock['code'])
+            survivors.append(stock)
+        elif trend_indicators.passes(values):
+            stock.update(values)
+            survivors.append(stock)
+    return survivors
+
+
+def _sync_trend(code: str) -> Dict:
+    """同步一只股票的日线到本地存储后计算趋势指标（只读API进程不访问上游，只读本地日线）"""
+    from app.services import trend_indicators
+    from app.services.bar_store import bar_store
+
+    if not data_fetcher.read_only:
+        bar_store.sync_stock(code)
+    return trend_indicators.from_store([code]).get(code, {})
+
+
+async def _fetch(funnel: 'ScreeningFunnel', stock: Dict) -> Optional[Dict]:
+    record = stock
+    if stock['price'] is None:
+        data = await fetch_stock_data(stock)
+        if data is None:
+            return None
+        record = {**stock, **{key: value for key, value in data.items() if value is not None}}
+    if stock['code'] in funnel.needs_history:
+        indicators = await data_fetcher.run_blocking(_sync_trend, stock['code'])
+        record = {**record, **indicators}
+    return record
+
+
+def _accept(record: Dict, criteria: Dict) -> bool:
+    if not filter_stock(record, criteria):
+        return False
+    if criteria.get('trend'):
+        from app.services import trend_indicators
+        return trend_indicators.passes(record)
+    return True
+
+
+async def _upstream_stage(funnel: 'ScreeningFunnel', candidates: List[Dict]) -> List[Dict]:
+    """逐只联网：仍缺行情的股票取最新行情和PE，本地没有日线的股票同步日线（串行，避免触发接口限流）"""
+    pending = [stock for stock in candidates
+               if stock['price'] is None or stock['code'] in funnel.needs_history]
+    if not pending:
+        return candidates
+
+    survivors = [stock for stock in candidates
+                 if stock['price'] is not None and stock['code'] not in funnel.needs_history]
+    logger.info(f"📊 需联网获取 {len(pending)} 只股票")
+    failed = 0
+    for index, stock in enumerate(pending):
+        if index > 0:
+            await asyncio.sleep(FETCH_INTERVAL)
+        try:
+            record = await asyncio.wait_for(_fetch(funnel, stock), timeout=FETCH_TIMEOUT)
+        except asyncio.TimeoutError:
+            record = None  # 超时返回None，继续处理下一个
+        funnel.fetched += 1
+        funnel.advance(1)
+
+        if record is None:
+            failed += 1
+        elif _accept(record, funnel.criteria):
+            survivors.append(record)
+
+        if (index + 1) % 250 == 0 or index + 1 == len(pending):
+            logger.info(f"✅ 已联网获取 {index + 1}/{len(pending)} - 失败: {failed}")
+
+    if failed:
+        logger.info(f"💡 提示: 失败的 {failed} 只股票可能是退市、停牌或无近期数据")
+    return survivors
+
+
+# ==================== 流水线 ====================
+
+@dataclass(frozen=True)
+class Stage:
+    """筛选层"""
+    name: str
+    cost: int  # 数据成本，越小越先执行
+    run: Callable[['ScreeningFunnel', List[Dict]], Awaitable[List[Dict]]]
+    enabled: Callable[[Dict], bool] = lambda criteria: True
+
+
+@dataclass
+class StageReport:
+    """一层的执行情况"""
+    name: str
+    cost: int
+    input: int
+    output: int
+    seconds: float
+    fetched: int = 0  # 逐只联网获取的股票数
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+STAGES = (
+    Stage('snapshot', COST_MEMORY, _snapshot_stage),
+    Stage('quotes', COST_DATABASE, _quotes_stage, enabled=lambda criteria: settings.SCREENING_SQL_ENABLED),
+    Stage('trend', COST_LOCAL_BARS, _trend_stage, enabled=lambda criteria: bool(criteria.get('trend'))),
+    Stage('upstream', COST_UPSTREAM, _upstream_stage),
+)
+
+
+class ScreeningFunnel:
+    """一次漏斗筛选"""
+
+    def __init__(self, criteria: Dict, stages: Iterable[Stage] = STAGES,
+                 on_progress: Optional[Callable[[int], None]] = None):
+        """
+        Args:
+            criteria: 应用策略后的最终筛选条件
+            stages: 筛选层（按 cost 升序执行）
+            on_progress: 已处理（被淘汰或已联网获取）股票数变化时回调
+        """
+        self.criteria = criteria
+        self.stages = sorted(stages, key=lambda stage: stage.cost)
+        self.on_progress = on_progress
+        self.reports: List[StageReport] = []
+        self.needs_history: Set[str] = set()  # 本地没有日线、需联网同步的股票
+        self.total = 0
+        self.processed = 0
+        self.fetched = 0
+
+    def advance(self, count: int) -> None:
+        if count <= 0:
+            return
+        self.processed += count
+        SCREENING_STOCKS.inc(count)
+        if self.on_progress is not None:
+            self.on_progress(self.processed)
+
+    async def run(self, stocks: Iterable[Dict]) -> List[Dict]:
+        """
+        执行筛选
+
+        Args:
+            stocks: 股票列表 [{code, name, industry, market}]
+
+        Returns:
+            符合条件的股票（含行情、PE/PB/市值，trend=true 时含趋势指标）
+        """
+        candidates = [_candidate(stock) for stock in stocks]
+        self.total = len(candidates)
+        for stage in self.stages:
+            if not stage.enabled(self.criteria):
+                continue
+            size, processed, fetched = len(candidates), self.processed, self.fetched
+            started = time.perf_counter()
+            candidates = await stage.run(self, candidates)
+            elapsed = time.perf_counter() - started
+
+            self.reports.append(StageReport(
+                name=stage.name, cost=stage.cost, input=size, output=len(candidates),
+                seconds=round(elapsed, 4), fetched=self.fetched - fetched,
+            ))
+            SCREENING_STAGE_DURATION.labels(stage.name).observe(elapsed)
+            SCREENING_STAGE_STOCKS.labels(stage.name).set(len(candidates))
+            # 被淘汰的股票计入进度（逐只获取的层已逐只计入）
+            self.advance(size - len(candidates) - (self.processed - processed))
+
+        self.advance(self.total - self.processed)
+        logger.info("📊 漏斗筛选: " + " → ".join(
+            f"{report.name} {report.input}→{report.output} ({report.seconds * 1000:.0f}ms)"
+            for report in self.reports
+        ))
+        return candidates
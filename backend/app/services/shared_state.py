@@ -0,0 +1,253 @@
+"""
+多进程共享状态
+
+uvicorn --workers N / gunicorn 启动多个worker时，进程内的全局对象（全市场快照、筛选任务、SimpleCache）各自独立：
+每个worker都会刷新全市场行情（上游压力×N），任务在一个worker中创建、轮询落到另一个worker时查不到。
+设置 SHARED_STATE_DIR 后：
+
+- 上游刷新：各worker竞争共享目录下的文件锁，持锁的worker负责股票列表和全市场行情的刷新，
+  其余worker只读；持锁进程退出后锁自动释放，由其他worker接替
+- 全市场快照：发布时序列化到共享目录（先写临时文件再原子替换），其余worker定期检查并加载新版本
+- 任务状态和热点缓存：存入键值存储（SHARED_STORE_URL=redis://... 时用Redis，否则用共享目录下的SQLite文件）
+- 数据库迁移：多个worker同时启动时串行执行
+
+未设置 SHARED_STATE_DIR 时为单进程模式，行为与之前相同。
+
+INGEST_EXTERNAL=true 时上游由独立采集进程（app.ingest，调用 claim_upstream）负责，API进程不参与竞选、始终只读。
+"""
+import fcntl
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SqliteStore:
+    """共享目录下的SQLite键值存储（多进程可用，支持过期时间）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 每个线程一个连接；自动提交，每条语句即一个事务
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        if not keys:
+            return {}
+        marks = ",".join("?" * len(keys))
+        rows = self._conn().execute(
+            f"SELECT key, value FROM kv WHERE key IN ({marks}) AND (expires_at IS NULL OR expires_at > ?)",
+            (*keys, time.time()),
+        ).fetchall()
+        return dict(rows)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + ttl if ttl else None
+        self._conn().execute("INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                             (key, value, expires_at))
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self._conn().executemany("DELETE FROM kv WHERE key = ?", [(key,) for key in keys])
+
+    def keys(self, prefix: str) -> List[str]:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        # 前缀按范围查询，可以利用主键索引，也不需要对LIKE通配符转义
+        rows = conn.execute("SELECT key FROM kv WHERE key >= ? AND key < ?", (prefix, prefix + "\uffff")).fetchall()
+        return [key for key, in rows]
+
+
+class RedisStore:
+    """Redis键值存储（SHARED_STORE_URL=redis://...）"""
+
+    def __init__(self, url: str):
+        import redis  # 可选依赖，只在配置了Redis地址时需要
+
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        if not keys:
+            return {}
+        return {key: value for key, value in zip(keys, self.client.mget(keys)) if value is not None}
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        self.client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self.client.delete(*keys)
+
+    def keys(self, prefix: str) -> List[str]:
+        return [key.decode() for key in self.client.scan_iter(match=f"{prefix}*", count=500)]
+
+
+class SharedState:
+    """共享目录、键值存储和上游角色"""
+
+    def __init__(self, directory: Optional[str], store_url: Optional[str] = None, external: bool = False):
+        self.directory = directory
+        self.store_url = store_url
+        self.external = external  # 上游由独立采集进程负责
+        self._store = None
+        self._lock = threading.Lock()
+        self._upstream_fd: Optional[int] = None
+        self._claimed = False  # 采集进程已声明负责上游
+        self._next_claim = 0.0
+        self._seen: Dict[str, tuple] = {}  # 文件名 -> 最近加载时的 (inode, mtime_ns)
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @property
+    def store(self):
+        """键值存储（首次使用时创建）"""
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    if self.store_url:
+                        self._store = RedisStore(self.store_url)
+                    else:
+                        self._store = SqliteStore(self._path("store.db"))
+        return self._store
+
+    # ==================== 上游角色 ====================
+
+    def is_upstream(self) -> bool:
+        """本进程是否负责上游刷新（单进程模式总是）；未持锁时每隔一段时间尝试获取"""
+        if self._claimed or self._upstream_fd is not None:
+            return True
+        if self.external:
+            return False
+        if not self.enabled:
+            return True
+        with self._lock:
+            if self._upstream_fd is not None:
+                return True
+            now = time.monotonic()
+            if now < self._next_claim:
+                return False
+            self._next_claim = now + settings.SHARED_UPSTREAM_CLAIM_SECONDS
+            if not self._lock_upstream(blocking=False):
+                return False
+        logger.info(f"本进程（pid={os.getpid()}）负责上游数据刷新")
+        return True
+
+    def claim_upstream(self, wait: bool = True) -> bool:
+        """
+        采集进程声明负责上游
+
+        共享目录下需要获取上游锁：wait=True 时等待（另一个采集进程在运行时作为备用阻塞在这里），
+        否则锁被占用时返回False
+        """
+        if self.enabled and self._upstream_fd is None and not self._lock_upstream(blocking=False):
+            if not wait:
+                return False
+            logger.info(f"上游锁被其他进程持有，等待接替（{self._path('upstream.lock')}）")
+            self._lock_upstream(blocking=True)
+        self._claimed = True
+        logger.info(f"本进程（pid={os.getpid()}）负责上游数据采集")
+        return True
+
+    def _lock_upstream(self, blocking: bool) -> bool:
+        fd = os.open(self._path("upstream.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._upstream_fd = fd
+        return True
+
+    @contextmanager
+    def exclusive(self, name: str):
+        """跨进程互斥（单进程模式下不加锁）"""
+        if not self.enabled:
+            yield
+            return
+        fd = os.open(self._path(f"{name}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # 关闭文件即释放锁
+
+    # ==================== 共享对象文件 ====================
+
+    def write_object(self, name: str, obj) -> None:
+        """序列化到共享目录（写临时文件后原子替换，读取方不会读到写了一半的文件）"""
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=f".{name}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(name))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def read_object(self, name: str):
+        """文件自上次读取后有变化时返回新对象，否则返回None"""
+        path = self._path(name)
+        try:
+            with open(path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                version = (stat.st_ino, stat.st_mtime_ns)
+                if self._seen.get(name) == version:
+                    return None
+                obj = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        self._seen[name] = version
+        return obj
+
+    def status(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'directory': self.directory,
+            'store': 'redis' if self.store_url else 'sqlite',
+            'upstream': self.is_upstream(),
+            'ingest_external': self.external,
+            'pid': os.getpid(),
+        }
+
+
+# 全局实例
+shared_state = SharedState(settings.SHARED_STATE_DIR, settings.SHARED_STORE_URL, external=settings.INGEST_EXTERNAL)
@@ -0,0 +1,408 @@
+"""
+上游数据源熔断与路由
+
+每个数据源（baostock、东方财富全市场、新浪全市场、akshare历史K线）一个熔断器：
+- 滑动窗口记录最近调用的耗时与成败，计算延迟分位数和错误率
+- 连续失败或窗口错误率过高时熔断（open），冷却期内直接跳过，不再白等超时
+- 冷却结束后进入半开（half_open），只放行一个探测请求：
+  成功则恢复（closed），失败则重新熔断且冷却时间翻倍（有上限）
+- 任何一次成功都会清零连续失败计数
+- 只有异常（含数据源抛出的 UpstreamError，即上游返回的错误码）记为失败；
+  空结果（北交所、停牌、新上市等没有数据的代码）是正常应答，记为成功
+
+SourceRouter 按请求类型（spot/quote/history）给出可用数据源，
+按健康分（p95延迟 × 错误率惩罚）从优到劣排序。
+
+对冲请求（hedged）：首选数据源超过其p95延迟仍未返回时，向次选数据源发出同样的请求，
+先返回有效结果者胜出。额外请求受全局对冲预算（令牌桶）限制，
+每个请求按比例补充令牌，对冲一次消耗一个，避免上游变慢时请求量翻倍。
+"""
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional
+
+from app.config import settings
+from app.services.lazy_import import lazy_import
+from app.services.metrics import UPSTREAM_ERRORS, record_upstream
+from app.services.tracing import span
+
+pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class SourceUnavailable(Exception):
+    """数据源处于熔断状态"""
+
+
+class UpstreamError(Exception):
+    """上游返回错误码（数据源处理函数抛出，计入熔断失败）"""
+
+
+def _percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class CircuitBreaker:
+    """单个数据源的熔断器（线程安全）"""
+
+    def __init__(
+        self,
+        name: str,
+        expected_latency: float = 1.0,
+        window_size: int = 100,
+        window_seconds: float = 300.0,
+        failure_threshold: int = None,
+        error_rate_threshold: float = None,
+        min_calls: int = 5,
+        cooldown: float = None,
+        max_cooldown: float = None,
+    ):
+        self.name = name
+        self.expected_latency = expected_latency
+        self.window_seconds = window_seconds
+        self.failure_threshold = failure_threshold or settings.SOURCE_BREAKER_FAILURE_THRESHOLD
+        self.error_rate_threshold = error_rate_threshold or settings.SOURCE_BREAKER_ERROR_RATE
+        self.min_calls = min_calls
+        self.base_cooldown = cooldown or settings.SOURCE_BREAKER_COOLDOWN
+        self.max_cooldown = max_cooldown or settings.SOURCE_BREAKER_MAX_COOLDOWN
+
+        self._lock = threading.Lock()
+        self._calls = deque(maxlen=window_size)  # (时间戳, 是否成功, 耗时)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.cooldown = self.base_cooldown
+        self.open_until = 0.0
+        self._probe_in_flight = False
+        self.last_error: Optional[str] = None
+
+    # ==================== 状态 ====================
+
+    def _window(self, now: float):
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+        return self._calls
+
+    def allow(self) -> bool:
+        """当前是否允许请求该数据源（半开时只放行一个探测）"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.time()
+            if self.state == OPEN:
+                if now < self.open_until:
+                    return False
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+                logger.info(f"数据源 {self.name} 冷却结束，进入半开探测")
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def available(self) -> bool:
+        """只读判断（不占用半开探测名额）"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                return time.time() >= self.open_until
+            return not self._probe_in_flight
+
+    def record_success(self, latency: float) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                # 恢复后重新统计，熔断前的失败不再拖累健康分
+                self._calls.clear()
+                logger.info(f"✅ 数据源 {self.name} 探测成功，恢复正常")
+            self._calls.append((time.time(), True, latency))
+            self.consecutive_failures = 0
+            self.state = CLOSED
+            self.cooldown = self.base_cooldown
+            self._probe_in_flight = False
+
+    def record_failure(self, latency: float, error: Optional[str] = None) -> None:
+        with self._lock:
+            now = time.time()
+            self._calls.append((now, False, latency))
+            self.consecutive_failures += 1
+            self.last_error = error
+
+            if self.state == HALF_OPEN:
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                self._trip(now, "半开探测失败")
+                return
+
+            calls = self._window(now)
+            failures = sum(1 for _, ok, _ in calls if not ok)
+            error_rate = failures / len(calls) if calls else 0.0
+            if self.consecutive_failures >= self.failure_threshold:
+                self._trip(now, f"连续失败 {self.consecutive_failures} 次")
+            elif len(calls) >= self.min_calls and error_rate >= self.error_rate_threshold:
+                self._trip(now, f"错误率 {error_rate:.0%}")
+
+    def _trip(self, now: float, reason: str) -> None:
+        self.state = OPEN
+        self.open_until = now + self.cooldown
+        self._probe_in_flight = False
+        logger.warning(f"⚠️ 数据源 {self.name} 熔断 {self.cooldown:.0f}s（{reason}）: {self.last_error}")
+
+    # ==================== 统计 ====================
+
+    def stats(self) -> Dict:
+        with self._lock:
+            now = time.time()
+            calls = list(self._window(now))
+            state = self.state
+            open_remaining = max(0.0, self.open_until - now) if state == OPEN else 0.0
+        latencies = sorted(latency for _, ok, latency in calls if ok)
+        failures = sum(1 for _, ok, _ in calls if not ok)
+        return {
+            'state': state,
+            'calls': len(calls),
+            'error_rate': round(failures / len(calls), 4) if calls else 0.0,
+            'p50': _percentile(latencies, 0.50),
+            'p95': _percentile(latencies, 0.95),
+            'p99': _percentile(latencies, 0.99),
+            'consecutive_failures': self.consecutive_failures,
+            'open_remaining': round(open_remaining, 1),
+            'last_error': self.last_error,
+        }
+
+    def p95(self) -> float:
+        """p95延迟（样本不足时用预期延迟）"""
+        stats = self.stats()
+        if stats['p95'] is None or stats['calls'] < self.min_calls:
+            return self.expected_latency
+        return stats['p95']
+
+    def probe_due(self) -> bool:
+        """冷却已结束、等待半开探测"""
+        with self._lock:
+            if self.state == OPEN:
+                return time.time() >= self.open_until
+            return self.state == HALF_OPEN and not self._probe_in_flight
+
+    def score(self) -> float:
+        """健康分：越小越好"""
+        stats = self.stats()
+        return self.p95() * (1 + 4 * stats['error_rate'])
+
+
+def _is_empty(result) -> bool:
+    if result is None:
+        return True
+    if isinstance(result, pd.DataFrame):
+        return result.empty
+    return False
+
+
+class HedgeBudget:
+    """对冲预算（令牌桶）：每个请求补充 ratio 个令牌，上限 burst"""
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self.issued = 0
+        self.won = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def on_request(self) -> None:
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.issued += 1
+                return True
+            self.denied += 1
+            return False
+
+    def record_win(self) -> None:
+        with self._lock:
+            self.won += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'tokens': round(self.tokens, 2),
+                'issued': self.issued,
+                'won': self.won,
+                'denied': self.denied,
+            }
+
+
+class SourceRouter:
+    """按请求类型路由到最健康的数据源"""
+
+    def __init__(self):
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.routes: Dict[str, List[str]] = {}
+        self.hedge_budget = HedgeBudget(settings.HEDGE_BUDGET_RATIO, settings.HEDGE_BUDGET_BURST)
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def register(self, name: str, expected_latency: float = 1.0, **kwargs) -> CircuitBreaker:
+        breaker = CircuitBreaker(name, expected_latency=expected_latency, **kwargs)
+        self.breakers[name] = breaker
+        return breaker
+
+    def route(self, kind: str, sources: List[str]) -> None:
+        """声明某类请求可用的数据源（顺序为健康分相同时的优先级）"""
+        self.routes[kind] = list(sources)
+
+    def candidates(self, kind: str) -> List[str]:
+        """当前可用的数据源：待探测的排最前（否则永远轮不到探测），其余按健康分从优到劣"""
+        sources = [s for s in self.routes.get(kind, []) if self.breakers[s].available()]
+        return sorted(sources, key=lambda s: (not self.breakers[s].probe_due(), self.breakers[s].score()))
+
+    def call(self, source: str, func: Callable, *args, **kwargs):
+        """
+        经熔断器调用数据源
+
+        只有异常记为失败；空结果（None / 空DataFrame）表示该代码没有数据，照常记为成功。
+        数据源熔断时抛出 SourceUnavailable，调用方应换下一个数据源。
+        """
+        breaker = self.breakers[source]
+        function = getattr(func, "__name__", "call").lstrip("_")
+        if not breaker.allow():
+            UPSTREAM_ERRORS.labels(source, function, "circuit_open").inc()
+            raise SourceUnavailable(source)
+        with span(f"source.{source}", **{"source.name": source, "source.function": function}) as current:
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                latency = time.perf_counter() - start
+                breaker.record_failure(latency, f"{type(e).__name__}: {e}")
+                record_upstream(source, function, latency, type(e).__name__)
+                raise
+            latency = time.perf_counter() - start
+            if current is not None:
+                current.set_attribute("source.empty", _is_empty(result))
+        breaker.record_success(latency)
+        record_upstream(source, function, latency)
+        return result
+
+    def first(self, kind: str, handlers: Dict[str, Callable], *args, **kwargs):
+        """按路由顺序依次尝试，返回第一个非空结果（全部失败返回最后一个结果）"""
+        result = None
+        for source in self.candidates(kind):
+            if source not in handlers:
+                continue
+            try:
+                result = self.call(source, handlers[source], *args, **kwargs)
+            except SourceUnavailable:
+                continue
+            except Exception as e:
+                logger.warning(f"数据源 {source} 调用失败: {e}")
+                continue
+            if not _is_empty(result):
+                return result
+        return result
+
+    # ==================== 对冲请求 ====================
+
+    @property
+    def hedge_executor(self) -> ThreadPoolExecutor:
+        # 独立线程池：调用方本身可能运行在上游线程池中，共用会因互相等待而耗尽
+        with self._executor_lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(
+                    max_workers=settings.HEDGE_EXECUTOR_WORKERS,
+                    thread_name_prefix="hedge"
+                )
+            return self._hedge_executor
+
+    def _safe_call(self, source: str, func: Callable, args, kwargs):
+        try:
+            return self.call(source, func, *args, **kwargs)
+        except SourceUnavailable:
+            return None
+        except Exception as e:
+            logger.warning(f"数据源 {source} 调用失败: {e}")
+            return None
+
+    def hedged(self, kind: str, handlers: Dict[str, Callable], *args, **kwargs):
+        """
+        对冲请求：首选数据源超过p95仍未返回时（且预算允许），并发请求次选数据源，
+        先返回非空结果者胜出；首选直接失败时按普通降级立即换下一个数据源。
+        落败的请求在后台跑完，其结果仍计入熔断统计。
+        """
+        sources = [s for s in self.candidates(kind) if s in handlers]
+        if len(sources) < 2:
+            return self.first(kind, handlers, *args, **kwargs)
+
+        self.hedge_budget.on_request()
+        primary, backups = sources[0], sources[1:]
+        pending = {}
+
+        def submit(source: str):
+            # 复制调用方上下文，使对冲线程中的span挂在当前请求的trace下
+            context = contextvars.copy_context()
+            future = self.hedge_executor.submit(context.run, self._safe_call, source, handlers[source], args, kwargs)
+            pending[future] = source
+
+        submit(primary)
+        timeout = max(self.breakers[primary].p95(), settings.HEDGE_MIN_DELAY)
+        hedged = False
+        result = None
+
+        while pending:
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # 首选数据源慢于p95：尝试对冲，之后不再设超时
+                if backups and self.hedge_budget.try_acquire():
+                    logger.debug(f"{kind} 请求对冲: {primary} 超过 {timeout:.2f}s，并发请求 {backups[0]}")
+                    submit(backups.pop(0))
+                    hedged = True
+                timeout = None
+                continue
+
+            for future in done:
+                source = pending.pop(future)
+                value = future.result()
+                if not _is_empty(value):
+                    if hedged and source != primary:
+                        self.hedge_budget.record_win()
+                    return value
+                result = value
+
+            if not pending and backups:
+                submit(backups.pop(0))
+
+        return result
+
+    def snapshot(self) -> Dict:
+        """所有数据源的状态与统计、各请求类型的当前路由顺序，以及对冲预算"""
+        return {
+            'sources': {name: breaker.stats() for name, breaker in self.breakers.items()},
+            'routes': {kind: self.candidates(kind) for kind in self.routes},
+            'hedge': {'enabled': settings.HEDGE_ENABLED, **self.hedge_budget.stats()},
+        }
+
+
+# 全局实例：预期延迟用于冷启动时的排序
+source_router = SourceRouter()
+source_router.register("baostock", expected_latency=0.3)
+source_router.register("akshare_hist", expected_latency=1.5)
+source_router.register("eastmoney_spot", expected_latency=30.0, min_calls=1)
+source_router.register("sina_spot", expected_latency=45.0, min_calls=1)
+source_router.route("spot", ["eastmoney_spot", "sina_spot"])
+source_router.route("quote", ["baostock", "akshare_hist"])
+source_router.route("history", ["baostock", "akshare_hist"])
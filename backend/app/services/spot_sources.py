@@ -0,0 +1,135 @@
+"""
+全市场实时行情直连抓取（东方财富 / 新浪）
+
+替代 ak.stock_zh_a_spot_em / ak.stock_zh_a_spot，通过 upstream_http 异步分页抓取：
+首页拿到总数后，其余分页并发发出（发送节奏由按主机限速控制）。
+
+两个数据源统一输出中文列名的DataFrame：
+    代码, 名称, 最新价, 涨跌幅, 今开, 最高, 最低, 成交量(手), 成交额(元),
+    市盈率-动态, 市净率, 总市值(元), 时间戳
+停牌（无最新价）的股票不在结果中。
+"""
+import asyncio
+import logging
+import math
+from datetime import datetime
+from typing import Dict, List
+
+from app.config import settings
+from app.services.lazy_import import lazy_import
+from app.services.http_client import upstream_http, UpstreamHTTPError
+
+pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+SPOT_COLUMNS = [
+    '代码', '名称', '最新价', '涨跌幅', '今开', '最高', '最低',
+    '成交量', '成交额', '市盈率-动态', '市净率', '总市值', '时间戳'
+]
+_NUMERIC_COLUMNS = SPOT_COLUMNS[2:12]
+
+# ==================== 东方财富 ====================
+
+EM_PAGE_SIZE = 100  # clist接口单页上限
+EM_FIELDS = {
+    'f12': '代码', 'f14': '名称', 'f2': '最新价', 'f3': '涨跌幅', 'f17': '今开',
+    'f15': '最高', 'f16': '最低', 'f5': '成交量', 'f6': '成交额',
+    'f9': '市盈率-动态', 'f23': '市净率', 'f20': '总市值',
+}
+# 沪深京A股
+EM_MARKETS = "m:0 t:6,m:0 t:80,m:1 t:2,m:1 t:23,m:0 t:81 s:2048"
+
+# ==================== 新浪 ====================
+
+SINA_PAGE_SIZE = 80
+SINA_FIELDS = {
+    'code': '代码', 'name': '名称', 'trade': '最新价', 'changepercent': '涨跌幅', 'open': '今开',
+    'high': '最高', 'low': '最低', 'volume': '成交量', 'amount': '成交额',
+    'per': '市盈率-动态', 'pb': '市净率', 'mktcap': '总市值',
+}
+
+
+async def _gather_pages(fetch_page, pages: List[int]) -> List[list]:
+    """并发抓取剩余分页（并发数有界）"""
+    semaphore = asyncio.Semaphore(settings.SPOT_PAGE_CONCURRENCY)
+
+    async def bounded(page: int):
+        async with semaphore:
+            return await fetch_page(page)
+
+    return await asyncio.gather(*[bounded(p) for p in pages])
+
+
+def _to_frame(rows: List[Dict], mapping: Dict[str, str]) -> 'pd.DataFrame':
+    df = pd.DataFrame(rows, columns=list(mapping)).rename(columns=mapping)
+    for col in _NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df = df.dropna(subset=['最新价'])
+    df = df[df['最新价'] > 0]
+    df['成交量'] = df['成交量'].fillna(0)
+    df['时间戳'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return df.drop_duplicates(subset='代码').reset_index(drop=True)[SPOT_COLUMNS]
+
+
+async def fetch_spot_em() -> 'pd.DataFrame':
+    """东方财富沪深京A股实时行情"""
+    url = f"{settings.EASTMONEY_BASE_URL}/api/qt/clist/get"
+
+    async def fetch_page(page: int):
+        params = {
+            'pn': page, 'pz': EM_PAGE_SIZE, 'po': 1, 'np': 1,
+            'ut': 'bd1d9ddb04089700cf9c27f6f7426281',
+            'fltt': 2, 'invt': 2, 'fid': 'f3',
+            'fs': EM_MARKETS, 'fields': ','.join(EM_FIELDS),
+        }
+        payload = await upstream_http.get_json(url, params=params)
+        data = (payload or {}).get('data') or {}
+        return data.get('total', 0), data.get('diff') or []
+
+    total, rows = await fetch_page(1)
+    if not rows:
+        raise UpstreamHTTPError("东方财富行情返回空数据")
+    pages = range(2, math.ceil(total / EM_PAGE_SIZE) + 1)
+    for _, page_rows in await _gather_pages(fetch_page, list(pages)):
+        rows.extend(page_rows)
+
+    return _to_frame(rows, EM_FIELDS)
+
+
+async def fetch_spot_sina() -> 'pd.DataFrame':
+    """新浪沪深A股实时行情（成交量换算为手，总市值换算为元）"""
+    base = f"{settings.SINA_BASE_URL}/quotes_service/api/json_v2.php"
+
+    count_text = await upstream_http.get_text(f"{base}/Market_Center.getHQNodeStockCount", params={'node': 'hs_a'})
+    try:
+        total = int(count_text.strip().strip('"'))
+    except ValueError as e:
+        raise UpstreamHTTPError(f"新浪股票总数解析失败: {count_text[:80]!r}") from e
+
+    async def fetch_page(page: int):
+        params = {
+            'page': page, 'num': SINA_PAGE_SIZE, 'sort': 'symbol', 'asc': 1,
+            'node': 'hs_a', 'symbol': '', '_s_r_a': 'page',
+        }
+        return await upstream_http.get_json(f"{base}/Market_Center.getHQNodeData", params=params) or []
+
+    rows = []
+    for page_rows in await _gather_pages(fetch_page, list(range(1, math.ceil(total / SINA_PAGE_SIZE) + 1))):
+        rows.extend(page_rows)
+    if not rows:
+        raise UpstreamHTTPError("新浪行情返回空数据")
+
+    df = _to_frame(rows, SINA_FIELDS)
+    df['成交量'] = df['成交量'] / 100
+    df['总市值'] = df['总市值'] * 10000
+    return df
+
+
+def fetch_spot_em_sync() -> 'pd.DataFrame':
+    """同步版本（供线程中的DataFetcher/定时任务调用）"""
+    return upstream_http.run(fetch_spot_em())
+
+
+def fetch_spot_sina_sync() -> 'pd.DataFrame':
+    return upstream_http.run(fetch_spot_sina())
@@ -1,12 +1,24 @@
 """
 任务状态管理服务
 
-用于管理异步筛选任务的状态和结果
+用于管理异步筛选任务的状态和结果。
+多进程部署时（见 shared_state）任务存入共享键值存储：任务在创建它的worker中执行，
+任何worker都能查询进度和结果、取消任务。
+共享存储中任务的状态/进度（task:<id>）与结果（task_result:<id>）分开保存：更新进度、列出任务时只读写很小的状态键，
+进度更新按 PROGRESS_INTERVAL 节流；存储读写是同步I/O，async路由使用 a 开头的异步版本（在线程池中执行）。
 """
 from typing import Dict, List, Optional
 from datetime import datetime
 from enum import Enum
+import asyncio
 import logging
+import pickle
+import threading
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from app.services.shared_state import shared_state
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +46,8 @@ class TaskInfo:
         self.processed = 0
         self.status = status
         self.results = []
+        self.result_count = 0  # 共享存储中只加载状态时 results 为空，以此为准
+        self.stages: List[dict] = []  # 漏斗筛选各层的执行情况（StageReport）
         self.error: Optional[str] = None
         self.created_at = datetime.now()
         self.updated_at = datetime.now()
@@ -47,20 +61,85 @@ class TaskInfo:
             "total": self.total,
             "processed": self.processed,
             "status": self.status.value,
-            "result_count": len(self.results),
+            "result_count": self.result_count,
+            "stages": self.stages,
             "error": self.error,
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
             "progress": round(self.processed / self.total * 100, 2) if self.total > 0 else 0
         }
 
+    def meta(self) -> dict:
+        """除结果外的全部字段（共享存储中的状态键）"""
+        return {key: value for key, value in self.__dict__.items() if key != "results"}
+
+    @classmethod
+    def from_meta(cls, meta: dict) -> 'TaskInfo':
+        task = cls.__new__(cls)
+        task.__dict__.update(meta)
+        task.results = []
+        return task
+
 
 class TaskManager:
     """任务管理器"""
 
-    def __init__(self):
-        self.tasks: Dict[str, TaskInfo] = {}
+    STORE_PREFIX = "task:"
+    RESULT_PREFIX = "task_result:"
+    PROGRESS_INTERVAL = 0.5  # 共享存储时进度写入的最小间隔（秒）
+
+    def __init__(self, store=None):
+        self._tasks: Dict[str, TaskInfo] = {}
+        self.store = store  # 共享键值存储，None时只保存在本进程内存中
         self.max_tasks = 100  # 最多保存100个任务
+        self._lock = threading.Lock()  # 本进程内对同一任务的读-改-写串行执行
+        self._progress_lock = threading.Lock()
+        self._pending_progress: Dict[str, int] = {}  # 尚未写入存储的最新进度
+        self._progress_written: Dict[str, float] = {}  # 最近一次写入进度的时间（monotonic）
+        self._progress_flushing = set()
+
+    @property
+    def tasks(self) -> Dict[str, TaskInfo]:
+        """所有任务（共享存储中的任务包括其他worker创建的；只加载状态，不含结果）"""
+        if self.store is None:
+            return self._tasks
+        raw = self.store.get_many(self.store.keys(self.STORE_PREFIX))
+        tasks = {}
+        for value in raw.values():
+            task = TaskInfo.from_meta(pickle.loads(value))
+            tasks[task.task_id] = task
+        return tasks
+
+    def _load(self, task_id: str, with_results: bool = False) -> Optional[TaskInfo]:
+        if self.store is None:
+            return self._tasks.get(task_id)
+        raw = self.store.get(self.STORE_PREFIX + task_id)
+        if raw is None:
+            return None
+        task = TaskInfo.from_meta(pickle.loads(raw))
+        if with_results and task.result_count:
+            results = self.store.get(self.RESULT_PREFIX + task_id)
+            task.results = pickle.loads(results) if results is not None else []
+        return task
+
+    def _save(self, task: TaskInfo, with_results: bool = False) -> None:
+        if self.store is None:
+            self._tasks[task.task_id] = task
+            return
+        if with_results:
+            # 先写结果再写状态：读到 completed 状态时结果已可用
+            self.store.set(self.RESULT_PREFIX + task.task_id,
+                           pickle.dumps(task.results, protocol=pickle.HIGHEST_PROTOCOL))
+        self.store.set(self.STORE_PREFIX + task.task_id, pickle.dumps(task.meta(), protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _delete(self, task_id: str) -> None:
+        with self._progress_lock:
+            self._pending_progress.pop(task_id, None)
+            self._progress_written.pop(task_id, None)
+        if self.store is None:
+            self._tasks.pop(task_id, None)
+        else:
+            self.store.delete(self.STORE_PREFIX + task_id, self.RESULT_PREFIX + task_id)
 
     def create_task(self, task_id: str, criteria: dict, total: int = 0) -> TaskInfo:
         """
@@ -75,20 +154,22 @@ class TaskManager:
             TaskInfo对象
         """
         task = TaskInfo(task_id, criteria, total)
-        self.tasks[task_id] = task
-
-        # 清理旧任务（保持最多max_tasks个）
-        if len(self.tasks) > self.max_tasks:
-            oldest_key = min(self.tasks.keys(), key=lambda k: self.tasks[k].created_at)
-            del self.tasks[oldest_key]
+        self._save(task)
+
+        # 清理旧任务（保持最多max_tasks个；共享存储时先只数键，超出时才读取状态键）
+        count = len(self._tasks) if self.store is None else len(self.store.keys(self.STORE_PREFIX))
+        if count > self.max_tasks:
+            tasks = self.tasks
+            oldest_key = min(tasks.keys(), key=lambda k: tasks[k].created_at)
+            self._delete(oldest_key)
             logger.info(f"清理旧任务: {oldest_key}")
 
         logger.info(f"创建任务: {task_id}, 总数: {total}")
         return task
 
-    def get_task(self, task_id: str) -> Optional[TaskInfo]:
-        """获取任务信息"""
-        return self.tasks.get(task_id)
+    def get_task(self, task_id: str, with_results: bool = True) -> Optional[TaskInfo]:
+        """获取任务信息（with_results=False 时共享存储中只读取状态）"""
+        return self._load(task_id, with_results)
 
     def update_task(
         self,
@@ -97,7 +178,8 @@ class TaskManager:
         total: Optional[int] = None,
         status: Optional[TaskStatus] = None,
         results: Optional[List] = None,
-        error: Optional[str] = None
+        error: Optional[str] = None,
+        stages: Optional[List[dict]] = None
     ) -> bool:
         """
         更新任务状态
@@ -109,27 +191,41 @@ class TaskManager:
             status: 任务状态
             results: 结果列表
             error: 错误信息
+            stages: 漏斗筛选各层的执行情况
 
         Returns:
             是否更新成功
         """
-        task = self.tasks.get(task_id)
-        if not task:
-            logger.warning(f"任务不存在: {task_id}")
-            return False
-
-        if processed is not None:
-            task.processed = processed
-        if total is not None:
-            task.total = total
-        if status is not None:
-            task.status = status
-        if results is not None:
-            task.results = results
-        if error is not None:
-            task.error = error
-
-        task.updated_at = datetime.now()
+        with self._progress_lock:
+            # 合并节流中尚未写入的进度
+            pending = self._pending_progress.pop(task_id, None)
+            if processed is None:
+                processed = pending
+            if status in (TaskStatus.COMPLETED, TaskStatus.FAILED):
+                self._progress_written.pop(task_id, None)
+
+        with self._lock:
+            task = self._load(task_id)
+            if not task:
+                logger.warning(f"任务不存在: {task_id}")
+                return False
+
+            if processed is not None:
+                task.processed = processed
+            if total is not None:
+                task.total = total
+            if status is not None:
+                task.status = status
+            if results is not None:
+                task.results = results
+                task.result_count = len(results)
+            if error is not None:
+                task.error = error
+            if stages is not None:
+                task.stages = stages
+
+            task.updated_at = datetime.now()
+            self._save(task, with_results=results is not None)
 
         logger.debug(
             f"更新任务: {task_id}, "
@@ -140,8 +236,8 @@ class TaskManager:
 
     def delete_task(self, task_id: str) -> bool:
         """删除任务"""
-        if task_id in self.tasks:
-            del self.tasks[task_id]
+        if self._load(task_id) is not None:
+            self._delete(task_id)
             logger.info(f"删除任务: {task_id}")
             return True
         return False
@@ -156,14 +252,16 @@ class TaskManager:
         Returns:
             是否取消成功
         """
-        task = self.tasks.get(task_id)
-        if not task:
-            return False
+        with self._lock:
+            task = self._load(task_id)
+            if not task:
+                return False
 
-        # 标记任务为已取消
-        task.status = TaskStatus.FAILED
-        task.error = "用户取消任务"
-        task.updated_at = datetime.now()
+            # 标记任务为已取消
+            task.status = TaskStatus.FAILED
+            task.error = "用户取消任务"
+            task.updated_at = datetime.now()
+            self._save(task)
 
         logger.info(f"任务已取消: {task_id}")
         return True
@@ -173,12 +271,11 @@ class TaskManager:
         获取当前正在执行的任务
 
         Returns:
-            正在执行的任务，如果没有则返回None
+            最近创建的未完成任务（不含结果），如果没有则返回None
         """
-        for task in self.tasks.values():
-            if task.status in [TaskStatus.PENDING, TaskStatus.PROCESSING]:
-                return task
-        return None
+        active = [task for task in self.tasks.values()
+                  if task.status in [TaskStatus.PENDING, TaskStatus.PROCESSING]]
+        return max(active, key=lambda t: t.created_at) if active else None
 
     def get_all_tasks(self) -> List[dict]:
         """获取所有任务"""
@@ -188,6 +285,71 @@ class TaskManager:
             reverse=True
         )]
 
+    # ==================== 进度节流 ====================
+
+    def report_progress(self, task_id: str, processed: int) -> None:
+        """
+        进度回调（在事件循环中调用，如漏斗的 on_progress）
+
+        共享存储时只记录最新进度，距上次写入超过 PROGRESS_INTERVAL 时在线程池中写入；
+        未写入的进度在下一次 update_task 时一并写入。
+        """
+        if self.store is None:
+            self.update_task(task_id, processed=processed)
+            return
+        now = time.monotonic()
+        with self._progress_lock:
+            self._pending_progress[task_id] = processed
+            if task_id in self._progress_flushing or now - self._progress_written.get(task_id, 0) < self.PROGRESS_INTERVAL:
+                return
+            self._progress_flushing.add(task_id)
+            self._progress_written[task_id] = now
+        asyncio.get_running_loop().run_in_executor(None, self._flush_progress, task_id)
+
+    def _flush_progress(self, task_id: str) -> None:
+        try:
+            with self._progress_lock:
+                processed = self._pending_progress.pop(task_id, None)
+            if processed is not None:
+                self.update_task(task_id, processed=processed)
+        except Exception as e:
+            logger.warning(f"写入任务进度失败: {task_id}: {e}")
+        finally:
+            with self._progress_lock:
+                self._progress_flushing.discard(task_id)
+
+    # ==================== 异步版本 ====================
+    # 供async路由使用：共享存储的读写在线程池中执行，只在内存中时直接调用
+
+    async def _run(self, func, *args, **kwargs):
+        if self.store is None:
+            return func(*args, **kwargs)
+        return await run_in_threadpool(func, *args, **kwargs)
+
+    async def acreate_task(self, task_id: str, criteria: dict, total: int = 0) -> TaskInfo:
+        """create_task 的异步版本"""
+        return await self._run(self.create_task, task_id, criteria, total)
+
+    async def aget_task(self, task_id: str, with_results: bool = True) -> Optional[TaskInfo]:
+        """get_task 的异步版本"""
+        return await self._run(self.get_task, task_id, with_results)
+
+    async def aupdate_task(self, task_id: str, **changes) -> bool:
+        """update_task 的异步版本"""
+        return await self._run(self.update_task, task_id, **changes)
+
+    async def acancel_task(self, task_id: str) -> bool:
+        """cancel_task 的异步版本"""
+        return await self._run(self.cancel_task, task_id)
+
+    async def aget_active_task(self) -> Optional[TaskInfo]:
+        """get_active_task 的异步版本"""
+        return await self._run(self.get_active_task)
+
+    async def aget_all_tasks(self) -> List[dict]:
+        """get_all_tasks 的异步版本"""
+        return await self._run(self.get_all_tasks)
+
 
 # 创建全局实例
-task_manager = TaskManager()
+task_manager = TaskManager(store=shared_state.store if shared_state.enabled else None)
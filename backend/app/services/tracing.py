@@ -0,0 +1,211 @@
+"""
+链路追踪（OpenTelemetry）
+
+热点路径上的span：筛选单股 fetch_stock_data、每次数据源调用（SourceRouter.call）、
+bs_lock 等锁的获取等待、PE计算、数据库会话。用于回答"慢筛选的时间花在哪里"。
+
+- TRACING_EXPORTER=none（默认）：不安装TracerProvider，span为OpenTelemetry的非记录span，开销可忽略
+- TRACING_EXPORTER=console：span打印到标准输出
+- TRACING_EXPORTER=file：每个span一行JSON写入 TRACING_FILE（OTLP字段名，可用jq分析）
+
+opentelemetry-sdk 为可选依赖，未安装时 span() 为空操作。
+锁等待时间同时写入span属性 lock.wait_ms 和指标 lock_wait_seconds。
+"""
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Sequence
+
+from app.config import settings
+from app.services.metrics import LOCK_WAIT
+
+try:
+    from opentelemetry import trace
+except ImportError:  # opentelemetry为可选依赖，缺失时不追踪
+    trace = None
+
+logger = logging.getLogger(__name__)
+
+TRACER_NAME = "stock-analysis"
+
+_configured = False
+
+
+def _file_exporter(path: str):
+    from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+    class JsonLinesSpanExporter(SpanExporter):
+        """每个span一行JSON"""
+
+        def __init__(self, path: str):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8")
+            self._lock = threading.Lock()
+
+        def export(self, spans: Sequence) -> "SpanExportResult":
+            lines = [json.dumps(json.loads(span.to_json()), ensure_ascii=False) for span in spans]
+            with self._lock:
+                self._file.write("\n".join(lines) + "\n")
+                self._file.flush()
+            return SpanExportResult.SUCCESS
+
+        def shutdown(self) -> None:
+            with self._lock:
+                self._file.close()
+
+    return JsonLinesSpanExporter(path)
+
+
+def setup_tracing(exporter: Optional[str] = None) -> bool:
+    """按配置安装TracerProvider（重复调用无效），返回是否启用"""
+    global _configured
+    exporter = (exporter or settings.TRACING_EXPORTER).lower()
+    if _configured or exporter == "none":
+        return _configured
+    if trace is None:
+        logger.warning("未安装opentelemetry-sdk，链路追踪未启用")
+        return False
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    if exporter == "console":
+        span_exporter = ConsoleSpanExporter()
+    elif exporter == "file":
+        span_exporter = _file_exporter(settings.TRACING_FILE)
+    else:
+        raise ValueError(f"不支持的TRACING_EXPORTER: {exporter}")
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": TRACER_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO)),
+    )
+    provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(provider)
+    _configured = True
+    logger.info(f"链路追踪已启用: {exporter}")
+    return True
+
+
+def shutdown_tracing() -> None:
+    """刷出未导出的span"""
+    if _configured:
+        trace.get_tracer_provider().shutdown()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    在当前上下文中开启子span；异常会记录到span并继续抛出。
+
+    属性值为None的项会被忽略（OpenTelemetry不接受None）。
+    """
+    if trace is None:
+        yield None
+        return
+    attrs = {k: v for k, v in attributes.items() if v is not None}
+    with trace.get_tracer(TRACER_NAME).start_as_current_span(name, attributes=attrs) as current:
+        yield current
+
+
+def set_attributes(**attributes) -> None:
+    """给当前span追加属性"""
+    if trace is None:
+        return
+    current = trace.get_current_span()
+    if current.is_recording():
+        current.set_attributes({k: v for k, v in attributes.items() if v is not None})
+
+
+def traced(name: str):
+    """装饰器：函数调用包在名为name的span中（支持async函数）"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_sessions(session_factory) -> None:
+    """
+    数据库会话span：从事务开始（首次执行SQL）到提交/回滚/关闭
+
+    span不设为当前span（会话可能跨越多个调用），父span为事务开始时的当前span；
+    属性 db.queries 为事务内执行的ORM查询数（不含flush产生的写语句），db.outcome 为 commit / rollback。
+    """
+    if trace is None:
+        return
+    from sqlalchemy import event
+
+    tracer = trace.get_tracer(TRACER_NAME)
+
+    @event.listens_for(session_factory, "after_begin")
+    def _begin(session, transaction, connection):
+        if transaction.parent is None and "trace_span" not in session.info:
+            session.info["trace_span"] = tracer.start_span(
+                "db.session", attributes={"db.system": connection.dialect.name}
+            )
+
+    @event.listens_for(session_factory, "do_orm_execute")
+    def _execute(orm_execute_state):
+        # 先于after_begin触发（执行时才开启事务），计数在事务结束时清零
+        info = orm_execute_state.session.info
+        info["trace_queries"] = info.get("trace_queries", 0) + 1
+
+    @event.listens_for(session_factory, "after_commit")
+    def _commit(session):
+        if "trace_span" in session.info:
+            session.info["trace_outcome"] = "commit"
+
+    @event.listens_for(session_factory, "after_transaction_end")
+    def _end(session, transaction):
+        if transaction.parent is not None:
+            return
+        current = session.info.pop("trace_span", None)
+        queries = session.info.pop("trace_queries", 0)
+        if current is None:
+            return
+        current.set_attribute("db.queries", queries)
+        current.set_attribute("db.outcome", session.info.pop("trace_outcome", "rollback"))
+        current.end()
+
+
+@contextmanager
+def traced_lock(lock, name: str):
+    """
+    获取锁并记录等待时间
+
+    先尝试非阻塞获取：未争用时只记一次指标，不产生span；
+    被占用时在 "<name>.wait" span中阻塞等待，等待时间记入span属性和 lock_wait_seconds。
+    """
+    if lock.acquire(blocking=False):
+        LOCK_WAIT.labels(name).observe(0.0)
+    else:
+        start = time.perf_counter()
+        with span(f"{name}.wait", **{"lock.name": name}) as wait_span:
+            lock.acquire()
+            waited = time.perf_counter() - start
+            if wait_span is not None:
+                wait_span.set_attribute("lock.wait_ms", round(waited * 1000, 3))
+        LOCK_WAIT.labels(name).observe(waited)
+        set_attributes(**{"lock.wait_ms": round(waited * 1000, 3)})
+    try:
+        yield
+    finally:
+        lock.release()
@@ -0,0 +1,202 @@
+"""
+A股交易日历与按交易时段的刷新调度
+
+交易时段 09:30–11:30、13:00–15:00（北京时间），交易日取自新浪交易日历（ak.tool_trade_date_hist_sina，
+含当年全部节假日安排），缓存在 TRADING_CALENDAR_FILE，由上游进程每周更新；日历缺失或未覆盖的日期按工作日处理。
+
+全市场行情的刷新时机（ENABLE_SCHEDULER=true 时，见 DataFetcher.spot_refresh_due）：
+
+- 交易时段内：每 SPOT_SESSION_SECONDS 秒
+- 午休开始、收盘后 SPOT_CLOSE_DELAY_SECONDS 秒：各刷新一次，取得上午收盘/全天收盘数据
+- 其余时间（盘前、午休、夜间、周末和节假日）：不刷新；进程刚启动还没有行情时刷新一次
+
+股票列表在交易日 09:00 至收盘之间每 UPDATE_INTERVAL_MINUTES 分钟刷新；日线和PE/PB由采集进程在交易日收盘后更新。
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time as _time
+from datetime import date, datetime, time, timedelta
+from typing import FrozenSet, Optional
+from zoneinfo import ZoneInfo
+
+from app.config import settings
+from app.services.lazy_import import lazy_import
+
+ak = lazy_import("akshare")
+
+logger = logging.getLogger(__name__)
+
+TZ = ZoneInfo("Asia/Shanghai")
+
+# 连续竞价时段
+SESSIONS = ((time(9, 30), time(11, 30)), (time(13, 0), time(15, 0)))
+
+# 股票列表在交易日的刷新窗口起点（早于开盘，便于当天新股进入列表）
+UNIVERSE_WINDOW_START = time(9, 0)
+
+# 日历文件超过该天数后重新获取（节假日安排按年公布，每周检查一次足够）
+_REFRESH_DAYS = 7
+# 获取失败后的重试间隔
+_RETRY_SECONDS = 3600
+# 重新读取日历文件（其他进程可能已更新）的间隔
+_RELOAD_SECONDS = 60
+
+
+class TradingCalendar:
+    """交易日历（文件缓存）与交易时段判断"""
+
+    def __init__(self, path: str):
+        self.use(path)
+        self._lock = threading.Lock()
+
+    def use(self, path: str) -> None:
+        """改用另一个日历文件（清空已加载的日历，如模拟器改用临时文件）"""
+        self.path = path
+        self._days: FrozenSet[date] = frozenset()
+        self._range: Optional[tuple] = None  # 日历覆盖的 (首日, 末日)
+        self._updated_at: Optional[float] = None  # 日历获取时间
+        self._mtime: Optional[int] = None
+        self._next_reload = 0.0
+        self._next_attempt = 0.0
+
+    # ==================== 日历 ====================
+
+    def _reload(self) -> None:
+        """日历文件有变化时重新读取（按间隔检查）"""
+        tick = _time.monotonic()
+        if tick < self._next_reload:
+            return
+        self._next_reload = tick + _RELOAD_SECONDS
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取交易日历失败: {e}")
+            return
+        days = frozenset(date.fromisoformat(day) for day in data['days'])
+        self._days, self._range = days, ((min(days), max(days)) if days else None)
+        self._updated_at = data.get('updated_at')
+        self._mtime = mtime
+
+    def needs_refresh(self) -> bool:
+        """日历缺失、未覆盖今天或已超过一周未更新（失败后每小时最多重试一次）"""
+        if _time.monotonic() < self._next_attempt:
+            return False
+        self._reload()
+        if self._range is None or self._range[1] < now().date():
+            return True
+        return self._updated_at is None or _time.time() - self._updated_at > _REFRESH_DAYS * 86400
+
+    def refresh(self) -> bool:
+        """从上游获取交易日历并写入缓存文件"""
+        with self._lock:
+            self._next_attempt = _time.monotonic() + _RETRY_SECONDS
+            try:
+                df = ak.tool_trade_date_hist_sina()
+                days = sorted({str(day)[:10] for day in df['trade_date']})
+            except Exception as e:
+                logger.warning(f"获取交易日历失败（按工作日处理）: {e}")
+                return False
+            if not days:
+                return False
+
+            data = {'updated_at': _time.time(), 'days': days}
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix=".trade_calendar.")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f)
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            self._next_reload = 0.0
+            logger.info(f"✅ 交易日历已更新: {days[0]} ~ {days[-1]}，共 {len(days)} 个交易日")
+            return True
+
+    def is_trading_day(self, day: date) -> bool:
+        self._reload()
+        if self._range is not None and self._range[0] <= day <= self._range[1]:
+            return day in self._days
+        return day.weekday() < 5  # 日历未覆盖：按工作日处理
+
+    # ==================== 交易时段 ====================
+
+    def in_session(self, at: Optional[datetime] = None) -> bool:
+        at = at or now()
+        if not self.is_trading_day(at.date()):
+            return False
+        return any(start <= at.time() < end for start, end in SESSIONS)
+
+    def last_close(self, at: Optional[datetime] = None) -> Optional[datetime]:
+        """at 之前最近一次 午休开始/收盘 + SPOT_CLOSE_DELAY_SECONDS 的时间点"""
+        at = at or now()
+        delay = timedelta(seconds=settings.SPOT_CLOSE_DELAY_SECONDS)
+        for offset in range(30):  # 最长的节假日也不超过两周
+            day = at.date() - timedelta(days=offset)
+            if not self.is_trading_day(day):
+                continue
+            for _, end in reversed(SESSIONS):
+                point = datetime.combine(day, end, tzinfo=TZ) + delay
+                if point <= at:
+                    return point
+        return None
+
+    # ==================== 刷新调度 ====================
+
+    def spot_refresh_due(self, refreshed_at: Optional[float], attempted_at: Optional[float] = None,
+                         at: Optional[datetime] = None) -> bool:
+        """
+        全市场行情是否需要刷新
+
+        Args:
+            refreshed_at: 当前行情的获取时间（时间戳），没有行情时为None
+            attempted_at: 最近一次尝试刷新的时间（失败也算），用于限制重试频率
+        """
+        at = at or now()
+        ts = at.timestamp()
+        if attempted_at is not None and ts - attempted_at < settings.SPOT_SESSION_SECONDS:
+            return False
+        if refreshed_at is None:
+            return True
+        if self.in_session(at):
+            return ts - refreshed_at >= settings.SPOT_SESSION_SECONDS
+        close = self.last_close(at)
+        return close is not None and refreshed_at < close.timestamp()
+
+    def universe_refresh_due(self, refreshed_at: Optional[float], at: Optional[datetime] = None) -> bool:
+        """股票列表是否需要刷新：没有列表时，或交易日 09:00 至收盘之间超过 UPDATE_INTERVAL_MINUTES"""
+        if refreshed_at is None:
+            return True
+        at = at or now()
+        if at.timestamp() - refreshed_at < settings.UPDATE_INTERVAL_MINUTES * 60:
+            return False
+        return self.is_trading_day(at.date()) and UNIVERSE_WINDOW_START <= at.time() < SESSIONS[-1][1]
+
+    def status(self) -> dict:
+        self._reload()
+        at = now()
+        return {
+            'trading_day': self.is_trading_day(at.date()),
+            'in_session': self.in_session(at),
+            'calendar': f"{self._range[0]} ~ {self._range[1]}" if self._range else None,
+            'updated_at': datetime.fromtimestamp(self._updated_at, TZ).isoformat() if self._updated_at else None,
+        }
+
+
+def now() -> datetime:
+    """当前北京时间"""
+    return datetime.now(TZ)
+
+
+# 全局实例
+trading_calendar = TradingCalendar(settings.TRADING_CALENDAR_FILE)
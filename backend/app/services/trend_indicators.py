@@ -0,0 +1,120 @@
+"""
+趋势指标（漏斗筛选第2层）
+
+由本地日线计算，判断股票是否处于上升趋势的初期（第2层筛选条件，见 docs/04_专家审查报告.md）：
+
+- MA20 > MA100：中期趋势向上
+- 近20个交易日涨幅 > -5%：允许小幅回调
+- 5日均量 > 20日均量：成交量放大
+
+指标按列批量计算：输入为 交易日 × 股票 的收盘价/成交量矩阵（价格面板的视图，或日线长表透视后的矩阵），
+停牌日为NaN。最近 MA_LONG 个交易日中有效收盘价不足 MIN_BARS 个（上市时间短、长期停牌）的股票指标为空，
+不通过趋势筛选。
+"""
+import warnings
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+MA_SHORT = 20
+MA_LONG = 100
+CHANGE_DAYS = 20
+VOLUME_SHORT = 5
+VOLUME_LONG = 20
+MIN_BARS = 90
+
+CHANGE_MIN = -5.0  # 近20日涨幅下限（%）
+VOLUME_RATIO_MIN = 1.0  # 5日均量 / 20日均量
+
+# 从日线存储读取的回溯自然日数（覆盖 MA_LONG 个交易日）
+LOOKBACK_DAYS = 200
+
+FIELDS = ("ma20", "ma100", "change20d", "volume_ratio")
+
+
+def compute(close, volume) -> Dict[str, np.ndarray]:
+    """
+    按列计算趋势指标
+
+    Args:
+        close / volume: 交易日 × 股票 矩阵（日期升序），只使用最近 MA_LONG 行
+
+    Returns:
+        {ma20, ma100, change20d(%), volume_ratio}，每只股票一个值，数据不足为NaN
+    """
+    close = np.asarray(close[-MA_LONG:], dtype=np.float64)
+    volume = np.asarray(volume[-MA_LONG:], dtype=np.float64)
+    if close.size == 0:
+        return {name: np.full(close.shape[1], np.nan) for name in FIELDS}
+
+    columns = np.arange(close.shape[1])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # 全NaN列求均值、成交量为0时除零
+        ma_short = np.nanmean(close[-MA_SHORT:], axis=0)
+        ma_long = np.nanmean(close, axis=0)
+
+        # 近N日涨幅：窗口内第一个和最后一个有效收盘价（跳过停牌日）
+        recent = close[-(CHANGE_DAYS + 1):]
+        valid = ~np.isnan(recent)
+        first = recent[valid.argmax(axis=0), columns]
+        last = recent[len(recent) - 1 - valid[::-1].argmax(axis=0), columns]
+        change = (last / first - 1) * 100
+
+        volume_ratio = np.nanmean(volume[-VOLUME_SHORT:], axis=0) / np.nanmean(volume[-VOLUME_LONG:], axis=0)
+
+    enough = np.count_nonzero(~np.isnan(close), axis=0) >= MIN_BARS
+    return {
+        name: np.where(enough, values, np.nan)
+        for name, values in zip(FIELDS, (ma_short, ma_long, change, volume_ratio))
+    }
+
+
+def passes(indicators: Dict[str, Optional[float]]) -> bool:
+    """是否满足趋势条件（指标为空时不满足）"""
+    ma20, ma100, change, ratio = (indicators.get(name) for name in FIELDS)
+    if ma20 is None or ma100 is None or change is None or ratio is None:
+        return False
+    return ma20 > ma100 and change > CHANGE_MIN and ratio > VOLUME_RATIO_MIN
+
+
+def _records(codes, values: Dict[str, np.ndarray]) -> Dict[str, Dict]:
+    """按列的指标 -> {代码: {指标: 值}}，NaN转为None"""
+    records = {}
+    for j, code in enumerate(codes):
+        record = {}
+        for name in FIELDS:
+            value = float(values[name][j])
+            record[name] = None if np.isnan(value) else round(value, 4)
+        records[code] = record
+    return records
+
+
+def from_panel(codes: Iterable[str]) -> Dict[str, Dict]:
+    """价格面板中已有股票的指标（面板不存在时为空）"""
+    from app.services.price_panel import price_panel
+
+    try:
+        present = [code for code in codes if price_panel.has_code(code)]
+    except FileNotFoundError:
+        return {}
+    if not present:
+        return {}
+    positions = [price_panel.code_index(code) for code in present]
+    close = price_panel.last("close", MA_LONG)[:, positions]
+    volume = price_panel.last("volume", MA_LONG)[:, positions]
+    return _records(present, compute(close, volume))
+
+
+def from_store(codes: Iterable[str]) -> Dict[str, Dict]:
+    """日线存储中已有股票的指标（按代码批量查询最近 LOOKBACK_DAYS 天）"""
+    from app.services.bar_store import bar_store
+
+    start = (datetime.now() - timedelta(days=LOOKBACK_DAYS)).strftime("%Y-%m-%d")
+    bars = bar_store.load_all(start_date=start, codes=codes)
+    if bars.empty:
+        return {}
+    close = bars.pivot(index='trade_date', columns='stock_code', values='close').sort_index()
+    volume = bars.pivot(index='trade_date', columns='stock_code', values='volume') \
+        .reindex(index=close.index, columns=close.columns)
+    return _records(list(close.columns), compute(close.to_numpy(), volume.to_numpy()))
@@ -0,0 +1,109 @@
+"""
+启动预热与就绪检查
+
+导入 app.main 时不再联网、不再导入akshare/pandas，API可以立即开始监听；
+重量级库导入和baostock登录放到后台预热线程中完成（未预热完成时首次使用也会按需完成）。
+
+- 存活 /health：进程在运行即可
+- 就绪 /health/ready：数据库可用且预热已结束（上游登录失败不影响就绪，按需重试并由熔断器处理）
+"""
+import importlib
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# 预热导入的库（按耗时从大到小）
+WARMUP_MODULES = ("akshare", "baostock", "pandas")
+
+
+class Warmup:
+    """后台预热任务"""
+
+    def __init__(self):
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.steps: Dict[str, Dict] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def start(self) -> None:
+        """启动预热线程（重复调用无效）"""
+        if self._thread is not None:
+            return
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def _step(self, name: str, func) -> None:
+        start = time.perf_counter()
+        try:
+            result = func()
+            ok = result is not False
+            error = None
+        except Exception as e:
+            ok, error = False, f"{type(e).__name__}: {e}"
+        self.steps[name] = {
+            'ok': ok,
+            'seconds': round(time.perf_counter() - start, 3),
+            'error': error,
+        }
+
+    def _run(self) -> None:
+        from app.services.data_fetcher import data_fetcher
+        from app.services.pe_pb_calculator import pe_pb_calculator
+
+        for module in WARMUP_MODULES:
+            self._step(f"import:{module}", lambda m=module: importlib.import_module(m))
+        if not data_fetcher.read_only:  # 只读API进程不访问上游
+            self._step("baostock_login", data_fetcher.ensure_baostock_login)
+            self._step("pe_calculator_login", pe_pb_calculator.ensure_login)
+        self.finished_at = time.time()
+        logger.info(f"启动预热完成，耗时 {self.finished_at - self.started_at:.2f}s: {self.steps}")
+
+    def state(self) -> Dict:
+        return {
+            'finished': self.finished,
+            'seconds': round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else None,
+            'steps': dict(self.steps),
+        }
+
+
+def _check_database() -> Tuple[bool, Optional[str]]:
+    from app.database import engine
+
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return True, None
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}"
+
+
+def readiness() -> Tuple[bool, Dict]:
+    """就绪状态：(是否就绪, 明细)"""
+    from app.services.data_fetcher import data_fetcher
+    from app.services.shared_state import shared_state
+    from app.services.trading_calendar import trading_calendar
+
+    db_ok, db_error = _check_database()
+    ready = db_ok and (warmup.finished or warmup.started_at is None)
+    return ready, {
+        'status': 'ready' if ready else 'not_ready',
+        'database': {'ok': db_ok, 'error': db_error},
+        'warmup': warmup.state(),
+        'baostock_logged_in': data_fetcher.bs_logged_in,
+        'shared_state': shared_state.status(),
+        'trading_calendar': trading_calendar.status(),
+    }
+
+
+# 全局实例
+warmup = Warmup()
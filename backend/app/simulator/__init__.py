@@ -0,0 +1,162 @@
+"""
+本地上游模拟器 - 离线、可复现的压测与回归测试
+
+用合成的5000只股票市场替代所有外部数据源：
+- baostock: 替换 bs.login / query_history_k_data_plus / query_profit_data
+- 东方财富/新浪: 本地HTTP服务模拟全市场行情和日K线接口
+  - 直连抓取（spot_sources）通过 EASTMONEY_BASE_URL / SINA_BASE_URL 指向模拟服务
+  - akshare内部的requests请求按主机重定向到模拟服务（仅在模拟器安装期间生效）
+- ak.stock_info_a_code_name: 返回合成股票列表
+- ak.tool_trade_date_hist_sina: 返回合成交易日历（工作日），缓存到临时文件，不覆盖 TRADING_CALENDAR_FILE
+
+延迟、长尾、错误率、限流比例均可配置（见 SimulatorConfig，环境变量 SIM_*）。
+
+用法（安装前后导入 data_fetcher 均可，baostock在首次使用时登录）:
+
+    from app.simulator import install
+    sim = install(SimulatorConfig(latency_ms=50, error_rate=0.02))
+    ...
+    sim.uninstall()
+
+命令行:
+    python -m app.simulator serve --port 9100   # 只启动模拟HTTP服务
+    python -m app.simulator app --port 8000     # 启动后端API，所有上游指向模拟器
+"""
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from typing import Dict, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+import akshare as ak
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.config import settings
+from app.simulator.baostock_fake import FakeBaostock
+from app.simulator.http_server import SimulatorServer
+from app.simulator.market import FaultInjector, SimulatorConfig, SyntheticMarket
+
+logger = logging.getLogger(__name__)
+
+# 重定向到模拟服务的上游主机后缀
+REDIRECT_HOSTS = ("eastmoney.com", "sina.com.cn")
+
+__all__ = ["SimulatorConfig", "SyntheticMarket", "FaultInjector", "UpstreamSimulator", "install"]
+
+
+class _RedirectAdapter(HTTPAdapter):
+    """把请求的scheme和主机改写为模拟服务地址，路径和查询参数保持不变"""
+
+    def __init__(self, base_url: str):
+        super().__init__()
+        self.base = urlsplit(base_url)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = urlunsplit((self.base.scheme, self.base.netloc, parts.path, parts.query, ""))
+        return super().send(request, **kwargs)
+
+
+class UpstreamSimulator:
+    """模拟器句柄：持有合成市场、故障注入器和HTTP服务，负责安装与还原"""
+
+    def __init__(self, config: Optional[SimulatorConfig] = None):
+        self.config = config or SimulatorConfig.from_env()
+        self.market = SyntheticMarket(self.config)
+        self.faults = FaultInjector(self.config)
+        self.server = SimulatorServer(self.market, self.faults)
+        self.baostock = FakeBaostock(self.market, self.faults)
+        self._saved: Dict[str, object] = {}
+        self._calendar_dir: Optional[str] = None
+        self.installed = False
+
+    @property
+    def base_url(self) -> str:
+        return self.server.base_url
+
+    def install(self) -> "UpstreamSimulator":
+        from app.services.http_client import upstream_http
+        from app.services.trading_calendar import trading_calendar
+
+        self.server.start()
+        self.baostock.install()
+
+        self._saved = {
+            'EASTMONEY_BASE_URL': settings.EASTMONEY_BASE_URL,
+            'SINA_BASE_URL': settings.SINA_BASE_URL,
+            'intervals': dict(upstream_http.limiter.intervals),
+            'get_adapter': requests.Session.get_adapter,
+            'stock_info_a_code_name': ak.stock_info_a_code_name,
+            'tool_trade_date_hist_sina': ak.tool_trade_date_hist_sina,
+            'TRADING_CALENDAR_FILE': settings.TRADING_CALENDAR_FILE,
+        }
+        settings.EASTMONEY_BASE_URL = self.base_url
+        settings.SINA_BASE_URL = self.base_url
+
+        # 合成交易日历只写入临时目录，真实部署的日历文件不被覆盖
+        self._calendar_dir = tempfile.mkdtemp(prefix="stock-sim-calendar-")
+        settings.TRADING_CALENDAR_FILE = os.path.join(self._calendar_dir, "trade_calendar.json")
+        trading_calendar.use(settings.TRADING_CALENDAR_FILE)
+
+        # 按主机限速对模拟服务没有意义；respect_rate_limits=True 时保留真实主机的节奏
+        limiter = upstream_http.limiter
+        limiter.intervals[self.server.host] = 0.0
+        if not self.config.respect_rate_limits:
+            for host in REDIRECT_HOSTS:
+                limiter.intervals[host] = 0.0
+
+        adapter = _RedirectAdapter(self.base_url)
+        original_get_adapter = self._saved['get_adapter']
+
+        def get_adapter(session, url):
+            host = urlsplit(url).hostname or ""
+            if host.endswith(REDIRECT_HOSTS):
+                return adapter
+            return original_get_adapter(session, url)
+
+        requests.Session.get_adapter = get_adapter
+        ak.stock_info_a_code_name = self.market.stock_list
+        ak.tool_trade_date_hist_sina = self.market.trade_dates
+
+        # data_fetcher 已登录过真实baostock（或登录失败、处于重试间隔内）时，重新登录到模拟器
+        fetcher_module = sys.modules.get("app.services.data_fetcher")
+        if fetcher_module is not None and fetcher_module.data_fetcher._login_attempt_at is not None:
+            fetcher_module.data_fetcher._login_baostock()
+
+        self.installed = True
+        logger.info(f"上游模拟器已启动: {self.base_url}（{len(self.market.codes)} 只股票）")
+        return self
+
+    def uninstall(self) -> None:
+        if not self.installed:
+            return
+        from app.services.http_client import upstream_http
+        from app.services.trading_calendar import trading_calendar
+
+        settings.EASTMONEY_BASE_URL = self._saved['EASTMONEY_BASE_URL']
+        settings.SINA_BASE_URL = self._saved['SINA_BASE_URL']
+        settings.TRADING_CALENDAR_FILE = self._saved['TRADING_CALENDAR_FILE']
+        trading_calendar.use(settings.TRADING_CALENDAR_FILE)
+        shutil.rmtree(self._calendar_dir, ignore_errors=True)
+        upstream_http.limiter.intervals = self._saved['intervals']
+        requests.Session.get_adapter = self._saved['get_adapter']
+        ak.stock_info_a_code_name = self._saved['stock_info_a_code_name']
+        ak.tool_trade_date_hist_sina = self._saved['tool_trade_date_hist_sina']
+        self.baostock.uninstall()
+        self.server.stop()
+        self.installed = False
+
+    def stats(self) -> Dict:
+        return {
+            'base_url': self.base_url,
+            'faults': dict(self.faults.counts),
+            'baostock_calls': self.baostock.calls,
+        }
+
+
+def install(config: Optional[SimulatorConfig] = None) -> UpstreamSimulator:
+    """创建并安装模拟器"""
+    return UpstreamSimulator(config).install()
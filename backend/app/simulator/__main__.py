@@ -0,0 +1,56 @@
+"""
+上游模拟器命令行
+
+    python -m app.simulator serve [--host 127.0.0.1] [--port 9100]
+        只运行模拟HTTP服务（东方财富/新浪接口），供外部进程使用
+
+    python -m app.simulator app [--port 8000]
+        在同一进程中安装模拟器（baostock + HTTP + akshare重定向）并启动后端API
+
+    python -m app.simulator ingest [--once spot]
+        在同一进程中安装模拟器并运行独立采集进程（app.ingest），其余参数传给采集进程
+
+延迟/错误率等通过环境变量配置，例如:
+    SIM_LATENCY_MS=80 SIM_ERROR_RATE=0.05 SIM_TAIL_RATE=0.01 python -m app.simulator app
+"""
+import argparse
+import os
+import sys
+
+import uvicorn
+
+from app.config import settings
+from app.simulator import install
+from app.simulator.http_server import serve
+from app.simulator.market import FaultInjector, SimulatorConfig, SyntheticMarket
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地上游数据源模拟器")
+    parser.add_argument("mode", choices=["serve", "app", "ingest"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None)
+    args, rest = parser.parse_known_args()
+
+    config = SimulatorConfig.from_env()
+    if args.mode == "serve":
+        serve(SyntheticMarket(config), FaultInjector(config), args.host, args.port or 9100)
+        return
+
+    if args.mode == "ingest":
+        install(config)
+        from app.ingest import main as ingest_main
+
+        sys.exit(ingest_main(rest))
+
+    if rest:
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+    os.makedirs(os.path.dirname(settings.LOG_FILE) or ".", exist_ok=True)
+    install(config)
+    from app.main import app
+
+    uvicorn.run(app, host=args.host, port=args.port or settings.API_PORT)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+baostock 查询函数模拟
+
+替换 baostock 模块上的 login / logout / query_history_k_data_plus / query_profit_data，
+返回与真实 ResultData 接口一致的对象（error_code、error_msg、fields、next()、get_row_data()），
+数据来自 SyntheticMarket。baostock是阻塞的socket协议，模拟延迟同样用阻塞sleep。
+"""
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import baostock as bs
+import pandas as pd
+
+from app.simulator.market import FaultInjector, SyntheticMarket, resample_bars
+
+PATCHED_FUNCTIONS = ("login", "logout", "query_history_k_data_plus", "query_profit_data")
+
+PROFIT_FIELDS = ["code", "pubDate", "statDate", "roeAvg", "npMargin", "gpMargin",
+                 "netProfit", "epsTTM", "MBRevenue", "totalShare", "liqaShare"]
+
+FREQUENCY_RULES = {"d": None, "w": "W-FRI", "m": "M"}
+
+
+class FakeResultData:
+    """与 baostock.data.resultset.ResultData 相同的遍历接口"""
+
+    def __init__(self, error_code: str = "0", error_msg: str = "success",
+                 fields: List[str] = None, data: List[List[str]] = None):
+        self.error_code = error_code
+        self.error_msg = error_msg
+        self.fields = fields or []
+        self.data = data or []
+        self._row = -1
+
+    def next(self) -> bool:
+        self._row += 1
+        return self._row < len(self.data)
+
+    def get_row_data(self) -> List[str]:
+        return self.data[self._row]
+
+    def get_data(self) -> pd.DataFrame:
+        return pd.DataFrame(self.data, columns=self.fields)
+
+
+class FakeBaostock:
+    """把 baostock 模块的查询函数替换为合成数据"""
+
+    def __init__(self, market: SyntheticMarket, faults: FaultInjector):
+        self.market = market
+        self.faults = faults
+        self._originals: Dict[str, object] = {}
+        self.calls = 0
+
+    def _begin(self):
+        """抽样延迟和结果；出错时返回错误ResultData"""
+        self.calls += 1
+        outcome, latency = self.faults.sample()
+        if latency:
+            time.sleep(latency)
+        if outcome != FaultInjector.OK:
+            return FakeResultData(error_code="10002007", error_msg="网络接收错误。")
+        return None
+
+    # ==================== 模拟的 bs.* 函数 ====================
+
+    def login(self, *args, **kwargs):
+        return FakeResultData(error_msg="login success!")
+
+    def logout(self, *args, **kwargs):
+        return FakeResultData(error_msg="logout success!")
+
+    def query_history_k_data_plus(self, code, fields, start_date=None, end_date=None,
+                                  frequency="d", adjustflag="3"):
+        error = self._begin()
+        if error:
+            return error
+        field_list = [f.strip() for f in fields.split(",")]
+        symbol = code.split(".", 1)[-1]
+        if not self.market.has_code(symbol):
+            return FakeResultData(fields=field_list)
+
+        df = self.market.bars_between(symbol, start_date, end_date)
+        rule = FREQUENCY_RULES.get(frequency)
+        if rule and not df.empty:
+            df = resample_bars(df, rule)
+        df = df.assign(code=code)
+
+        missing = [f for f in field_list if f not in df.columns]
+        if missing:
+            return FakeResultData(error_code="10004011", error_msg=f"不支持的字段: {','.join(missing)}")
+        data = df[field_list].astype(str).values.tolist()
+        return FakeResultData(fields=field_list, data=data)
+
+    def query_profit_data(self, code, year=None, quarter=None):
+        error = self._begin()
+        if error:
+            return error
+        symbol = code.split(".", 1)[-1]
+        if not self.market.has_code(symbol):
+            return FakeResultData(fields=PROFIT_FIELDS)
+        year = int(year or datetime.now().year)
+        quarter = int(quarter or 1)
+        stat_date = pd.Timestamp(year=year, month=quarter * 3, day=1) + pd.offsets.MonthEnd(0)
+        if stat_date > pd.Timestamp(self.market.dates[-1]):
+            # 尚未披露的季度没有数据
+            return FakeResultData(fields=PROFIT_FIELDS)
+        shares = self.market.total_shares[symbol]
+        eps = self.market.eps_ttm[symbol]
+        row = [
+            code, (stat_date + pd.Timedelta(days=30)).strftime("%Y-%m-%d"), stat_date.strftime("%Y-%m-%d"),
+            "0.08", "0.15", "0.30", str(round(eps * shares, 2)), str(eps), str(round(eps * shares * 5, 2)),
+            str(shares), str(shares),
+        ]
+        return FakeResultData(fields=PROFIT_FIELDS, data=[row])
+
+    # ==================== 安装 / 还原 ====================
+
+    def install(self) -> None:
+        for name in PATCHED_FUNCTIONS:
+            self._originals.setdefault(name, getattr(bs, name))
+            setattr(bs, name, getattr(self, name))
+
+    def uninstall(self) -> None:
+        for name, func in self._originals.items():
+            setattr(bs, name, func)
+        self._originals.clear()
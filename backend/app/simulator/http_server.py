@@ -0,0 +1,157 @@
+"""
+东方财富 / 新浪 HTTP接口模拟
+
+覆盖本项目用到的接口（路径与参数与真实接口一致）：
+- 东方财富全市场行情   GET /api/qt/clist/get            （spot_sources.fetch_spot_em）
+- 东方财富日K线        GET /api/qt/stock/kline/get      （ak.stock_zh_a_hist）
+- 新浪股票总数         GET /quotes_service/api/json_v2.php/Market_Center.getHQNodeStockCount
+- 新浪全市场行情       GET /quotes_service/api/json_v2.php/Market_Center.getHQNodeData
+
+每个请求先按 FaultInjector 抽样延迟，再按结果返回正常数据、502 或 429。
+"""
+import asyncio
+import math
+import socket
+import threading
+import time
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from app.simulator.market import FaultInjector, SyntheticMarket, resample_bars
+
+PERIOD_RULES = {"101": None, "102": "W-FRI", "103": "M"}
+
+
+def _dash(value):
+    """缺失值按真实接口的习惯返回 '-'"""
+    return '-' if value is None or (isinstance(value, float) and math.isnan(value)) else value
+
+
+def _market_id(code: str) -> int:
+    return 1 if code.startswith("6") else 0
+
+
+def create_app(market: SyntheticMarket, faults: FaultInjector) -> FastAPI:
+    app = FastAPI(title="upstream-simulator", docs_url=None, redoc_url=None)
+    app.state.market = market
+    app.state.faults = faults
+
+    @app.middleware("http")
+    async def inject_faults(request: Request, call_next):
+        outcome, latency = faults.sample()
+        if latency:
+            await asyncio.sleep(latency)
+        if outcome == FaultInjector.ERROR:
+            return PlainTextResponse("Bad Gateway", status_code=502)
+        if outcome == FaultInjector.RATE_LIMIT:
+            return PlainTextResponse("Too Many Requests", status_code=429, headers={"Retry-After": "1"})
+        return await call_next(request)
+
+    # ==================== 东方财富 ====================
+
+    @app.get("/api/qt/clist/get")
+    async def em_clist(pn: int = 1, pz: int = 20):
+        spot = market.spot()
+        page = spot.iloc[(pn - 1) * pz: pn * pz]
+        diff = [
+            {
+                'f12': row.code, 'f14': row.name, 'f2': row.close, 'f3': row.pctChg,
+                'f17': row.open, 'f15': row.high, 'f16': row.low,
+                'f5': int(row.volume // 100), 'f6': row.amount,
+                'f9': _dash(row.pe),
+                'f23': row.pb, 'f20': row.market_cap,
+            }
+            for row in page.itertuples(index=False)
+        ]
+        return {'rc': 0, 'data': {'total': len(spot), 'diff': diff} if diff else None}
+
+    @app.get("/api/qt/stock/kline/get")
+    async def em_kline(secid: str, beg: str = "19700101", end: str = "20500101", klt: str = "101"):
+        code = secid.split(".", 1)[-1]
+        if not market.has_code(code):
+            return {'rc': 0, 'data': None}
+        df = market.bars_between(code, beg, end)
+        rule = PERIOD_RULES.get(klt)
+        if rule and not df.empty:
+            df = resample_bars(df, rule)
+        klines = [
+            f"{r.date},{r.open},{r.close},{r.high},{r.low},{int(r.volume // 100)},{r.amount},"
+            f"{round((r.high - r.low) / r.preclose * 100, 2)},{r.pctChg},{round(r.close - r.preclose, 2)},{r.turn}"
+            for r in df.itertuples(index=False)
+        ]
+        return {'rc': 0, 'data': {'code': code, 'market': _market_id(code), 'name': market.names[code], 'klines': klines}}
+
+    # ==================== 新浪 ====================
+
+    @app.get("/quotes_service/api/json_v2.php/Market_Center.getHQNodeStockCount")
+    async def sina_count():
+        return PlainTextResponse(f'"{len(market.codes)}"')
+
+    @app.get("/quotes_service/api/json_v2.php/Market_Center.getHQNodeData")
+    async def sina_data(page: int = 1, num: int = 80):
+        spot = market.spot().iloc[(page - 1) * num: page * num]
+        rows = [
+            {
+                'symbol': ('sh' if _market_id(row.code) else 'sz') + row.code,
+                'code': row.code, 'name': row.name, 'trade': f"{row.close:.2f}",
+                'pricechange': round(row.close - row.preclose, 2), 'changepercent': row.pctChg,
+                'settlement': f"{row.preclose:.2f}", 'open': f"{row.open:.2f}",
+                'high': f"{row.high:.2f}", 'low': f"{row.low:.2f}",
+                'volume': int(row.volume), 'amount': int(row.amount),
+                'ticktime': "15:00:00", 'per': _dash(row.pe), 'pb': row.pb,
+                'mktcap': round(row.market_cap / 10000, 4), 'turnoverratio': row.turn,
+            }
+            for row in spot.itertuples(index=False)
+        ]
+        return JSONResponse(rows)
+
+    @app.get("/__simulator__/stats")
+    async def stats():
+        return {'faults': faults.counts, 'symbols': len(market.codes), 'config': vars(market.config)}
+
+    return app
+
+
+class SimulatorServer:
+    """在后台线程中运行模拟HTTP服务"""
+
+    def __init__(self, market: SyntheticMarket, faults: FaultInjector,
+                 host: str = "127.0.0.1", port: Optional[int] = None):
+        self.app = create_app(market, faults)
+        self.host = host
+        self.port = port or self._free_port(host)
+        self._server: Optional[uvicorn.Server] = None
+
+    @staticmethod
+    def _free_port(host: str) -> int:
+        sock = socket.socket()
+        sock.bind((host, 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        return port
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> str:
+        config = uvicorn.Config(self.app, host=self.host, port=self.port,
+                                log_level="warning", access_log=False)
+        self._server = uvicorn.Server(config)
+        threading.Thread(target=self._server.run, name="upstream-simulator", daemon=True).start()
+        while not self._server.started:
+            time.sleep(0.02)
+        return self.base_url
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.should_exit = True
+            self._server = None
+
+
+def serve(market: SyntheticMarket, faults: FaultInjector, host: str, port: int) -> None:
+    """前台运行（命令行 serve 模式）"""
+    uvicorn.run(create_app(market, faults), host=host, port=port, log_level="info")
@@ -0,0 +1,212 @@
+"""
+合成市场与故障注入
+
+SyntheticMarket: 确定性的合成A股市场（默认5000只股票）
+- 每只股票的日K线由以 (种子, 代码) 为种子的随机游走生成，同样的配置总是得到同样的数据
+- 沪市主板/深市主板/创业板/科创板按比例分配代码
+- 全市场快照取每只股票最后一根K线
+
+FaultInjector: 按配置为每次上游请求抽样延迟和结果（正常/错误/限流）
+"""
+import os
+import random
+import threading
+import zlib
+from dataclasses import dataclass, fields
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+INDUSTRIES = ['银行', '医药生物', '电子', '计算机', '食品饮料', '汽车', '电力设备', '有色金属', '房地产', '传媒']
+
+# (代码起始值, 占比)
+BOARDS = [(600000, 0.35), (0, 0.35), (300000, 0.2), (688000, 0.1)]
+
+
+@dataclass
+class SimulatorConfig:
+    """模拟器配置（环境变量 SIM_<字段名大写> 可覆盖）"""
+    symbols: int = 5000
+    seed: int = 42
+    history_days: int = 750
+    as_of: Optional[str] = None  # 最后交易日 YYYY-MM-DD，默认今天之前最近的工作日
+    latency_ms: float = 30.0  # 正常请求的平均延迟
+    latency_jitter_ms: float = 10.0  # 均匀抖动幅度
+    tail_rate: float = 0.0  # 长尾请求比例
+    tail_latency_ms: float = 2000.0  # 长尾请求延迟
+    error_rate: float = 0.0  # 返回5xx / baostock错误码的比例
+    rate_limit_rate: float = 0.0  # 返回429（东方财富/新浪）的比例
+    respect_rate_limits: bool = False  # 是否保留对真实主机的按主机限速（基准测试默认关闭）
+
+    @classmethod
+    def from_env(cls, **overrides) -> "SimulatorConfig":
+        values = {}
+        for f in fields(cls):
+            raw = os.environ.get(f"SIM_{f.name.upper()}")
+            if raw is None:
+                continue
+            if f.type in (bool, "bool"):
+                values[f.name] = raw.lower() in ("1", "true", "yes")
+            elif f.name == "as_of":
+                values[f.name] = raw
+            else:
+                values[f.name] = type(getattr(cls, f.name))(raw)
+        values.update(overrides)
+        return cls(**values)
+
+
+class FaultInjector:
+    """按配置抽样每次请求的延迟和结果（线程安全、可复现）"""
+
+    OK = "ok"
+    ERROR = "error"
+    RATE_LIMIT = "rate_limit"
+
+    def __init__(self, config: SimulatorConfig):
+        self.config = config
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self.counts = {self.OK: 0, self.ERROR: 0, self.RATE_LIMIT: 0}
+
+    def sample(self) -> Tuple[str, float]:
+        """返回 (结果, 延迟秒数)"""
+        c = self.config
+        with self._lock:
+            r = self._rng.random()
+            if r < c.error_rate:
+                outcome = self.ERROR
+            elif r < c.error_rate + c.rate_limit_rate:
+                outcome = self.RATE_LIMIT
+            else:
+                outcome = self.OK
+            if self._rng.random() < c.tail_rate:
+                latency = c.tail_latency_ms
+            else:
+                latency = c.latency_ms + (self._rng.random() * 2 - 1) * c.latency_jitter_ms
+            self.counts[outcome] += 1
+        return outcome, max(latency, 0.0) / 1000
+
+
+def _default_as_of() -> date:
+    """今天或之前最近的工作日"""
+    day = datetime.now().date()
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+class SyntheticMarket:
+    """确定性合成市场"""
+
+    def __init__(self, config: SimulatorConfig = None):
+        self.config = config or SimulatorConfig()
+        as_of = pd.Timestamp(self.config.as_of).date() if self.config.as_of else _default_as_of()
+        self.dates = pd.bdate_range(end=as_of, periods=self.config.history_days)
+        self.date_strings = self.dates.strftime("%Y-%m-%d").tolist()
+
+        rng = np.random.default_rng(self.config.seed)
+        self.codes = []
+        for start, share in BOARDS:
+            n = int(round(self.config.symbols * share))
+            self.codes.extend(f"{start + i:06d}" for i in range(n))
+        self.codes = sorted(self.codes[:self.config.symbols])
+        self.names = {code: f"模拟{code[-4:]}" for code in self.codes}
+        self.industries = {code: INDUSTRIES[i % len(INDUSTRIES)] for i, code in enumerate(self.codes)}
+        self.total_shares = {code: float(s) for code, s in zip(self.codes, rng.integers(1, 200, len(self.codes)) * 1e8)}
+        self.eps_ttm = {code: round(float(e), 4) for code, e in zip(self.codes, rng.normal(0.8, 0.9, len(self.codes)))}
+        self._spot: Optional[pd.DataFrame] = None
+        self._spot_lock = threading.Lock()
+        self.bars = lru_cache(maxsize=1024)(self._bars)
+
+    def _code_seed(self, code: str) -> int:
+        return zlib.crc32(code.encode()) ^ self.config.seed
+
+    def has_code(self, code: str) -> bool:
+        return code in self.names
+
+    def stock_list(self) -> pd.DataFrame:
+        """与 ak.stock_info_a_code_name 相同的列（code, name）"""
+        return pd.DataFrame({'code': self.codes, 'name': [self.names[c] for c in self.codes]})
+
+    def trade_dates(self) -> pd.DataFrame:
+        """与 ak.tool_trade_date_hist_sina 相同的列（trade_date），合成行情的交易日（工作日）到当年年底"""
+        end = date(self.dates[-1].year, 12, 31)
+        return pd.DataFrame({'trade_date': pd.bdate_range(self.dates[0], end).date})
+
+    def _bars(self, code: str) -> pd.DataFrame:
+        """
+        单只股票的全部日K线（成交量单位：股）
+
+        列: date, open, high, low, close, preclose, volume, amount, pctChg, turn
+        """
+        rng = np.random.default_rng(self._code_seed(code))
+        n = len(self.dates)
+        start_price = rng.uniform(3, 200)
+        returns = rng.normal(0.0003, 0.02, n).clip(-0.099, 0.099)
+        close = np.round(start_price * np.cumprod(1 + returns), 2)
+        preclose = np.concatenate([[round(start_price, 2)], close[:-1]])
+        open_ = np.round(preclose * (1 + rng.normal(0, 0.005, n)), 2)
+        high = np.round(np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.008, n))), 2)
+        low = np.round(np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.008, n))), 2)
+        turn = np.round(np.abs(rng.normal(1.5, 1.0, n)) + 0.05, 4)
+        volume = np.round(self.total_shares[code] * turn / 100, -2).astype(np.int64)
+        return pd.DataFrame({
+            'date': self.date_strings,
+            'open': open_,
+            'high': high,
+            'low': low,
+            'close': close,
+            'preclose': preclose,
+            'volume': volume,
+            'amount': np.round(volume * close, 2),
+            'pctChg': np.round((close / preclose - 1) * 100, 4),
+            'turn': turn,
+        })
+
+    def bars_between(self, code: str, start: Optional[str], end: Optional[str]) -> pd.DataFrame:
+        """按日期区间（YYYY-MM-DD 或 YYYYMMDD）截取K线"""
+        df = self.bars(code)
+        if start:
+            df = df[df['date'] >= _iso(start)]
+        if end:
+            df = df[df['date'] <= _iso(end)]
+        return df
+
+    def spot(self) -> pd.DataFrame:
+        """全市场快照（每只股票最后一根K线，附代码、名称、市值、PE/PB）"""
+        with self._spot_lock:
+            if self._spot is None:
+                rows = []
+                for code in self.codes:
+                    last = self.bars(code).iloc[-1]
+                    eps = self.eps_ttm[code]
+                    rows.append({
+                        'code': code,
+                        'name': self.names[code],
+                        **last.to_dict(),
+                        'market_cap': round(last['close'] * self.total_shares[code], 2),
+                        'pe': round(last['close'] / eps, 2) if eps > 0 else None,
+                        'pb': round(last['close'] / (abs(eps) * 6 + 1), 2),
+                    })
+                self._spot = pd.DataFrame(rows)
+            return self._spot
+
+
+def resample_bars(df: pd.DataFrame, rule: str) -> pd.DataFrame:
+    """日K线聚合为周K/月K"""
+    frame = df.assign(date=pd.to_datetime(df['date'])).set_index('date')
+    agg = frame.resample(rule).agg({
+        'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last',
+        'preclose': 'first', 'volume': 'sum', 'amount': 'sum', 'turn': 'sum',
+    }).dropna()
+    agg['pctChg'] = ((agg['close'] / agg['preclose'] - 1) * 100).round(4)
+    agg = agg.reset_index()
+    agg['date'] = agg['date'].dt.strftime("%Y-%m-%d")
+    return agg
+
+
+def _iso(value: str) -> str:
+    return value if "-" in value else f"{value[:4]}-{value[4:6]}-{value[6:]}"
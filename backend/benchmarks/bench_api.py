@@ -0,0 +1,32 @@
+"""/api/stocks 搜索路径（进程内请求，含路由、校验、序列化）"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.data_fetcher import data_fetcher
+
+
+@pytest.fixture(scope="module")
+def client(stock_list, spot_df):
+    from app.services import data_fetcher as data_fetcher_module
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(data_fetcher.cache, "ttl", 10 ** 9)
+        mp.setattr(data_fetcher, "spot_cache_ttl", 10 ** 9)
+        mp.setattr(data_fetcher, "_batch_save_to_db", lambda df: None)
+        mp.setattr(data_fetcher_module, "fetch_spot_em_sync", lambda: spot_df)
+        data_fetcher.market.publish_universe(stock_list)
+        # 预热全市场快照，行情走内存快路径
+        data_fetcher._refresh_spot_cache()
+        with TestClient(app) as c:
+            yield c
+
+
+@pytest.mark.parametrize("query", [
+    "search=600&pageSize=20",
+    "search=模拟&pageSize=100",
+    "search=600&pageSize=100&compact=true",
+], ids=["code-20", "name-100", "code-100-compact"])
+def bench_stocks_search(benchmark, client, query):
+    resp = benchmark(client.get, f"/api/stocks?{query}")
+    assert resp.status_code == 200
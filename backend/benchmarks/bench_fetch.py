@@ -0,0 +1,18 @@
+"""全市场快照解析：_refresh_spot_cache"""
+import pytest
+
+from app.services import data_fetcher as data_fetcher_module
+from app.services.data_fetcher import data_fetcher
+
+
+@pytest.fixture
+def offline_refresh(monkeypatch, spot_df):
+    """数据源直接返回已抓取好的DataFrame，只测量解析和缓存构建；不启动入库线程"""
+    monkeypatch.setattr(data_fetcher_module, "fetch_spot_em_sync", lambda: spot_df)
+    monkeypatch.setattr(data_fetcher, "_batch_save_to_db", lambda df: None)
+    return data_fetcher
+
+
+def bench_refresh_spot_cache(benchmark, offline_refresh):
+    assert benchmark(offline_refresh._refresh_spot_cache)
+    assert len(offline_refresh.stock_spot_cache) == 5000
@@ -0,0 +1,18 @@
+"""行情入库：_batch_save_to_db 与 PEPBUpdater.update_all_pe_pb"""
+from app.services import pe_pb_updater as pe_pb_updater_module
+from app.services.data_fetcher import data_fetcher
+from app.services.pe_pb_updater import PEPBUpdater
+
+
+def bench_batch_save_to_db(benchmark, spot_df):
+    benchmark.pedantic(data_fetcher._batch_save_to_db, args=(spot_df,), rounds=3, iterations=1)
+
+
+def bench_update_all_pe_pb(benchmark, monkeypatch, spot_df):
+    monkeypatch.setattr(pe_pb_updater_module, "fetch_spot_em_sync", lambda: spot_df)
+
+    def run():
+        return PEPBUpdater().update_all_pe_pb()
+
+    result = benchmark.pedantic(run, rounds=3, iterations=1)
+    assert result["success"] == len(spot_df)
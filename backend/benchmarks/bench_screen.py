@@ -0,0 +1,23 @@
+"""条件筛选：filter_stock 遍历5000只股票"""
+import pytest
+
+from app.services.screening_funnel import filter_stock
+
+
+@pytest.fixture(scope="module")
+def quotes(market):
+    spot = market.spot()
+    return [
+        {'code': r.code, 'name': r.name, 'price': r.close, 'change': r.pctChg,
+         'pe': r.pe, 'pb': r.pb, 'industry': market.industries[r.code]}
+        for r in spot.itertuples(index=False)
+    ]
+
+
+@pytest.mark.parametrize("criteria", [
+    {'peMin': 5, 'peMax': 30, 'changeType': 'all'},
+    {'peMin': 0, 'peMax': 50, 'changeType': 'up', 'industry': '银行'},
+], ids=["pe-range", "pe-up-industry"])
+def bench_filter_stock(benchmark, quotes, criteria):
+    matched = benchmark(lambda: [q for q in quotes if filter_stock(q, criteria)])
+    assert matched
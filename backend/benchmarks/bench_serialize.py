@@ -0,0 +1,20 @@
+"""历史K线序列化：get_stock_history 返回的DataFrame -> JSON"""
+import pytest
+
+from app.services.data_fetcher import data_fetcher
+from app.services.history_serializer import serialize_history
+
+
+@pytest.fixture(scope="module")
+def history(market):
+    # 经模拟baostock获取，列与线上完全一致
+    start = market.date_strings[0].replace("-", "")
+    df = data_fetcher.get_stock_history("600000", start_date=start)
+    assert len(df) == len(market.dates)
+    return df
+
+
+@pytest.mark.parametrize("fmt", ["json", "columns", "compact", "table"])
+def bench_serialize_history(benchmark, history, fmt):
+    body = benchmark(serialize_history, history, "600000", "daily", fmt)
+    assert body
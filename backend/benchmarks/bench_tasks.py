@@ -0,0 +1,47 @@
+"""TaskManager：创建、进度更新、列表（进程内存 / 共享SQLite存储）"""
+import asyncio
+
+import pytest
+
+from app.services.shared_state import SqliteStore
+from app.services.task_manager import TaskManager, TaskStatus
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_manager(request, tmp_path):
+    """每次调用返回一个空的 TaskManager（sqlite：临时目录下的新 SqliteStore，与多进程部署相同）"""
+    counter = iter(range(10 ** 6))
+
+    def make():
+        if request.param == "memory":
+            return TaskManager()
+        return TaskManager(store=SqliteStore(str(tmp_path / f"store-{next(counter)}.db")))
+    return make
+
+
+def bench_task_lifecycle(benchmark, make_manager):
+    async def lifecycle(manager):
+        # 与 process_screening_task 相同的调用：进度回调 + 异步状态更新
+        for i in range(150):
+            task_id = f"task-{i}"
+            await manager.acreate_task(task_id, {'peMin': 5}, total=5000)
+            await manager.aupdate_task(task_id, status=TaskStatus.PROCESSING)
+            for processed in range(0, 5001, 500):
+                manager.report_progress(task_id, processed)
+            await manager.aupdate_task(task_id, status=TaskStatus.COMPLETED, results=[{'code': '600000'}] * 50)
+
+    def run():
+        manager = make_manager()
+        asyncio.run(lifecycle(manager))
+        return manager
+
+    manager = benchmark(run)
+    assert len(manager.tasks) == manager.max_tasks
+
+
+def bench_get_all_tasks(benchmark, make_manager):
+    manager = make_manager()
+    for i in range(manager.max_tasks):
+        manager.create_task(f"task-{i}", {'peMin': 5}, total=5000)
+        manager.update_task(f"task-{i}", status=TaskStatus.COMPLETED, results=[{'code': '600000'}] * 50)
+    assert len(benchmark(manager.get_all_tasks)) == manager.max_tasks
@@ -0,0 +1,68 @@
+"""
+热点路径基准测试（pytest-benchmark）
+
+全部使用 app.simulator 的合成市场（5000只股票），不访问外网，结果可复现。
+数据库使用临时SQLite文件，不影响 stock_analysis.db。
+
+    cd backend
+    pytest benchmarks                              # 运行并保存本次结果
+    pytest benchmarks --benchmark-compare \\
+        --benchmark-compare-fail=mean:15%           # 与上一次保存的结果对比，均值变慢超过15%即失败
+
+结果按提交保存在 benchmarks/.results/<机器>/NNNN_<commit>_<时间>.json
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+os.makedirs("logs", exist_ok=True)
+
+_db_dir = tempfile.mkdtemp(prefix="stock-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_dir}/bench.db"
+os.environ.setdefault("ENABLE_SCHEDULER", "false")
+
+import pytest
+
+# 所有上游指向模拟器（baostock首次使用时才登录，安装与导入data_fetcher的先后无关）
+from app.simulator import install, SimulatorConfig
+
+SIMULATOR = install(SimulatorConfig(symbols=5000, latency_ms=0, latency_jitter_ms=0))
+
+from app.database import init_db
+from app.services.spot_sources import EM_FIELDS, _to_frame
+
+init_db()
+
+
+def pytest_benchmark_update_machine_info(config, machine_info):
+    machine_info["symbols"] = len(SIMULATOR.market.codes)
+
+
+@pytest.fixture(scope="session")
+def market():
+    return SIMULATOR.market
+
+
+@pytest.fixture(scope="session")
+def spot_df(market):
+    """东方财富格式的全市场快照（经过与线上相同的 _to_frame 解析）"""
+    rows = [
+        {
+            'f12': r.code, 'f14': r.name, 'f2': r.close, 'f3': r.pctChg, 'f17': r.open,
+            'f15': r.high, 'f16': r.low, 'f5': int(r.volume // 100), 'f6': r.amount,
+            'f9': r.pe, 'f23': r.pb, 'f20': r.market_cap,
+        }
+        for r in market.spot().itertuples(index=False)
+    ]
+    return _to_frame(rows, EM_FIELDS)
+
+
+@pytest.fixture(scope="session")
+def stock_list(market):
+    return [
+        {'code': code, 'name': market.names[code], 'industry': market.industries[code], 'market': '沪市主板'}
+        for code in market.codes
+    ]
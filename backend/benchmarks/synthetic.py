@@ -0,0 +1,25 @@
+"""不经过模拟器的合成数据（供压测脚本等直接写入缓存/数据库）"""
+import numpy as np
+import pandas as pd
+
+
+def make_history(rows: int) -> pd.DataFrame:
+    """生成与baostock历史数据同结构的合成K线"""
+    rng = np.random.default_rng(42)
+    close = 10 + np.cumsum(rng.normal(0, 0.2, rows))
+    preclose = np.concatenate([[close[0]], close[:-1]])
+    df = pd.DataFrame({
+        '日期': pd.bdate_range('2020-01-01', periods=rows).strftime('%Y-%m-%d'),
+        '代码': 'sh.600519',
+        '开盘': close + rng.normal(0, 0.05, rows),
+        '最高': close + 0.3,
+        '最低': close - 0.3,
+        '收盘': close,
+        '前收盘': preclose,
+        '成交量': rng.integers(1_000_000, 50_000_000, rows),
+        '成交额': rng.uniform(1e7, 1e9, rows),
+        '涨跌幅': (close - preclose) / preclose * 100,
+        '换手率': rng.uniform(0.1, 5, rows),
+    })
+    df['涨跌额'] = df['收盘'] - df['前收盘']
+    return df
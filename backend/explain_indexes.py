@@ -0,0 +1,153 @@
+"""
+迁移 0002 索引效果对比（EXPLAIN QUERY PLAN + 耗时）
+
+在临时SQLite库上先迁移到基线 0001，写入生产规模的合成数据：
+- stock_quotes：5000只股票，每只一行
+- watchlist：1000个用户 × 50只自选股
+测量热点查询的执行计划和耗时、全市场行情入库耗时，然后升级到 head 再测一遍。
+
+用法:
+    python explain_indexes.py [查询次数]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.makedirs("logs", exist_ok=True)
+
+_db_dir = tempfile.mkdtemp(prefix="stock-explain-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_dir}/explain.db"
+
+from sqlalchemy import text
+
+from app.database import SessionLocal, engine, run_migrations
+from app.models import StockQuote
+from app.services.data_fetcher import DataFetcher
+
+CODES = [f"{600000 + i:06d}" for i in range(5000)]
+USERS = 1000
+WATCH_PER_USER = 50
+
+QUERIES = {
+    "最新行情(get_stock_pe_pb)": (
+        "SELECT * FROM stock_quotes WHERE stock_code = :code ORDER BY timestamp DESC LIMIT 1",
+        lambda rnd: {"code": rnd.choice(CODES)},
+    ),
+    "自选股查重(user_id, stock_code)": (
+        "SELECT * FROM watchlist WHERE stock_code = :code AND user_id = :user LIMIT 1",
+        lambda rnd: {"code": rnd.choice(CODES), "user": rnd.randrange(USERS)},
+    ),
+    "自选股列表(user_id)": (
+        "SELECT * FROM watchlist WHERE user_id = :user ORDER BY created_at DESC LIMIT 20",
+        lambda rnd: {"user": rnd.randrange(USERS)},
+    ),
+}
+
+
+def seed() -> None:
+    rnd = random.Random(42)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO stock_quotes (stock_code, price, change_percent, volume, turnover, pe, pb, timestamp) "
+            "VALUES (:code, :price, 0, '0', '0', :pe, :pb, :ts)"
+        ), [
+            {"code": code, "price": rnd.uniform(2, 200), "pe": rnd.uniform(5, 80), "pb": rnd.uniform(0.5, 10),
+             "ts": now - timedelta(minutes=rnd.randrange(600))}
+            for code in CODES
+        ])
+        conn.execute(text(
+            "INSERT INTO watchlist (user_id, stock_code, notes, created_at) VALUES (:user, :code, '', :ts)"
+        ), [
+            {"user": user, "code": code, "ts": now - timedelta(minutes=rnd.randrange(100000))}
+            for user in range(USERS)
+            for code in rnd.sample(CODES, WATCH_PER_USER)
+        ])
+        conn.execute(text("ANALYZE"))
+
+
+def measure_queries(n: int) -> dict:
+    results = {}
+    with engine.connect() as conn:
+        for name, (sql, params) in QUERIES.items():
+            rnd = random.Random(7)
+            plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params(rnd))]
+            start = time.perf_counter()
+            for _ in range(n):
+                conn.execute(text(sql), params(rnd)).first()
+            results[name] = (plan, (time.perf_counter() - start) / n * 1e6)
+    return results
+
+
+def legacy_batch_save(rows) -> None:
+    """0002之前 _batch_save_to_db 的写法：逐行查询后更新，每100条提交一次"""
+    db = SessionLocal()
+    try:
+        for count, row in enumerate(rows, 1):
+            quote = db.query(StockQuote).filter(StockQuote.stock_code == row['stock_code']).first()
+            if not quote:
+                quote = StockQuote(stock_code=row['stock_code'])
+                db.add(quote)
+            for field, value in row.items():
+                setattr(quote, field, value)
+            if count % 100 == 0:
+                db.commit()
+        db.commit()
+    finally:
+        db.close()
+
+
+def upsert_batch_save(rows) -> None:
+    db = SessionLocal()
+    try:
+        DataFetcher._upsert_quotes(db, rows)
+        db.commit()
+    finally:
+        db.close()
+
+
+def spot_rows() -> list:
+    now = datetime.now()
+    return [
+        {'stock_code': code, 'price': 10.0 + i % 90, 'change_percent': 0.5,
+         'volume': '12345', 'turnover': '6789000', 'timestamp': now}
+        for i, code in enumerate(CODES)
+    ]
+
+
+def report(title: str, queries: dict, save_seconds: float) -> None:
+    print(f"\n== {title} ==")
+    for name, (plan, micros) in queries.items():
+        print(f"{name}: {micros:.1f}µs/次")
+        for line in plan:
+            print(f"    {line}")
+    print(f"全市场行情入库（{len(CODES)}只）: {save_seconds * 1000:.0f}ms")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    run_migrations("0001")
+    seed()
+    before = measure_queries(n)
+    start = time.perf_counter()
+    legacy_batch_save(spot_rows())
+    report("基线 0001（逐行查询+更新）", before, time.perf_counter() - start)
+
+    run_migrations("head")
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    after = measure_queries(n)
+    start = time.perf_counter()
+    upsert_batch_save(spot_rows())
+    report("head（唯一索引 + upsert）", after, time.perf_counter() - start)
+
+    print(f"\n数据库文件: {_db_dir}/explain.db")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+响应压缩与紧凑格式负载测试
+
+在本进程内启动uvicorn（合成数据，不访问外网），用并发httpx客户端压测：
+- GET /api/stocks?pageSize=100            股票列表
+- GET /api/screen/task/{id}                 500条结果的筛选任务
+- GET /api/stocks/{code}/history            5年日K线
+
+每个接口分别测量 原始JSON / gzip / br / 紧凑格式 / 紧凑+br 的
+线上传输字节数和延迟分位数。
+
+用法:
+    python loadtest_payload.py [并发数] [每个场景请求数]
+"""
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.makedirs("logs", exist_ok=True)
+# 只压测本地路径：不启动后台刷新和启动预热（两者都会访问上游）
+os.environ.setdefault("ENABLE_SCHEDULER", "false")
+os.environ.setdefault("WARMUP_ON_STARTUP", "false")
+
+import httpx
+import uvicorn
+
+from app.main import app
+from app.services.data_fetcher import data_fetcher
+from app.services.task_manager import task_manager, TaskStatus
+from benchmarks.synthetic import make_history
+
+
+def seed_data():
+    """写入合成数据：5000只股票、500条筛选结果、1250条日K线"""
+    markets = ['沪市主板', '深市主板', '创业板', '科创板']
+    stocks = [
+        {'code': f"{600000 + i:06d}", 'name': f"测试股票{i}", 'industry': '未知', 'market': markets[i % 4]}
+        for i in range(5000)
+    ]
+    # 股票列表属于全市场快照（刚发布的列表在刷新间隔内不会向上游重新获取）
+    data_fetcher.market.publish_universe(stocks)
+
+    results = [
+        {'id': i + 1, 'code': s['code'], 'name': s['name'], 'price': 10.0 + i * 0.01,
+         'change': 1.23, 'volume': '1.23万手', 'pe': 15.6, 'pb': None,
+         'market_cap': '未知', 'industry': '未知'}
+        for i, s in enumerate(stocks[:500])
+    ]
+    task_manager.create_task("loadtest", {})
+    task_manager.update_task("loadtest", total=5000, processed=5000,
+                             status=TaskStatus.COMPLETED, results=results)
+
+    history = make_history(1250)
+    data_fetcher.get_stock_history = lambda *args, **kwargs: history
+
+
+def start_server() -> str:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+async def run_scenario(base: str, path: str, encoding: str, concurrency: int, total: int):
+    latencies, sizes = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"Accept-Encoding": encoding}
+
+    async with httpx.AsyncClient(base_url=base, limits=limits, headers=headers) as client:
+        queue = asyncio.Queue()
+        for _ in range(total):
+            queue.put_nowait(None)
+
+        async def worker():
+            while not queue.empty():
+                queue.get_nowait()
+                start = time.perf_counter()
+                resp = await client.get(path)
+                await resp.aread()
+                latencies.append(time.perf_counter() - start)
+                sizes.append(resp.num_bytes_downloaded)
+                assert resp.status_code == 200, resp.status_code
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "bytes": int(statistics.mean(sizes)),
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "rps": total / elapsed,
+    }
+
+
+async def main(concurrency: int, total: int):
+    seed_data()
+    base = start_server()
+
+    endpoints = [
+        ("股票列表", "/api/stocks?pageSize=100"),
+        ("筛选结果", "/api/screen/task/loadtest"),
+        ("日K线", "/api/stocks/600519/history"),
+    ]
+    modes = [
+        ("json", "identity", False),
+        ("json+gzip", "gzip", False),
+        ("json+br", "br", False),
+        ("compact", "identity", True),
+        ("compact+br", "br", True),
+    ]
+
+    print(f"负载测试: 并发 {concurrency}, 每场景 {total} 次请求")
+    for title, path in endpoints:
+        print(f"\n== {title} {path}")
+        print(f"{'模式':<12}{'字节':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'req/s':>10}")
+        baseline = None
+        for name, encoding, compact in modes:
+            url = path + (("&" if "?" in path else "?") + "compact=true" if compact else "")
+            r = await run_scenario(base, url, encoding, concurrency, total)
+            baseline = baseline or r["bytes"]
+            print(f"{name:<12}{r['bytes']:>10}{r['p50']:>10.2f}{r['p95']:>10.2f}{r['rps']:>10.1f}"
+                  f"   ({r['bytes'] / baseline * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    asyncio.run(main(concurrency, total))
@@ -1,29 +1,27 @@
-import requests
 import logging
-from app.services.data_fetcher import patch_requests_user_agent
-import akshare as ak
+from app.services.http_client import upstream_http, HTTP2_AVAILABLE
+from app.services.spot_sources import fetch_spot_em_sync, fetch_spot_sina_sync
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def test_patch_and_fetch():
-    print("Testing User-Agent Patch...")
+def test_client_and_fetch():
+    print("Testing upstream HTTP client...")
     
-    # 1. Verify Patch
-    s = requests.Session()
-    # We can't easily check the header inside the session object without making a request
-    # But we can check if requests.Session.request is patched
-    print(f"requests.Session.request: {requests.Session.request}")
+    # 1. Verify client setup (headers are added per request, no global patch)
+    print(f"HTTP/2 available: {HTTP2_AVAILABLE}")
+    print(f"Sample headers: {upstream_http.browser_headers('https://push2.eastmoney.com/')}")
     
-    # 2. Test akshare spot interface (which failed before)
-    print("\nTesting ak.stock_zh_a_spot_em()...")
-    try:
-        df = ak.stock_zh_a_spot_em()
-        print(f"Success! Got {len(df)} rows.")
-        print(df.head(1))
-    except Exception as e:
-        print(f"Failed: {e}")
+    # 2. Test direct spot fetchers
+    for name, fetch in [("eastmoney", fetch_spot_em_sync), ("sina", fetch_spot_sina_sync)]:
+        print(f"\nTesting {name} spot fetcher...")
+        try:
+            df = fetch()
+            print(f"Success! Got {len(df)} rows.")
+            print(df.head(1))
+        except Exception as e:
+            print(f"Failed: {e}")
 
 if __name__ == "__main__":
-    test_patch_and_fetch()
+    test_client_and_fetch()
@@ -0,0 +1,69 @@
+"""
+行为测试公共夹具
+
+与基准测试相同，全部运行在 app.simulator 的合成市场上（不访问外网），
+数据库和价格面板使用临时目录，不影响 stock_analysis.db 和 data/。
+
+    cd backend
+    pytest tests
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+os.makedirs("logs", exist_ok=True)
+
+_db_dir = tempfile.mkdtemp(prefix="stock-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_dir}/test.db"
+os.environ["PRICE_PANEL_DIR"] = os.path.join(_db_dir, "price_panel")
+os.environ.setdefault("ENABLE_SCHEDULER", "false")
+
+import pytest
+
+# 所有上游指向模拟器（baostock首次使用时才登录，安装与导入data_fetcher的先后无关）
+from app.simulator import install, SimulatorConfig
+
+SIMULATOR = install(SimulatorConfig(symbols=300, latency_ms=0, latency_jitter_ms=0))
+
+from app.database import init_db
+
+init_db()
+
+
+@pytest.fixture(scope="session")
+def simulator():
+    return SIMULATOR
+
+
+@pytest.fixture(scope="session")
+def market():
+    return SIMULATOR.market
+
+
+@pytest.fixture
+def faults(monkeypatch):
+    """注入上游故障：测试中修改 error_rate 等字段，结束后自动还原"""
+    monkeypatch.setattr(SIMULATOR.faults, "config", SimulatorConfig(**vars(SIMULATOR.config)))
+    return SIMULATOR.faults.config
+
+
+@pytest.fixture(scope="session")
+def fetcher():
+    """已加载股票列表和全市场行情的 data_fetcher"""
+    from app.services.data_fetcher import data_fetcher
+
+    data_fetcher.get_stock_list()
+    assert data_fetcher._refresh_spot_cache()
+    return data_fetcher
+
+
+@pytest.fixture(scope="session")
+def client(fetcher):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
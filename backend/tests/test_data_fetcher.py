@@ -0,0 +1,39 @@
+"""DataFetcher：全市场行情刷新"""
+import threading
+import time
+
+
+def test_concurrent_spot_refreshes_fetch_once(fetcher, monkeypatch):
+    calls = []
+    fetch_spot = fetcher._fetch_spot
+
+    def slow_fetch():
+        calls.append(threading.current_thread().name)
+        time.sleep(0.2)
+        return fetch_spot()
+
+    monkeypatch.setattr(fetcher, "_fetch_spot", slow_fetch)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(fetcher._refresh_spot_cache())) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(results) == [False] * 9 + [True]
+
+
+def test_waiting_refresh_reuses_fresh_quotes(fetcher, monkeypatch):
+    monkeypatch.setattr(fetcher, "spot_refresh_due", lambda *args, **kwargs: False)
+    monkeypatch.setattr(fetcher, "_fetch_spot", lambda: (_ for _ in ()).throw(AssertionError("不应重复刷新")))
+
+    assert fetcher._refresh_spot_cache(wait=True)
+
+
+def test_quote_served_from_snapshot(fetcher, market):
+    code = market.codes[0]
+    quote = fetcher.get_stock_quote(code)
+
+    assert quote is fetcher.market.current.quote(code)
+    assert quote['price'] > 0
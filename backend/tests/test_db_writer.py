@@ -0,0 +1,67 @@
+"""数据库写入队列"""
+import threading
+
+import pytest
+
+from app.services.db_writer import DBWriter, WriterQueueFull
+
+
+@pytest.fixture
+def writer():
+    writer = DBWriter(maxsize=100)
+    yield writer
+    writer.stop()
+
+
+def test_writes_run_in_order_on_one_thread(writer):
+    done = []
+    for i in range(50):
+        writer.submit(lambda i=i: done.append((threading.current_thread().name, i)))
+    writer.flush(timeout=5)
+
+    assert [i for _, i in done] == list(range(50))
+    assert {name for name, _ in done} == {"db-writer"}
+
+
+def test_run_returns_result_and_raises_errors(writer):
+    assert writer.run(lambda a, b: a + b, 1, b=2, timeout=5) == 3
+
+    def broken():
+        raise ValueError("写入失败")
+
+    with pytest.raises(ValueError):
+        writer.run(broken, timeout=5)
+    # 失败的任务不影响后续写入
+    assert writer.run(lambda: "ok", timeout=5) == "ok"
+
+
+def test_nested_run_does_not_deadlock(writer):
+    assert writer.run(lambda: writer.run(lambda: "inner"), timeout=5) == "inner"
+
+
+def test_full_queue_drops_discardable_writes():
+    writer = DBWriter(maxsize=1)
+    release = threading.Event()
+    try:
+        running = writer.submit(release.wait, 5)
+        while not running.running():
+            pass
+        writer.submit(lambda: None)  # 占满队列
+
+        assert writer.submit_nowait(lambda: None) is None
+        with pytest.raises(WriterQueueFull):
+            writer.submit(lambda: None, block=False)
+        assert writer.dropped == 2
+    finally:
+        release.set()
+        writer.stop()
+
+
+def test_stop_drains_pending_writes():
+    writer = DBWriter()
+    done = []
+    for i in range(20):
+        writer.submit(done.append, i)
+    writer.stop()
+
+    assert done == list(range(20))
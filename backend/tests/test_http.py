@@ -0,0 +1,138 @@
+"""HTTP层：条件请求（ETag/304）与响应压缩"""
+import gzip
+
+import brotli
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.middleware.compression import CompressionMiddleware
+
+# ==================== ETag / 304 ====================
+
+
+@pytest.fixture(scope="module")
+def code(market):
+    return market.codes[0]
+
+
+def test_stock_detail_revalidates_with_etag(client, code):
+    first = client.get(f"/api/stocks/{code}")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    cached = client.get(f"/api/stocks/{code}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["ETag"] == etag
+
+    stale = client.get(f"/api/stocks/{code}", headers={"If-None-Match": 'W/"other"'})
+    assert stale.status_code == 200
+
+
+def test_history_etag_depends_on_format(client, code):
+    url = f"/api/stocks/{code}/history"
+    rows = client.get(url)
+    table = client.get(url, params={"format": "table"})
+    assert rows.status_code == table.status_code == 200
+    assert rows.headers["ETag"] != table.headers["ETag"]
+
+    assert client.get(url, headers={"If-None-Match": rows.headers["ETag"]}).status_code == 304
+    # 强ETag形式（不带W/前缀）按弱比较同样命中；列表中任一匹配即可
+    strong = rows.headers["ETag"][2:]
+    assert client.get(url, headers={"If-None-Match": f'"x", {strong}'}).status_code == 304
+    assert client.get(url, params={"format": "table"},
+                      headers={"If-None-Match": rows.headers["ETag"]}).status_code == 200
+
+
+# ==================== 压缩 ====================
+
+BODY = "行情," * 2000
+
+
+def _app(**options) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, **options)
+
+    @app.get("/large")
+    def large():
+        return PlainTextResponse(BODY)
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("ok")
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([BODY.encode()] * 3), media_type="text/plain")
+
+    @app.get("/parquet")
+    def parquet():
+        return PlainTextResponse(BODY, media_type="application/vnd.apache.parquet")
+
+    return app
+
+
+def _raw(client, path, accept_encoding):
+    """返回未解码的响应体（TestClient 默认会自动解压）"""
+    with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+@pytest.fixture(scope="module")
+def compressing():
+    return TestClient(_app())
+
+
+def test_prefers_brotli_then_gzip(compressing):
+    response, raw = _raw(compressing, "/large", "gzip, br")
+    assert response.headers["Content-Encoding"] == "br"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert brotli.decompress(raw).decode() == BODY
+    assert int(response.headers["Content-Length"]) == len(raw)
+
+    response, raw = _raw(compressing, "/large", "gzip, br;q=0")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(raw).decode() == BODY
+
+
+def test_small_and_unaccepted_responses_pass_through(compressing):
+    response, raw = _raw(compressing, "/small", "gzip, br")
+    assert "Content-Encoding" not in response.headers
+    assert raw == b"ok"
+
+    response, raw = _raw(compressing, "/large", "identity")
+    assert "Content-Encoding" not in response.headers
+    assert raw.decode() == BODY
+
+
+def test_already_compressed_media_types_pass_through(compressing):
+    response, raw = _raw(compressing, "/parquet", "gzip")
+    assert "Content-Encoding" not in response.headers
+    assert raw.decode() == BODY
+
+
+def test_streaming_response_compressed_chunk_by_chunk(compressing):
+    response, raw = _raw(compressing, "/stream", "gzip")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    assert gzip.decompress(raw).decode() == BODY * 3
+
+
+def test_large_body_offloaded_to_thread_pool():
+    client = TestClient(_app(offload_size=1024))
+    response, raw = _raw(client, "/large", "gzip")
+    assert gzip.decompress(raw).decode() == BODY
+
+
+def test_not_modified_is_never_compressed(client, market):
+    url = f"/api/stocks/{market.codes[0]}/history"
+    etag = client.get(url).headers["ETag"]
+    response, raw = _raw(client, url, "gzip")
+    assert response.headers["Content-Encoding"] == "gzip"
+
+    with client.stream("GET", url, headers={"If-None-Match": etag, "Accept-Encoding": "gzip"}) as cached:
+        assert cached.status_code == 304
+        assert "Content-Encoding" not in cached.headers
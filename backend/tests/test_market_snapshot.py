@@ -0,0 +1,98 @@
+"""全市场快照：发布、共享与只读约定"""
+import pickle
+import threading
+import time
+from dataclasses import FrozenInstanceError
+
+import pytest
+
+from app.services.market_snapshot import MarketData
+from app.services.shared_state import SharedState
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def _market() -> MarketData:
+    market = MarketData()
+    market.publish_universe([{'code': '600000', 'name': '浦发银行'}, {'code': '000001', 'name': '平安银行'}])
+    market.publish_quotes({'600000': {'price': 10.0}}, {'600000': {'pe': 5.0, 'pb': 0.5, 'market_cap': 3e11}})
+    return market
+
+
+def test_snapshot_is_read_only():
+    snapshot = _market().current
+
+    with pytest.raises(FrozenInstanceError):
+        snapshot.quotes = {}
+    with pytest.raises(TypeError):
+        snapshot.quotes['000001'] = {'price': 1.0}
+    assert isinstance(snapshot.universe, tuple)
+
+
+def test_publish_leaves_previous_snapshot_untouched():
+    market = _market()
+    before = market.current
+
+    after = market.publish_quotes({'600000': {'price': 11.0}}, {})
+
+    assert after.version > before.version
+    assert market.current is after
+    assert before.quote('600000') == {'price': 10.0}
+    assert before.fundamental('600000')['pe'] == 5.0
+    # 只替换的字段变化，其余字段沿用同一对象
+    assert after.universe is before.universe
+
+
+def test_snapshot_survives_pickle():
+    snapshot = _market().current
+    restored = pickle.loads(pickle.dumps(snapshot))
+
+    assert restored.version == snapshot.version
+    assert restored.quote('600000') == {'price': 10.0}
+    assert restored.name('000001') == '平安银行'
+    with pytest.raises(TypeError):
+        restored.quotes['000001'] = {}
+
+
+def test_stock_list_endpoint_does_not_modify_snapshot(client, fetcher):
+    snapshot = fetcher.market.current
+    before = [dict(stock) for stock in snapshot.universe]
+
+    response = client.get("/api/stocks", params={"pageSize": 5, "with_quote": True})
+
+    assert response.status_code == 200
+    assert response.json()['stocks'][0]['id'] == 1
+    assert [dict(stock) for stock in snapshot.universe] == before
+
+
+def test_reader_adopts_snapshot_published_by_other_worker(tmp_path):
+    publisher = MarketData(SharedState(str(tmp_path)), poll_seconds=0.05)
+    reader = MarketData(SharedState(str(tmp_path)), poll_seconds=0.05)
+    assert reader.current.version == 0
+
+    published = publisher.publish_universe([{'code': '600000', 'name': '浦发银行'}])
+
+    # 由轮询线程加载，读取方只取引用
+    assert _wait_for(lambda: reader.current.version == published.version)
+    assert reader.current.name('600000') == '浦发银行'
+    assert any(t.name == "snapshot-poller" for t in threading.enumerate())
+
+
+def test_current_does_not_read_shared_file(tmp_path, monkeypatch):
+    shared = SharedState(str(tmp_path))
+    market = MarketData(shared, poll_seconds=60)
+    market.current  # 启动轮询线程
+
+    def fail(name):
+        raise AssertionError("current 不应在读取线程中反序列化快照")
+
+    monkeypatch.setattr(shared, "read_object", fail)
+    for _ in range(100):
+        market.current
@@ -0,0 +1,96 @@
+"""数据库迁移：0002（行情去重、唯一索引）与 0003（成交量/成交额/市值改为数值列）"""
+from datetime import datetime
+
+import pytest
+import sqlalchemy as sa
+from alembic import command
+
+from app.database import alembic_config
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'migrate.db'}")
+    yield engine
+    engine.dispose()
+
+
+def _migrate(engine, action, revision):
+    config = alembic_config()
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        action(config, revision)
+
+
+def _indexes(engine, table):
+    return {index['name']: bool(index['unique']) for index in sa.inspect(engine).get_indexes(table)}
+
+
+@pytest.fixture
+def legacy(engine):
+    """0001 结构的旧库：同一股票多行行情、格式化文本的成交量/成交额/市值"""
+    _migrate(engine, command.upgrade, "0001")
+    day = datetime(2026, 1, 5, 15)
+    quotes = sa.table('stock_quotes', *(sa.column(name) for name in (
+        'stock_code', 'price', 'volume', 'turnover', 'market_cap', 'timestamp')))
+    snapshots = sa.table('quote_snapshots', sa.column('stock_code'), sa.column('ts'), sa.column('volume'))
+    with engine.begin() as connection:
+        connection.execute(quotes.insert(), [
+            {'stock_code': '600519', 'price': 1.0, 'volume': '1.00万手', 'turnover': '1.00亿',
+             'market_cap': '1.00万亿', 'timestamp': day.replace(day=2)},
+            {'stock_code': '600519', 'price': 2.0, 'volume': '1.23万手', 'turnover': '45.60亿',
+             'market_cap': '2.10万亿', 'timestamp': day},
+            {'stock_code': '600519', 'price': 3.0, 'volume': None, 'turnover': None,
+             'market_cap': None, 'timestamp': None},
+            {'stock_code': '000001', 'price': 4.0, 'volume': '232020.0', 'turnover': '3650138640.0',
+             'market_cap': None, 'timestamp': None},
+            {'stock_code': '000001', 'price': 5.0, 'volume': 'n/a', 'turnover': '',
+             'market_cap': None, 'timestamp': None},
+        ])
+        connection.execute(snapshots.insert(), [{'stock_code': '600519', 'ts': day, 'volume': 12.0}])
+    return engine
+
+
+def _quotes(engine):
+    with engine.connect() as connection:
+        return connection.exec_driver_sql(
+            "SELECT stock_code, price, volume, turnover, market_cap FROM stock_quotes ORDER BY stock_code"
+        ).all()
+
+
+def test_0002_keeps_latest_quote_per_stock(legacy):
+    _migrate(legacy, command.upgrade, "0002")
+
+    # 有时间戳的保留最新一行；都没有时间戳的保留id最大的一行
+    assert [(code, price) for code, price, *_ in _quotes(legacy)] == [('000001', 5.0), ('600519', 2.0)]
+    assert _indexes(legacy, 'stock_quotes')['ix_stock_quotes_stock_code'] is True
+    assert 'ix_watchlist_user_code' in _indexes(legacy, 'watchlist')
+    assert 'ix_watchlist_user_id' not in _indexes(legacy, 'watchlist')
+
+    with pytest.raises(sa.exc.IntegrityError), legacy.begin() as connection:
+        connection.exec_driver_sql("INSERT INTO stock_quotes (stock_code, price) VALUES ('600519', 9.0)")
+
+
+def test_0003_converts_amounts_to_numbers(legacy):
+    _migrate(legacy, command.upgrade, "head")
+
+    quotes = {code: row for code, *row in _quotes(legacy)}
+    assert quotes['600519'] == [2.0, 1230000, pytest.approx(4.56e9), pytest.approx(2.1e12)]
+    assert quotes['000001'] == [5.0, None, None, None]
+    columns = {column['name']: column['type'] for column in sa.inspect(legacy).get_columns('stock_quotes')}
+    assert isinstance(columns['volume'], sa.BigInteger)
+    assert isinstance(columns['turnover'], sa.Float)
+    with legacy.connect() as connection:
+        assert connection.exec_driver_sql("SELECT volume FROM quote_snapshots").scalar() == 1200.0
+
+
+def test_downgrade_to_baseline(legacy):
+    _migrate(legacy, command.upgrade, "head")
+    _migrate(legacy, command.downgrade, "0001")
+
+    columns = {column['name']: column['type'] for column in sa.inspect(legacy).get_columns('stock_quotes')}
+    assert isinstance(columns['volume'], sa.String)
+    assert _indexes(legacy, 'stock_quotes')['ix_stock_quotes_stock_code'] is False
+    assert 'ix_watchlist_user_id' in _indexes(legacy, 'watchlist')
+    with legacy.connect() as connection:
+        assert connection.exec_driver_sql("SELECT volume FROM quote_snapshots").scalar() == 12.0
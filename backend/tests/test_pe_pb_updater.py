@@ -0,0 +1,20 @@
+"""PE/PB批量更新（经写入队列按 stock_code upsert）"""
+from app.database import SessionLocal
+from app.models import StockQuote
+
+
+def test_update_all_pe_pb_upserts_one_row_per_stock(simulator):
+    from app.services.pe_pb_updater import pe_pb_updater
+
+    first = pe_pb_updater.update_all_pe_pb()
+    assert first["success"] == first["total"] > 0 and first["failed"] == 0
+    second = pe_pb_updater.update_all_pe_pb()
+    assert second["success"] == first["success"]
+
+    db = SessionLocal()
+    try:
+        codes = [code for code, in db.query(StockQuote.stock_code).all()]
+        assert len(codes) == len(set(codes)) >= first["total"]
+        assert db.query(StockQuote).filter(StockQuote.pe.isnot(None)).count() > 0
+    finally:
+        db.close()
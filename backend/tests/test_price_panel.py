@@ -0,0 +1,57 @@
+"""价格面板：构建、映射与重建后的重新加载"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.price_panel import PricePanel, build_panel
+
+
+def _bars(codes, dates, base=10.0):
+    rows = [
+        {'stock_code': code, 'trade_date': date, 'close': base + i + j, 'open': base, 'high': base,
+         'low': base, 'volume': 100.0, 'amount': 1000.0}
+        for j, code in enumerate(codes)
+        for i, date in enumerate(dates)
+    ]
+    return pd.DataFrame(rows)
+
+
+DATES = ["2024-01-02", "2024-01-03", "2024-01-04"]
+
+
+def test_last_returns_trailing_rows(tmp_path):
+    build_panel(_bars(["000001", "600000"], DATES), out_dir=str(tmp_path / "panel"))
+    panel = PricePanel(str(tmp_path / "panel"))
+
+    assert panel.last("close", 2).shape == (2, 2)
+    assert panel.last("close", 10).shape == (3, 2)
+    np.testing.assert_array_equal(panel.last("close", 1)[0], [12.0, 13.0])
+
+
+@pytest.mark.parametrize("days", [0, -1])
+def test_last_rejects_non_positive_days(tmp_path, days):
+    build_panel(_bars(["000001"], DATES), out_dir=str(tmp_path / "panel"))
+    panel = PricePanel(str(tmp_path / "panel"))
+
+    with pytest.raises(ValueError):
+        panel.last("close", days)
+
+
+def test_reloads_when_version_changes_within_same_mtime(tmp_path):
+    out_dir = str(tmp_path / "panel")
+    first = build_panel(_bars(["000001"], DATES), out_dir=out_dir)
+    panel = PricePanel(out_dir)
+    assert panel.codes == ["000001"]
+
+    index_path = os.path.join(out_dir, "index.json")
+    mtime_ns = os.stat(index_path).st_mtime_ns
+    second = build_panel(_bars(["000001", "600000"], DATES), out_dir=out_dir)
+    # 模拟两次重建落在同一时间片
+    os.utime(index_path, ns=(mtime_ns, mtime_ns))
+
+    assert second['version'] > first['version']
+    assert panel.version == second['version']
+    assert panel.codes == ["000001", "600000"]
+    assert panel.last("close", 1).shape == (1, 2)
@@ -0,0 +1,80 @@
+"""漏斗筛选"""
+import asyncio
+
+import pytest
+
+from app.services import screening_funnel, trend_indicators
+from app.services.screening_funnel import ScreeningFunnel, Stage, filter_stock
+
+CRITERIA = {
+    'peMin': 10, 'peMax': 40, 'pbMin': 0.8, 'pbMax': 5, 'marketCapMin': 50,
+    'changeType': 'all', 'industry': None, 'trend': False,
+}
+
+
+@pytest.fixture
+def stocks(fetcher, monkeypatch):
+    monkeypatch.setattr(screening_funnel, "FETCH_INTERVAL", 0)
+    return list(fetcher.get_stock_list())
+
+
+def _run(criteria, stocks, **kwargs):
+    funnel = ScreeningFunnel(criteria, **kwargs)
+    return funnel, asyncio.run(funnel.run(stocks))
+
+
+def test_stages_run_cheapest_first_on_survivors():
+    seen = {}
+
+    def stage(name, keep):
+        async def run(funnel, candidates):
+            seen[name] = [stock['code'] for stock in candidates]
+            return [stock for stock in candidates if stock['code'] in keep]
+        return run
+
+    stages = [
+        Stage('upstream', 3, stage('upstream', {'000001'})),
+        Stage('snapshot', 0, stage('snapshot', {'000001', '000002'})),
+        Stage('trend', 2, stage('trend', set()), enabled=lambda criteria: False),
+    ]
+    progress = []
+    funnel, results = _run(CRITERIA, [{'code': code} for code in ('000001', '000002', '000003')],
+                           stages=stages, on_progress=progress.append)
+
+    assert [report.name for report in funnel.reports] == ['snapshot', 'upstream']
+    assert seen == {'snapshot': ['000001', '000002', '000003'], 'upstream': ['000001', '000002']}
+    assert [stock['code'] for stock in results] == ['000001']
+    assert [(report.input, report.output) for report in funnel.reports] == [(3, 2), (2, 1)]
+    assert progress[-1] == funnel.total == 3
+
+
+def test_snapshot_results_match_filter_stock(fetcher, stocks):
+    funnel, results = _run(CRITERIA, stocks)
+
+    snapshot = fetcher.market.current
+    expected = {
+        stock['code'] for stock in stocks
+        if filter_stock({
+            **stock, 'industry': stock.get('industry') or '未知', **snapshot.quote(stock['code']),
+            **{k: v for k, v in snapshot.fundamental(stock['code']).items() if v is not None},
+        }, CRITERIA)
+    }
+    assert expected
+    assert {stock['code'] for stock in results} == expected
+    assert funnel.fetched == 0
+    assert funnel.reports[0].name == 'snapshot'
+    assert funnel.processed == funnel.total == len(stocks)
+
+
+def test_trend_stage_syncs_missing_bars_once(stocks):
+    criteria = {**CRITERIA, 'trend': True}
+
+    first, results = _run(criteria, stocks)
+    second, again = _run(criteria, stocks)
+
+    # 第一次本地没有日线，通过前几层的股票逐只同步；同步后的第二次全部在本地计算
+    assert first.fetched > 0
+    assert second.fetched == 0
+    assert {stock['code'] for stock in again} == {stock['code'] for stock in results}
+    assert all(trend_indicators.passes(stock) for stock in again)
+    assert [report.name for report in second.reports] == ['snapshot', 'quotes', 'trend', 'upstream']
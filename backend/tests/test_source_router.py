@@ -0,0 +1,134 @@
+"""数据源熔断、路由与对冲请求"""
+import time
+
+import pytest
+
+from app.config import settings
+from app.services.source_router import (
+    CircuitBreaker, HedgeBudget, SourceRouter, UpstreamError, CLOSED, HALF_OPEN, OPEN
+)
+
+
+def _router(*sources):
+    router = SourceRouter()
+    for source in sources:
+        router.register(source, expected_latency=0.01)
+    router.route("quote", list(sources))
+    return router
+
+
+def _fail(code):
+    raise UpstreamError(f"查询失败 {code}")
+
+
+def test_empty_results_do_not_open_breaker():
+    router = _router("baostock")
+    for _ in range(settings.SOURCE_BREAKER_FAILURE_THRESHOLD * 3):
+        assert router.call("baostock", lambda code: None, "830001") is None
+
+    breaker = router.breakers["baostock"]
+    assert breaker.state == CLOSED
+    assert breaker.stats()["consecutive_failures"] == 0
+
+
+def test_upstream_errors_open_breaker():
+    router = _router("baostock")
+    for _ in range(settings.SOURCE_BREAKER_FAILURE_THRESHOLD):
+        with pytest.raises(UpstreamError):
+            router.call("baostock", _fail, "600000")
+
+    assert router.breakers["baostock"].state == OPEN
+    assert router.candidates("quote") == []
+
+
+def test_first_falls_through_empty_source_without_penalizing_it():
+    router = _router("baostock", "akshare_hist")
+    handlers = {"baostock": lambda code: None, "akshare_hist": lambda code: {"code": code}}
+
+    for _ in range(settings.SOURCE_BREAKER_FAILURE_THRESHOLD * 2):
+        assert router.first("quote", handlers, "600000") == {"code": "600000"}
+
+    assert router.breakers["baostock"].state == CLOSED
+
+
+def test_fetcher_codes_without_data_keep_baostock_closed(monkeypatch, faults):
+    from app.services.data_fetcher import data_fetcher
+
+    monkeypatch.setitem(data_fetcher.router.breakers, "baostock", CircuitBreaker("baostock", expected_latency=0.3))
+    breaker = data_fetcher.router.breakers["baostock"]
+
+    # 北交所代码在baostock没有数据：正常的空应答，不计失败
+    for code in ("830001", "430017", "920001", "830002", "830003"):
+        assert data_fetcher._get_quote_latest_day(code) is None
+    assert breaker.state == CLOSED
+
+    # 上游返回错误码才计入失败
+    faults.error_rate = 1.0
+    for _ in range(settings.SOURCE_BREAKER_FAILURE_THRESHOLD):
+        assert data_fetcher._get_quote_latest_day("600000") is None
+    assert breaker.state == OPEN
+
+
+def test_half_open_allows_single_probe():
+    breaker = CircuitBreaker("baostock", failure_threshold=1, cooldown=0.05)
+    breaker.record_failure(0.01, "超时")
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # 探测进行中，其余请求仍跳过
+
+    breaker.record_success(0.01)
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_doubles_cooldown():
+    breaker = CircuitBreaker("baostock", failure_threshold=1, cooldown=0.05, max_cooldown=1.0)
+    breaker.record_failure(0.01, "超时")
+    time.sleep(0.06)
+    assert breaker.allow()
+
+    breaker.record_failure(0.01, "超时")
+
+    assert breaker.state == OPEN
+    assert breaker.cooldown == pytest.approx(0.1)
+
+
+def _slow(result, seconds):
+    def handler(code):
+        time.sleep(seconds)
+        return result
+    return handler
+
+
+def test_hedged_request_returns_backup_when_primary_is_slow():
+    router = _router("baostock", "akshare_hist")
+    handlers = {"baostock": _slow({"source": "baostock"}, 0.5), "akshare_hist": _slow({"source": "akshare"}, 0)}
+
+    started = time.perf_counter()
+    result = router.hedged("quote", handlers, "600000")
+
+    assert result == {"source": "akshare"}
+    assert time.perf_counter() - started < 0.4
+    assert router.hedge_budget.stats()['issued'] == 1
+    assert router.hedge_budget.stats()['won'] == 1
+
+
+def test_hedging_respects_budget():
+    router = _router("baostock", "akshare_hist")
+    router.hedge_budget = HedgeBudget(ratio=0.0, burst=0.0)
+    handlers = {"baostock": _slow({"source": "baostock"}, 0.2), "akshare_hist": _slow({"source": "akshare"}, 0)}
+
+    assert router.hedged("quote", handlers, "600000") == {"source": "baostock"}
+    assert router.hedge_budget.stats()['denied'] == 1
+
+
+def test_hedged_request_falls_back_immediately_on_failure():
+    router = _router("baostock", "akshare_hist")
+    handlers = {"baostock": _fail, "akshare_hist": lambda code: {"source": "akshare"}}
+
+    assert router.hedged("quote", handlers, "600000") == {"source": "akshare"}
+    assert router.hedge_budget.stats()['issued'] == 0
@@ -0,0 +1,63 @@
+"""任务管理（共享存储：状态与结果分开保存、进度节流）"""
+import asyncio
+import pickle
+
+import pytest
+
+from app.services.shared_state import SqliteStore
+from app.services.task_manager import TaskManager, TaskStatus
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return TaskManager(store=SqliteStore(str(tmp_path / "store.db")))
+
+
+def test_results_are_kept_apart_from_status(manager):
+    manager.create_task("t1", {'peMin': 5}, total=10)
+    manager.update_task("t1", status=TaskStatus.COMPLETED, results=[{'code': '600000'}] * 3)
+
+    meta = pickle.loads(manager.store.get("task:t1"))
+    assert "results" not in meta and meta["result_count"] == 3
+    assert manager.get_task("t1", with_results=False).results == []
+    task = manager.get_task("t1")
+    assert len(task.results) == 3
+    assert task.to_dict()["result_count"] == 3
+
+    # 列出任务只读状态键
+    assert manager.tasks["t1"].result_count == 3
+    assert manager.get_all_tasks()[0]["result_count"] == 3
+
+    # 之后的状态更新不会重写结果
+    manager.update_task("t1", error="x")
+    assert len(manager.get_task("t1").results) == 3
+
+
+def test_progress_writes_are_throttled(manager):
+    manager.create_task("t1", {}, total=1000)
+
+    async def run():
+        for processed in range(1, 1001):
+            manager.report_progress("t1", processed)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    # 间隔内只写入第一次，其余进度留在内存中
+    assert manager.get_task("t1").processed == 1
+    manager.update_task("t1", status=TaskStatus.COMPLETED, results=[])
+    assert manager.get_task("t1").processed == 1000
+
+
+def test_active_task_and_trimming_use_status_keys(manager):
+    manager.max_tasks = 3
+    for i in range(5):
+        manager.create_task(f"t{i}", {})
+        manager.update_task(f"t{i}", status=TaskStatus.COMPLETED, results=[{'code': str(i)}])
+    assert sorted(manager.tasks) == ["t2", "t3", "t4"]
+    assert manager.store.get("task_result:t0") is None
+
+    assert manager.get_active_task() is None
+    manager.create_task("t5", {})
+    assert manager.get_active_task().task_id == "t5"
+    manager.cancel_task("t5")
+    assert manager.get_active_task() is None
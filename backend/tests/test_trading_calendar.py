@@ -0,0 +1,97 @@
+"""交易日历与按交易时段的刷新调度"""
+import json
+import os
+import time
+from datetime import date, datetime
+
+import pytest
+
+from app.config import settings
+from app.services.trading_calendar import TZ, TradingCalendar, trading_calendar
+
+# 2025年国庆：10月1日至8日休市
+DAYS = ["2025-09-26", "2025-09-29", "2025-09-30", "2025-10-09", "2025-10-10"]
+
+
+@pytest.fixture
+def calendar(tmp_path):
+    path = tmp_path / "trade_calendar.json"
+    path.write_text(json.dumps({'updated_at': time.time(), 'days': DAYS}), encoding="utf-8")
+    return TradingCalendar(str(path))
+
+
+def _at(day: str, hour: int, minute: int = 0) -> datetime:
+    return datetime.fromisoformat(day).replace(hour=hour, minute=minute, tzinfo=TZ)
+
+
+def test_holidays_inside_calendar_are_closed(calendar):
+    assert calendar.is_trading_day(date(2025, 9, 30))
+    assert not calendar.is_trading_day(date(2025, 10, 6))  # 周一，节假日
+    # 日历未覆盖的日期按工作日处理
+    assert calendar.is_trading_day(date(2026, 1, 5))
+    assert not calendar.is_trading_day(date(2026, 1, 3))
+
+
+def test_sessions(calendar):
+    assert calendar.in_session(_at("2025-10-09", 9, 30))
+    assert calendar.in_session(_at("2025-10-09", 14, 59))
+    assert not calendar.in_session(_at("2025-10-09", 12, 0))
+    assert not calendar.in_session(_at("2025-10-09", 15, 0))
+    assert not calendar.in_session(_at("2025-10-06", 10, 0))
+
+
+def test_spot_refresh_in_session_follows_interval(calendar):
+    at = _at("2025-10-09", 10)
+    assert calendar.spot_refresh_due(at.timestamp() - settings.SPOT_SESSION_SECONDS, at=at)
+    assert not calendar.spot_refresh_due(at.timestamp() - 1, at=at)
+    # 最近刚尝试过（即使失败）不再重试
+    assert not calendar.spot_refresh_due(None, attempted_at=at.timestamp() - 1, at=at)
+
+
+def test_spot_refresh_outside_session_only_after_close(calendar):
+    close = _at("2025-10-09", 15).timestamp() + settings.SPOT_CLOSE_DELAY_SECONDS
+    night = _at("2025-10-09", 20)
+    assert calendar.spot_refresh_due(close - 60, at=night)
+    assert not calendar.spot_refresh_due(close + 1, at=night)
+
+    # 节假日：节前最后一次收盘后已刷新，整个假期不再刷新
+    last_close = _at("2025-09-30", 15).timestamp() + settings.SPOT_CLOSE_DELAY_SECONDS
+    assert not calendar.spot_refresh_due(last_close + 1, at=_at("2025-10-06", 10))
+    # 还没有行情时总是刷新
+    assert calendar.spot_refresh_due(None, at=_at("2025-10-06", 10))
+
+
+def test_universe_refresh_window(calendar):
+    stale = _at("2025-10-09", 8).timestamp() - settings.UPDATE_INTERVAL_MINUTES * 60
+    assert calendar.universe_refresh_due(stale, at=_at("2025-10-09", 10))
+    assert not calendar.universe_refresh_due(stale, at=_at("2025-10-09", 20))
+    assert not calendar.universe_refresh_due(stale, at=_at("2025-10-06", 10))
+
+
+def test_simulator_calendar_does_not_touch_configured_file(simulator):
+    configured = simulator._saved['TRADING_CALENDAR_FILE']
+    before = os.stat(configured).st_mtime_ns if os.path.exists(configured) else None
+
+    assert settings.TRADING_CALENDAR_FILE != configured
+    assert trading_calendar.path == settings.TRADING_CALENDAR_FILE
+    assert trading_calendar.refresh()
+    assert os.path.exists(settings.TRADING_CALENDAR_FILE)
+
+    after = os.stat(configured).st_mtime_ns if os.path.exists(configured) else None
+    assert after == before
+
+
+def test_simulator_uninstall_restores_calendar(simulator):
+    from app.simulator import UpstreamSimulator, SimulatorConfig
+
+    path = settings.TRADING_CALENDAR_FILE
+    other = UpstreamSimulator(SimulatorConfig(symbols=20, latency_ms=0, latency_jitter_ms=0)).install()
+    try:
+        assert settings.TRADING_CALENDAR_FILE != path
+        calendar_dir = os.path.dirname(settings.TRADING_CALENDAR_FILE)
+    finally:
+        other.uninstall()
+
+    assert settings.TRADING_CALENDAR_FILE == path
+    assert trading_calendar.path == path
+    assert not os.path.exists(calendar_dir)